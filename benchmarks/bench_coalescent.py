@@ -0,0 +1,12 @@
+import numpy as np
+import pytest
+
+from metapypulation.coalescent import CoalescentSimulation
+
+@pytest.mark.parametrize("subpopulation_size", [25, 50, 100, 200], ids=lambda value: f"size={value}")
+def test_sample_stationary_features(benchmark, subpopulation_size):
+    # the cost of one sample should grow about linearly with the sample size
+    np.random.seed(2024)
+    coalescent = CoalescentSimulation(4, 'island', subpopulation_size, 1, 'benchmark', mutation_rate = 0.01, verbose = False)
+
+    benchmark.pedantic(coalescent.sample_stationary_features, rounds = 3, iterations = 1)
@@ -0,0 +1,13 @@
+import numpy as np
+import pytest
+
+from metapypulation.individual import Individual
+
+@pytest.mark.parametrize("number_of_features", [3, 10, 30])
+@pytest.mark.parametrize("interaction", ["axelrod_interaction", "neutral_interaction"])
+def test_interaction(benchmark, interaction, number_of_features):
+    np.random.seed(2024)
+    focus_individual = Individual(0, 0, number_of_features, 10, mutation_rate = 0.001)
+    interacting_individual = Individual(1, 0, number_of_features, 10, mutation_rate = 0.001)
+    
+    benchmark(getattr(focus_individual, interaction), interacting_individual)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from metapypulation.metapopulation import Metapopulation
+from metapypulation.wright_fisher import WrightFisherMetapopulation
+
+from .conftest import island_migration_matrix
+
+def test_populate(benchmark, number_of_subpopulations, subpopulation_size, number_of_features):
+    def populate():
+        metapopulation = Metapopulation(number_of_subpopulations, "neutral_interaction", island_migration_matrix(number_of_subpopulations),
+                                        subpopulation_size, number_of_features = number_of_features)
+        metapopulation.populate()
+    
+    benchmark(populate)
+
+
+def test_make_interact(benchmark, metapopulation):
+    benchmark(metapopulation.make_interact)
+
+
+def test_make_interact_per_subpopulation_size(benchmark, metapopulation):
+    metapopulation.interactions_per_generation = "subpopulation_size"
+    benchmark(metapopulation.make_interact)
+
+
+def test_make_interact_wright_fisher(benchmark, number_of_subpopulations, subpopulation_size, number_of_features, interaction):
+    np.random.seed(2024)
+    metapopulation = WrightFisherMetapopulation(number_of_subpopulations, interaction, island_migration_matrix(number_of_subpopulations),
+                                                subpopulation_size, number_of_features = number_of_features, mutation_rate = 0.001)
+    metapopulation.populate()
+    
+    benchmark(metapopulation.make_interact)
+
+
+def test_migrate(benchmark, metapopulation):
+    benchmark(metapopulation.migrate)
+
+
+@pytest.mark.parametrize("metric", ["traits_sets_per_subpopulation", "shannon_diversity_per_subpopulation", 
+                                    "simpson_diversity_per_subpopulation", "gini_diversity_per_subpopulation",
+                                    "metapopulation_count_sets", "metapopulation_shannon_diversity",
+                                    "metapopulation_simpson_diversity", "metapopulation_gini_diversity",
+                                    "whittaker_beta_diversity", "count_origin_id_spread"])
+def test_diversity(benchmark, metapopulation, metric):
+    benchmark(getattr(metapopulation, metric))
+
+
+def test_fixation_index(benchmark, metapopulation):
+    benchmark(metapopulation.fixation_index, 0, 1)
+
+
+def test_bray_curtis_by_subpopulation_pair(benchmark, metapopulation):
+    benchmark(metapopulation.bray_curtis_by_subpopulation_pair, 0, 1)
+
+
+def test_bray_curtis_by_sets_of_subpopulations(benchmark, metapopulation, number_of_subpopulations):
+    half = number_of_subpopulations // 2
+    benchmark(metapopulation.bray_curtis_by_sets_of_subpopulations, list(range(half)), list(range(half, number_of_subpopulations)))
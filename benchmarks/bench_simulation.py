@@ -0,0 +1,12 @@
+import numpy as np
+import pytest
+
+from metapypulation.simulation import Simulation
+
+@pytest.mark.parametrize("update_mode", ["moran", "wright_fisher"])
+def test_run_single_replicate(benchmark, number_of_subpopulations, subpopulation_size, interaction, update_mode):
+    np.random.seed(2024)
+    simulation = Simulation(500, number_of_subpopulations, 'island', interaction, subpopulation_size, 1, 'benchmark',
+                            burn_in = 100, mutation_rate = 0.001, measure_timing = 100, verbose = False, update_mode = update_mode)
+    
+    benchmark.pedantic(simulation.run_single_replicate, args = (1,), rounds = 3, iterations = 1)
@@ -0,0 +1,53 @@
+"""
+Shared set-up for the benchmarks. Benchmarks are parametrized over the number of subpopulations, the size of each 
+subpopulation and the number of features, and all start from a freshly populated metapopulation.
+"""
+
+import numpy as np
+import pytest
+
+from metapypulation.metapopulation import Metapopulation
+
+NUMBERS_OF_SUBPOPULATIONS = [2, 8]
+SUBPOPULATION_SIZES = [50, 500]
+NUMBERS_OF_FEATURES = [3, 10]
+
+
+def island_migration_matrix(number_of_subpopulations: int, migration_rate: float = 0.01) -> np.ndarray:
+    """
+    Island model migration matrix with the same migration rate between any two subpopulations.
+    """
+    migration_matrix = np.full((number_of_subpopulations, number_of_subpopulations), migration_rate)
+    np.fill_diagonal(migration_matrix, 0.0)
+    
+    return migration_matrix
+
+
+@pytest.fixture(params=NUMBERS_OF_SUBPOPULATIONS, ids=lambda value: f"demes={value}")
+def number_of_subpopulations(request):
+    return request.param
+
+
+@pytest.fixture(params=SUBPOPULATION_SIZES, ids=lambda value: f"size={value}")
+def subpopulation_size(request):
+    return request.param
+
+
+@pytest.fixture(params=NUMBERS_OF_FEATURES, ids=lambda value: f"features={value}")
+def number_of_features(request):
+    return request.param
+
+
+@pytest.fixture(params=["neutral_interaction", "axelrod_interaction"])
+def interaction(request):
+    return request.param
+
+
+@pytest.fixture
+def metapopulation(number_of_subpopulations, subpopulation_size, number_of_features, interaction):
+    np.random.seed(2024)
+    metapopulation = Metapopulation(number_of_subpopulations, interaction, island_migration_matrix(number_of_subpopulations),
+                                    subpopulation_size, number_of_features = number_of_features, mutation_rate = 0.001)
+    metapopulation.populate()
+    
+    return metapopulation
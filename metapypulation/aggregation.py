@@ -0,0 +1,366 @@
+"""
+A module containing the tools to summarize replicates as they are simulated, without keeping all of them in memory.
+"""
+
+import hashlib
+import json
+import numpy as np
+import os
+from typing import TYPE_CHECKING, Dict, Iterator, List, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+class ReplicateAggregator():
+    """
+    Streaming summary of the replicates of a simulation. For each measurement and time point, the mean and variance are
+    updated with Welford's algorithm, together with the minimum and maximum. Optionally, quantiles are estimated from a
+    reservoir sample of a fixed number of replicates. Memory does not depend on the number of replicates.
+
+    Attributes:
+        number_of_time_points (int): Number of time points of each replicate.
+        measurements (List[str]): Names of the measurements.
+        quantiles (List[float]): Quantiles (between 0 and 1) to estimate. Empty if no quantiles are estimated.
+        reservoir_size (int): Number of replicates kept to estimate quantiles.
+        number_of_replicates (int): Number of replicates added so far.
+        means (Dict[str, np.ndarray]): Running mean at each time point, per measurement.
+        squared_deviations (Dict[str, np.ndarray]): Running sum of squared deviations from the mean at each time point, per measurement.
+        minima (Dict[str, np.ndarray]): Minimum at each time point, per measurement.
+        maxima (Dict[str, np.ndarray]): Maximum at each time point, per measurement.
+        reservoirs (Dict[str, np.ndarray]): Reservoir of replicates (reservoir_size x time points), per measurement.
+    """
+    def __init__(self, number_of_time_points: int, measurements: List[str], quantiles: List[float] = None, reservoir_size: int = 200):
+        """
+        Create an empty aggregator.
+
+        Args:
+            number_of_time_points (int): Number of time points of each replicate.
+            measurements (List[str]): Names of the measurements.
+            quantiles (List[float], optional): Quantiles (between 0 and 1) to estimate. Defaults to None, in which case no quantiles are estimated.
+            reservoir_size (int, optional): Number of replicates kept to estimate quantiles. Defaults to 200.
+        """
+        self.number_of_time_points = number_of_time_points
+        self.measurements = measurements
+        self.quantiles = [] if quantiles is None else quantiles
+        self.reservoir_size = reservoir_size
+        self.number_of_replicates = 0
+
+        self.means = {measurement: np.zeros(number_of_time_points) for measurement in measurements}
+        self.squared_deviations = {measurement: np.zeros(number_of_time_points) for measurement in measurements}
+        self.minima = {measurement: np.full(number_of_time_points, np.inf) for measurement in measurements}
+        self.maxima = {measurement: np.full(number_of_time_points, -np.inf) for measurement in measurements}
+        self.reservoirs = {}
+        if self.quantiles:
+            self.reservoirs = {measurement: np.zeros((reservoir_size, number_of_time_points)) for measurement in measurements}
+
+
+    def add(self, replicate: Dict[str, np.ndarray]) -> None:
+        """
+        Add one replicate to the summary.
+
+        Args:
+            replicate (Dict[str, np.ndarray]): The values of each measurement at each time point.
+        """
+        self.number_of_replicates += 1
+        # the same slot of the reservoir is used for all measurements, so that the reservoir keeps whole replicates
+        if self.number_of_replicates <= self.reservoir_size:
+            reservoir_slot = self.number_of_replicates - 1
+        else:
+            reservoir_slot = np.random.randint(self.number_of_replicates)
+
+        for measurement in self.measurements:
+            values = np.asarray(replicate[measurement], dtype=float)
+            delta = values - self.means[measurement]
+            self.means[measurement] += delta / self.number_of_replicates
+            self.squared_deviations[measurement] += delta * (values - self.means[measurement])
+            np.minimum(self.minima[measurement], values, out=self.minima[measurement])
+            np.maximum(self.maxima[measurement], values, out=self.maxima[measurement])
+            if self.quantiles and reservoir_slot < self.reservoir_size:
+                self.reservoirs[measurement][reservoir_slot] = values
+
+
+    def mean(self, measurement: str) -> np.ndarray:
+        """
+        Args:
+            measurement (str): Name of the measurement.
+
+        Returns:
+            np.ndarray: Mean over replicates at each time point.
+        """
+        return self.means[measurement]
+
+
+    def variance(self, measurement: str) -> np.ndarray:
+        """
+        Args:
+            measurement (str): Name of the measurement.
+
+        Returns:
+            np.ndarray: Sample variance (with N - 1 degrees of freedom, as in pandas) over replicates at each time point.
+        """
+        if self.number_of_replicates < 2:
+            return np.full(self.number_of_time_points, np.nan)
+        return self.squared_deviations[measurement] / (self.number_of_replicates - 1)
+
+
+    def std(self, measurement: str) -> np.ndarray:
+        """
+        Args:
+            measurement (str): Name of the measurement.
+
+        Returns:
+            np.ndarray: Sample standard deviation over replicates at each time point.
+        """
+        return np.sqrt(self.variance(measurement))
+
+
+    def quantile(self, measurement: str, quantile: float) -> np.ndarray:
+        """
+        Args:
+            measurement (str): Name of the measurement.
+            quantile (float): Quantile between 0 and 1.
+
+        Returns:
+            np.ndarray: Estimate of the quantile over replicates at each time point.
+        """
+        if not self.quantiles:
+            raise ValueError("No quantiles are estimated, create the aggregator with a list of quantiles!")
+        kept = min(self.number_of_replicates, self.reservoir_size)
+        return np.quantile(self.reservoirs[measurement][:kept], quantile, axis=0)
+
+
+    def summary(self, measurement: str) -> "pd.DataFrame":
+        """
+        Summary of a measurement ready to be plotted.
+
+        Args:
+            measurement (str): Name of the measurement.
+
+        Returns:
+            pd.DataFrame: One row per time point, with columns "mean", "std", "min", "max" and one column per quantile.
+        """
+        import pandas as pd
+
+        summary = pd.DataFrame({"mean": self.mean(measurement), "std": self.std(measurement),
+                                "min": self.minima[measurement], "max": self.maxima[measurement]})
+        for quantile in self.quantiles:
+            summary[f"q{quantile:g}"] = self.quantile(measurement, quantile)
+
+        return summary
+
+
+def summarize_table(table: "pd.DataFrame", quantiles: List[float] = None) -> "pd.DataFrame":
+    """
+    Summary of an output table of `Simulation` (one row per time point, one column per replicate), in the same format
+    as `ReplicateAggregator.summary()`.
+
+    Args:
+        table (pd.DataFrame): One row per time point, one column per replicate.
+        quantiles (List[float], optional): Quantiles (between 0 and 1) to compute. Defaults to None.
+
+    Returns:
+        pd.DataFrame: One row per time point, with columns "mean", "std", "min", "max" and one column per quantile.
+    """
+    summary = table.mean(axis=1).to_frame("mean")
+    summary["std"] = table.std(axis=1)
+    summary["min"] = table.min(axis=1)
+    summary["max"] = table.max(axis=1)
+    for quantile in [] if quantiles is None else quantiles:
+        summary[f"q{quantile:g}"] = table.quantile(quantile, axis=1)
+
+    return summary
+
+
+def file_signature(path: str, validation: str = "mtime") -> Dict[str, int | str]:
+    """
+    Args:
+        path (str): Path of a file.
+        validation (str, optional): "mtime" for the modification time and size of the file, or "hash" to add the SHA-256 of its content. Defaults to "mtime".
+
+    Returns:
+        Dict[str, int | str]: The signature, which changes when the file changes.
+    """
+    if validation not in ("mtime", "hash"):
+        raise ValueError(f"Unknown validation {validation}, choose between 'mtime' and 'hash'.")
+    status = os.stat(path)
+    signature = {"mtime_ns": status.st_mtime_ns, "size": status.st_size}
+    if validation == "hash":
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        signature["sha256"] = digest.hexdigest()
+
+    return signature
+
+
+def cached_summary(source_path: str, quantiles: List[float] = None, validation: str = "mtime", cache_directory: str = None) -> "pd.DataFrame":
+    """
+    Summary of an output table of `Simulation` saved as CSV (see `summarize_table()`), cached in a small CSV file. The
+    cache is used as long as the source file has the same modification time and size; with `validation = "hash"`, also
+    when the source was rewritten (or copied) with the same content. Reading the summary of a table with many replicates
+    is then as fast as reading one column.
+
+    Args:
+        source_path (str): Path of the output table, e.g. "results/island_subpop_gini.csv".
+        quantiles (List[float], optional): Quantiles (between 0 and 1) to compute. Defaults to None.
+        validation (str, optional): "mtime" or "hash", see above. Defaults to "mtime".
+        cache_directory (str, optional): Folder of the cached summaries. Defaults to None, in which case a folder ".summaries" next to the source is used.
+
+    Returns:
+        pd.DataFrame: One row per time point, with columns "mean", "std", "min", "max" and one column per quantile.
+    """
+    import pandas as pd
+
+    if cache_directory is None:
+        cache_directory = os.path.join(os.path.dirname(source_path), ".summaries")
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    cache_path = os.path.join(cache_directory, f"{name}.csv")
+    metadata_path = os.path.join(cache_directory, f"{name}.json")
+    quantiles = [] if quantiles is None else list(quantiles)
+
+    signature = file_signature(source_path)
+    if os.path.exists(cache_path) and os.path.exists(metadata_path):
+        with open(metadata_path) as file:
+            metadata = json.load(file)
+        if metadata["quantiles"] == quantiles:
+            cached_signature = metadata["source"]
+            if {key: cached_signature[key] for key in signature} == signature:
+                return pd.read_csv(cache_path, index_col=0)
+            if validation == "hash" and "sha256" in cached_signature:
+                signature = file_signature(source_path, validation)
+                if signature["sha256"] == cached_signature["sha256"]:
+                    _write_metadata(metadata_path, signature, quantiles)
+                    return pd.read_csv(cache_path, index_col=0)
+
+    summary = summarize_csv(source_path, quantiles)
+    os.makedirs(cache_directory, exist_ok=True)
+    summary.to_csv(cache_path)
+    _write_metadata(metadata_path, file_signature(source_path, validation), quantiles)
+
+    return summary
+
+
+def load_summary(dataset: str, table: str, quantiles: List[float] = None, validation: str = "mtime") -> "pd.DataFrame":
+    """
+    Summary of an output table of a dataset, for plotting: the cached summary of `{dataset}_{table}.csv` when the
+    replicates were kept, or else the streaming summary `{dataset}_{table}_summary.csv` saved with `aggregate_replicates`.
+
+    Args:
+        dataset (str): Output path of the simulation, e.g. "results/island".
+        table (str): Name of the table, e.g. "subpop_gini".
+        quantiles (List[float], optional): Quantiles (between 0 and 1) to compute. Defaults to None.
+        validation (str, optional): "mtime" or "hash", see `cached_summary()`. Defaults to "mtime".
+
+    Returns:
+        pd.DataFrame: One row per time point, with columns "mean", "std", "min", "max" and one column per quantile.
+    """
+    source_path = f"{dataset}_{table}.csv"
+    if os.path.exists(source_path):
+        return cached_summary(source_path, quantiles, validation)
+
+    summary_path = f"{dataset}_{table}_summary.csv"
+    if os.path.exists(summary_path):
+        import pandas as pd
+
+        return pd.read_csv(summary_path, index_col=0)
+    raise FileNotFoundError(f"Neither {source_path} nor {summary_path} exists.")
+
+
+def read_table_chunks(path: str, chunk_rows: int = 1000) -> Iterator["pd.DataFrame"]:
+    """
+    Read an output table of `Simulation` saved as CSV a few time points at a time, with all replicates. Memory is
+    bounded by `chunk_rows` times the number of replicates, whatever the number of time points.
+
+    Args:
+        path (str): Path of the output table.
+        chunk_rows (int, optional): Number of time points (rows) per chunk. Defaults to 1000.
+
+    Returns:
+        Iterator[pd.DataFrame]: The chunks, in order, with the time points as index and one column per replicate.
+    """
+    import pandas as pd
+
+    if chunk_rows < 1:
+        raise ValueError("The number of rows per chunk must be positive!")
+    with pd.read_csv(path, index_col=0, chunksize=chunk_rows) as reader:
+        yield from reader
+
+
+def summarize_csv(path: str, quantiles: List[float] = None, chunk_rows: int = 1000) -> "pd.DataFrame":
+    """
+    Same as `summarize_table()` for a table saved as CSV, read in chunks of time points so that the whole table is never
+    in memory.
+
+    Args:
+        path (str): Path of the output table.
+        quantiles (List[float], optional): Quantiles (between 0 and 1) to compute. Defaults to None.
+        chunk_rows (int, optional): Number of time points read at once. Defaults to 1000.
+
+    Returns:
+        pd.DataFrame: One row per time point, with columns "mean", "std", "min", "max" and one column per quantile.
+    """
+    import pandas as pd
+
+    return pd.concat([summarize_table(chunk, quantiles) for chunk in read_table_chunks(path, chunk_rows)])
+
+
+def window_means(path: str, windows: List[Tuple[int, int]], chunk_rows: int = 1000) -> "pd.DataFrame":
+    """
+    Average of each replicate over windows of time points, e.g. to compare the stationary levels of the replicates
+    after a burn-in. The table is read in chunks.
+
+    Args:
+        path (str): Path of the output table.
+        windows (List[Tuple[int, int]]): First and last (excluded) time point of each window, as in the index of the table.
+        chunk_rows (int, optional): Number of time points read at once. Defaults to 1000.
+
+    Returns:
+        pd.DataFrame: One row per replicate, one column per window, named "start-end".
+    """
+    import pandas as pd
+
+    sums, counts = [0.0]*len(windows), [0]*len(windows)
+    for chunk in read_table_chunks(path, chunk_rows):
+        for index, (start, end) in enumerate(windows):
+            in_window = chunk[(chunk.index >= start) & (chunk.index < end)]
+            sums[index] = sums[index] + in_window.sum(axis=0)
+            counts[index] = counts[index] + in_window.count(axis=0)
+
+    return pd.DataFrame({f"{start}-{end}": sums[index]/counts[index] for index, (start, end) in enumerate(windows)})
+
+
+def compare_tables(path_1: str, path_2: str, chunk_rows: int = 1000) -> "pd.DataFrame":
+    """
+    Compare the replicates of two datasets at each time point (e.g. the same output table of two simulations), with
+    Welch's t statistic for the difference of the means. Both tables are read in chunks, side by side.
+
+    Args:
+        path_1 (str): Path of the first output table.
+        path_2 (str): Path of the second output table, with the same time points.
+        chunk_rows (int, optional): Number of time points read at once. Defaults to 1000.
+
+    Returns:
+        pd.DataFrame: One row per time point, with columns "mean_1", "mean_2", "difference" (mean_1 - mean_2), "standard_error" and "t".
+    """
+    import pandas as pd
+
+    comparisons = []
+    for chunk_1, chunk_2 in zip(read_table_chunks(path_1, chunk_rows), read_table_chunks(path_2, chunk_rows), strict=True):
+        if not chunk_1.index.equals(chunk_2.index):
+            raise ValueError(f"The time points of {path_1} and {path_2} differ!")
+        comparison = pd.DataFrame({"mean_1": chunk_1.mean(axis=1), "mean_2": chunk_2.mean(axis=1)})
+        comparison["difference"] = comparison["mean_1"] - comparison["mean_2"]
+        comparison["standard_error"] = np.sqrt(chunk_1.var(axis=1)/chunk_1.count(axis=1) + chunk_2.var(axis=1)/chunk_2.count(axis=1))
+        comparison["t"] = comparison["difference"]/comparison["standard_error"]
+        comparisons.append(comparison)
+
+    return pd.concat(comparisons)
+
+
+def _write_metadata(metadata_path: str, signature: Dict[str, int | str], quantiles: List[float]) -> None:
+    """
+    Write the signature of the source and the quantiles of a cached summary.
+    """
+    with open(metadata_path, "w") as file:
+        json.dump({"source": signature, "quantiles": quantiles}, file)
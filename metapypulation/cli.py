@@ -0,0 +1,327 @@
+"""
+A module containing the command-line runner of experiments described in TOML, YAML or JSON files, used as
+
+    python -m metapypulation experiment.toml [other_experiment.json ...]
+
+or through a work queue shared by several machines (see `work_queue`).
+
+An experiment file has the sections below (all keys except the required ones are optional, see `Simulation`):
+
+    [topology]
+    number_of_subpopulations = 4                  # required
+    migration_matrix = "island"                   # "island", "stepping_stone", a CSV file or a list of rows; required
+    migration_rate = 0.001
+    carrying_capacities = 100                     # required
+
+    [interaction]
+    type = "axelrod_interaction"                  # required
+    mutation_rate = 0.001
+    interactions_per_generation = 1
+    update_mode = "moran"                         # "moran", "wright_fisher" or "demographic"
+
+    [demography]                                  # only with update_mode = "demographic"
+    regulation = "logistic"                       # "logistic" or "fixed"
+    birth_rate = 0.1
+    extinction_rate = 0.0
+
+    [schedule]
+    generations = 10000                           # required
+    burn_in = 0
+    measure_timing = 100
+    measurements = {type = "log", number_of_measurements = 200}   # other schedule, see `schedules.make_schedule()`
+
+    [run]
+    replicates = 10                               # required
+    workers = 4                                   # worker processes, 1 to run in this process
+    seed = 1                                      # base seed, replicate i is seeded from (seed, i)
+    verbose = false                               # print the progress of each replicate
+
+    [output]
+    path = "results/island"                       # prefix of the output files; required
+    aggregate_replicates = true
+    keep_replicates = true
+    quantiles = [0.05, 0.95]
+    record_per_subpopulation = false
+    instrumentation = false
+    snapshots = false                             # only with workers = 1
+
+    [stop]
+    max_wall_time = 3600                          # seconds after which no new replicate is started
+    target_standard_error = 0.01                  # stop when the final value of target_table is known to this standard error
+    target_table = "metapop_gini"
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import numpy as np
+import os
+import random
+import sys
+import time
+import tomllib
+from typing import Dict, List, Tuple
+
+from .instrumentation import SimulationStatistics
+from .recorder import MeasurementRecorder
+from .schedules import make_schedule
+from .simulation import OUTPUT_TABLES, Simulation
+
+# Keys of each section of an experiment file, with the name of the corresponding argument of `Simulation`.
+SIMULATION_KEYS = {
+    "topology": {"number_of_subpopulations": "number_of_subpopulations", "migration_matrix": "migration_matrix",
+                 "migration_rate": "migration_rate", "carrying_capacities": "carrying_capacities"},
+    "interaction": {"type": "interaction", "mutation_rate": "mutation_rate",
+                    "interactions_per_generation": "interactions_per_generation", "update_mode": "update_mode"},
+    "demography": {"regulation": "regulation", "birth_rate": "birth_rate", "extinction_rate": "extinction_rate"},
+    "schedule": {"generations": "generations", "burn_in": "burn_in", "measure_timing": "measure_timing",
+                 "measurements": "measurement_schedule"},
+    "run": {"replicates": "replicates", "verbose": "verbose"},
+    "output": {"path": "output_path", "aggregate_replicates": "aggregate_replicates", "keep_replicates": "keep_replicates",
+               "quantiles": "quantiles", "record_per_subpopulation": "record_per_subpopulation",
+               "instrumentation": "instrumentation", "snapshots": "snapshots"},
+}
+# Keys used by the runner itself rather than by `Simulation`.
+RUNNER_KEYS = {"run": {"workers", "seed"}, "stop": {"max_wall_time", "target_standard_error", "target_table"}}
+REQUIRED_KEYS = [("topology", "number_of_subpopulations"), ("topology", "migration_matrix"), ("topology", "carrying_capacities"),
+                 ("interaction", "type"), ("schedule", "generations"), ("run", "replicates"), ("output", "path")]
+
+
+def load_config(path: str) -> Dict[str, dict]:
+    """
+    Read an experiment file. The format is given by the extension: .toml, .json, or .yaml/.yml (which needs PyYAML).
+
+    Args:
+        path (str): Path of the experiment file.
+
+    Returns:
+        Dict[str, dict]: The sections of the experiment.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    match extension:
+        case ".toml":
+            with open(path, "rb") as file:
+                return tomllib.load(file)
+        case ".json":
+            with open(path) as file:
+                return json.load(file)
+        case ".yaml" | ".yml":
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Reading YAML experiment files requires PyYAML (pip install pyyaml).")
+            with open(path) as file:
+                return yaml.safe_load(file)
+        case _:
+            raise ValueError(f"Unknown format of experiment file {path}, use .toml, .json, .yaml or .yml.")
+
+
+def simulation_parameters(config: Dict[str, dict]) -> dict:
+    """
+    Check an experiment and translate it into the arguments of `Simulation`.
+
+    Args:
+        config (Dict[str, dict]): The sections of the experiment, see the module description.
+
+    Returns:
+        dict: Keyword arguments of `Simulation`.
+    """
+    for section, keys in config.items():
+        known_keys = set(SIMULATION_KEYS.get(section, {})) | RUNNER_KEYS.get(section, set())
+        if not known_keys:
+            raise ValueError(f"Unknown section [{section}] in the experiment.")
+        unknown_keys = set(keys) - known_keys
+        if unknown_keys:
+            raise ValueError(f"Unknown keys {sorted(unknown_keys)} in section [{section}] of the experiment.")
+    for section, key in REQUIRED_KEYS:
+        if key not in config.get(section, {}):
+            raise ValueError(f"The experiment needs '{key}' in section [{section}].")
+
+    parameters = {"verbose": False}
+    for section, keys in SIMULATION_KEYS.items():
+        for key, argument in keys.items():
+            if key in config.get(section, {}):
+                parameters[argument] = config[section][key]
+
+    if "measurement_schedule" in parameters:
+        parameters["measurement_schedule"] = make_schedule(parameters["measurement_schedule"])
+    migration_matrix = parameters["migration_matrix"]
+    if isinstance(migration_matrix, list):
+        parameters["migration_matrix"] = np.array(migration_matrix, dtype=float)
+    elif migration_matrix.endswith(".csv"):
+        parameters["migration_matrix"] = np.genfromtxt(migration_matrix, delimiter=",")
+
+    return parameters
+
+
+def replicate_seed(base_seed: int, replicate_id: int) -> int:
+    """
+    Args:
+        base_seed (int): Seed of the experiment.
+        replicate_id (int): The number of the replicate.
+
+    Returns:
+        int: Seed of the replicate, the same whichever process runs it.
+    """
+    return int(np.random.SeedSequence([base_seed, replicate_id]).generate_state(1)[0])
+
+
+def run_replicate(parameters: dict, replicate_id: int, seed: int) -> Tuple[MeasurementRecorder, SimulationStatistics]:
+    """
+    Run one replicate in a worker process, with its own `Simulation`.
+
+    Args:
+        parameters (dict): Keyword arguments of `Simulation`.
+        replicate_id (int): The number of the replicate.
+        seed (int): Seed of the replicate.
+
+    Returns:
+        Tuple[MeasurementRecorder, SimulationStatistics]: The measurements of the replicate and its statistics (None without instrumentation).
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+    simulation = Simulation(**parameters)
+    recorder = simulation.run_single_replicate(replicate_id)
+
+    return recorder, simulation.statistics.get(replicate_id)
+
+
+def run_experiment(config: Dict[str, dict], workers: int = None, verbose: bool = True) -> Dict[str, float]:
+    """
+    Run an experiment and save its outputs as `Simulation.save_output()` does. Replicates are run in worker processes
+    and added to the outputs in order as soon as they are done, so that with `aggregate_replicates` and without
+    `keep_replicates`, the memory does not grow with the number of replicates.
+
+    Args:
+        config (Dict[str, dict]): The sections of the experiment, see the module description.
+        workers (int, optional): Number of worker processes, overriding the experiment. Defaults to None.
+        verbose (bool, optional): Whether to print the progress and the throughput. Defaults to True.
+
+    Returns:
+        Dict[str, float]: Throughput statistics: number of replicates run, generations simulated, wall time, generations per second and the base seed.
+    """
+    parameters = simulation_parameters(config)
+    run, stop = config.get("run", {}), config.get("stop", {})
+    if workers is None:
+        workers = run.get("workers", 1)
+    if workers > 1 and parameters.get("snapshots", False):
+        raise ValueError("Snapshots are written by a single process, run with workers = 1.")
+    base_seed = run.get("seed")
+    if base_seed is None:
+        base_seed = int(np.random.SeedSequence().generate_state(1)[0])
+    max_wall_time = stop.get("max_wall_time", np.inf)
+    target_standard_error = stop.get("target_standard_error")
+    target_table = stop.get("target_table", "metapop_gini")
+    if target_table not in OUTPUT_TABLES:
+        raise ValueError(f"Unknown target table {target_table}, choose between {', '.join(OUTPUT_TABLES)}.")
+
+    output_directory = os.path.dirname(parameters["output_path"])
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+    simulation = Simulation(**parameters)
+    replicate_ids = range(1, simulation.replicates + 1)
+    final_values: List[float] = []
+    start_time = time.perf_counter()
+
+    def add_replicate(replicate_id: int, recorder: MeasurementRecorder, statistics: SimulationStatistics) -> bool:
+        """Add a finished replicate to the outputs, and tell whether a stop condition is met."""
+        if workers > 1:
+            simulation.store_replicate(recorder, replicate_id)
+            if statistics is not None:
+                simulation.statistics[replicate_id] = statistics
+        measurement = target_table.split("_", 1)[1]
+        values = recorder.subpopulation_mean(measurement) if target_table.startswith("subpop") else recorder.metapopulation(measurement)
+        final_values.append(float(values[-1]))
+        if verbose:
+            print(f"Replicate {replicate_id} done after {time.perf_counter() - start_time:.1f} s.")
+
+        if time.perf_counter() - start_time > max_wall_time:
+            return True
+        return (target_standard_error is not None and len(final_values) > 1
+                and np.std(final_values, ddof=1)/np.sqrt(len(final_values)) < target_standard_error)
+
+    if workers == 1:
+        for replicate_id in replicate_ids:
+            seed = replicate_seed(base_seed, replicate_id)
+            np.random.seed(seed)
+            random.seed(seed)
+            if add_replicate(replicate_id, simulation.run_single_replicate(replicate_id), None):
+                break
+    else:
+        worker_parameters = dict(parameters, snapshots = False)
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(run_replicate, worker_parameters, replicate_id, replicate_seed(base_seed, replicate_id))
+                       for replicate_id in replicate_ids]
+            for replicate_id, future in zip(replicate_ids, futures):
+                if add_replicate(replicate_id, *future.result()):
+                    executor.shutdown(wait = False, cancel_futures = True)
+                    break
+
+    simulation.save_output()
+    wall_time = time.perf_counter() - start_time
+    generations = len(final_values)*(simulation.generations + 1)
+    throughput = {"replicates": len(final_values), "generations": generations, "wall_time": wall_time,
+                  "generations_per_second": generations/wall_time, "seed": base_seed}
+    if verbose:
+        print(f"{throughput['replicates']} replicates, {generations} generations in {wall_time:.1f} s with {workers} worker(s): "
+              f"{throughput['generations_per_second']:.0f} generations/s, {wall_time/max(1, len(final_values)):.2f} s per replicate (seed {base_seed}).")
+
+    return throughput
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Entry point of `python -m metapypulation`: run the experiments given on the command line, one after the other, or
+    use a shared work queue (see `work_queue`) to submit them, run tasks or collect the outputs.
+
+    Args:
+        argv (List[str], optional): Command-line arguments. Defaults to None, in which case `sys.argv` is used.
+
+    Returns:
+        int: Exit status.
+    """
+    parser = argparse.ArgumentParser(prog = "metapypulation", description = "Run metapopulation experiments described in TOML, YAML or JSON files.")
+    parser.add_argument("experiments", nargs = "*", help = "experiment files, run one after the other")
+    parser.add_argument("-w", "--workers", type = int, default = None, help = "number of worker processes, overriding the experiment files")
+    parser.add_argument("-q", "--quiet", action = "store_true", help = "only print errors")
+    queue_modes = parser.add_mutually_exclusive_group()
+    queue_modes.add_argument("--queue", metavar = "DIRECTORY", help = "add the replicates of the experiments to the work queue in DIRECTORY instead of running them")
+    queue_modes.add_argument("--work", metavar = "DIRECTORY", help = "run tasks of the work queue in DIRECTORY until it is empty")
+    queue_modes.add_argument("--collect", metavar = "DIRECTORY", help = "save the outputs of the finished experiments of the work queue in DIRECTORY")
+    parser.add_argument("--timeout", type = float, default = 3600.0, help = "seconds without heartbeat after which a task of the queue is reclaimed (default 3600)")
+    arguments = parser.parse_args(argv)
+    if bool(arguments.experiments) == bool(arguments.work or arguments.collect):
+        parser.error("give experiment files to run or to --queue, or use --work or --collect alone")
+
+    if arguments.queue or arguments.work or arguments.collect:
+        from .work_queue import WorkQueue, run_worker
+
+    if arguments.work:
+        run_worker(arguments.work, arguments.timeout, verbose = not arguments.quiet)
+    elif arguments.collect:
+        queue = WorkQueue(arguments.collect)
+        pending_experiments = {task.split("__")[0] for task in queue.tasks("pending") + queue.tasks("claimed")}
+        for experiment in sorted(os.listdir(os.path.join(arguments.collect, "experiments"))):
+            name = experiment.removesuffix(".json")
+            if name in pending_experiments:
+                print(f"Experiment {name} is not finished.")
+                continue
+            simulation = queue.collect(name)
+            if not arguments.quiet:
+                print(f"Experiment {name} saved to {simulation.output_path}.")
+
+    for experiment in arguments.experiments:
+        if arguments.queue:
+            tasks = WorkQueue(arguments.queue).submit(load_config(experiment), os.path.splitext(os.path.basename(experiment))[0])
+            if not arguments.quiet:
+                print(f"{len(tasks)} tasks of {experiment} added to {arguments.queue}.")
+            continue
+        if not arguments.quiet:
+            print(f"Running {experiment}.")
+        run_experiment(load_config(experiment), arguments.workers, not arguments.quiet)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+A module containing a backward-in-time structured coalescent for the neutral model, which samples the stationary
+distribution of the sets of traits in each deme without running the forward simulation.
+"""
+
+from bisect import bisect_right
+from itertools import accumulate
+import numpy as np
+from typing import Dict, List
+import time
+
+from .metapopulation import Metapopulation
+from .random_buffer import RandomBuffer
+from .recorder import MeasurementRecorder
+from .simulation import Simulation
+
+class CoalescentSimulation(Simulation):
+    """
+    Structured coalescent for the "neutral_interaction" model with mutation and migration.
+
+    The forward model is followed backward in time. Each generation, in each deme of size N, a focal individual copies
+    one of its F features from a random individual of the same deme (possibly itself), or draws a new random trait with
+    probability `mutation_rate`. Going backward, a lineage carrying a set of ancestral features therefore has each of its
+    features moved to a random individual of the deme at rate 1/(N F) per feature; two lineages of the same feature meeting
+    in the same individual coalesce, and a mutation fixes the value of the feature for all the samples below it. Migration
+    moves lineages from deme j back to deme i at rate m_ij N_i / N_j. A feature is resolved when it is mutated away or when a
+    single ancestor is left, whose trait is drawn from the (uniform) stationary distribution.
+
+    Each replicate produces one independent stationary sample and one row of the same eight measurements as `Simulation`.
+
+    Attributes:
+        number_of_features (int): Number of cultural features per individual.
+        number_of_traits (int): Number of possible traits for each feature (traits go from 1 to `number_of_traits`).
+        sample_sizes (List[int]): Number of individuals sampled in each subpopulation.
+        subpopulation_sizes (np.ndarray): Size of each subpopulation (the carrying capacities).
+        backward_migration_matrix (np.ndarray): Rates at which a lineage in deme j (row) moves back to deme i (column).
+    """
+    def __init__(self,
+                 number_of_subpopulations: int,
+                 migration_matrix: str | np.ndarray,
+                 carrying_capacities: List[int] | int,
+                 replicates: int,
+                 output_path: str,
+                 mutation_rate: float,
+                 migration_rate: float = 0.001,
+                 number_of_features: int = 5,
+                 number_of_traits: int = 10,
+                 sample_sizes: List[int] | int = None,
+                 verbose: bool = True):
+        """
+        Create a coalescent simulation.
+
+        Args:
+            number_of_subpopulations (int): Number of subpopulations in the metapopulation.
+            migration_matrix (str | np.ndarray): Type of migration topology. Either a string to generate a table or a numpy array matrix.
+            carrying_capacities (List[int] | int): Size of each subpopulation. Either a list with a size for each subpopulation, or an int with equal size for all subpopulations.
+            replicates (int): Number of independent samples to draw.
+            output_path (str): Path of folder in which to save results.
+            mutation_rate (float): Probability of a mutation to occur during copying. Must be positive for the stationary distribution to be reached.
+            migration_rate (float, optional): Migration rate used to generate a migration matrix when there is str input. Defaults to 0.001.
+            number_of_features (int, optional): Number of cultural features per individual. Defaults to 5.
+            number_of_traits (int, optional): Number of possible traits for each feature. Defaults to 10.
+            sample_sizes (List[int] | int, optional): Number of individuals sampled in each subpopulation. Defaults to None, in which case whole subpopulations are sampled.
+            verbose (bool, optional): Whether to print text during the simulation. Defaults to True.
+        """
+        if mutation_rate <= 0.0:
+            raise ValueError("The coalescent samples the stationary distribution, which requires a positive mutation rate!")
+
+        super().__init__(0, number_of_subpopulations, migration_matrix, "neutral_interaction", carrying_capacities,
+                         replicates, output_path, migration_rate = migration_rate, mutation_rate = mutation_rate, verbose = verbose)
+
+        self.number_of_features = number_of_features
+        self.number_of_traits = number_of_traits
+
+        match carrying_capacities:
+            case list():
+                assert number_of_subpopulations == len(carrying_capacities)
+                self.subpopulation_sizes = np.array(carrying_capacities, dtype=float)
+            case int():
+                self.subpopulation_sizes = np.full(number_of_subpopulations, carrying_capacities, dtype=float)
+
+        match sample_sizes:
+            case None:
+                self.sample_sizes = [int(size) for size in self.subpopulation_sizes]
+            case list():
+                assert number_of_subpopulations == len(sample_sizes)
+                self.sample_sizes = sample_sizes
+            case int():
+                self.sample_sizes = [sample_sizes]*number_of_subpopulations
+
+        if any(sample > size for sample, size in zip(self.sample_sizes, self.subpopulation_sizes)):
+            raise ValueError("The sample size cannot be larger than the size of the subpopulation!")
+
+        # forward, deme i sends N_i m_ij individuals to deme j, so that a lineage in j comes from i with probability N_i m_ij / N_j
+        self.backward_migration_matrix = (self.migration_matrix * self.subpopulation_sizes[:, np.newaxis] / self.subpopulation_sizes[np.newaxis, :]).T
+
+
+    def sample_stationary_features(self) -> np.ndarray:
+        """
+        Run the coalescent once and draw the sets of features of the sampled individuals.
+
+        The lineages of each deme are kept in a list (removed by swapping with the last one), together with the total rate
+        of events of each deme, so that an event picks a deme among the few demes, then a lineage within it, and the cost
+        of an event does not grow with the number of lineages.
+
+        Returns:
+            np.ndarray: Matrix of shape (total sample size, number of features). Individuals are ordered by deme, following `sample_sizes`.
+        """
+        number_of_features = self.number_of_features
+        number_of_subpopulations = self.number_of_subpopulations
+        sample_demes = np.repeat(np.arange(number_of_subpopulations), self.sample_sizes)
+        features = np.zeros((len(sample_demes), number_of_features), dtype=int)
+
+        # each lineage is an ancestral individual carrying, for some features, the samples that descend from it
+        lineage_demes = [int(deme) for deme in sample_demes]
+        lineage_features: List[Dict[int, List[int]]] = [{k: [i] for k in range(number_of_features)} for i in range(len(sample_demes))]
+        number_of_carriers = [len(lineage_demes)]*number_of_features
+        free_lineages: List[int] = []
+
+        # lineages of each deme, position of each lineage in the list of its deme and number of features carried in each deme
+        deme_lineages: List[List[int]] = [[] for _ in range(number_of_subpopulations)]
+        positions = [0]*len(lineage_demes)
+        for lineage, deme in enumerate(lineage_demes):
+            positions[lineage] = len(deme_lineages[deme])
+            deme_lineages[deme].append(lineage)
+        carried_features = [sample*number_of_features for sample in self.sample_sizes]
+        number_of_lineages = list(self.sample_sizes)
+        random = RandomBuffer()
+
+        def add_lineage(lineage: int, deme: int) -> None:
+            lineage_demes[lineage] = deme
+            positions[lineage] = len(deme_lineages[deme])
+            deme_lineages[deme].append(lineage)
+            number_of_lineages[deme] += 1
+
+        def remove_lineage(lineage: int) -> None:
+            deme = lineage_demes[lineage]
+            lineages = deme_lineages[deme]
+            last = lineages.pop()
+            if last != lineage:
+                lineages[positions[lineage]] = last
+                positions[last] = positions[lineage]
+            number_of_lineages[deme] -= 1
+
+        def resolve(lineage: int, feature: int) -> List[int]:
+            # the feature leaves the lineage, which is freed once it carries no feature
+            samples = lineage_features[lineage].pop(feature)
+            carried_features[lineage_demes[lineage]] -= 1
+            if not lineage_features[lineage]:
+                remove_lineage(lineage)
+                free_lineages.append(lineage)
+            return samples
+
+        for k in range(number_of_features):
+            if number_of_carriers[k] == 1:
+                features[resolve(0, k), k] = 1 + random.integer(self.number_of_traits)
+                number_of_carriers[k] = 0
+
+        subpopulation_sizes = [int(size) for size in self.subpopulation_sizes]
+        copy_scales = (1.0/(self.subpopulation_sizes*number_of_features)).tolist()
+        migration_out_rates = self.backward_migration_matrix.sum(axis=1).tolist()
+        destinations = np.cumsum(self.backward_migration_matrix, axis=1).tolist()
+        last_deme = number_of_subpopulations - 1
+
+        while any(number_of_carriers):
+            # first the deme of the event, then the lineage within the deme
+            copy_rates = [carried*scale for carried, scale in zip(carried_features, copy_scales)]
+            cumulative_rates = list(accumulate(copy_rate + lineages*rate for copy_rate, lineages, rate in zip(copy_rates, number_of_lineages, migration_out_rates)))
+            draw = random.uniform()*cumulative_rates[-1]
+            deme = min(bisect_right(cumulative_rates, draw), last_deme)
+            lineages = deme_lineages[deme]
+            draw -= cumulative_rates[deme - 1] if deme > 0 else 0.0
+
+            if draw >= copy_rates[deme]:
+                # migration of a lineage back to the deme it came from
+                lineage = lineages[random.integer(len(lineages))]
+                destination = bisect_right(destinations[deme], random.uniform()*destinations[deme][-1])
+                remove_lineage(lineage)
+                carried_features[deme] -= len(lineage_features[lineage])
+                add_lineage(lineage, min(destination, last_deme))
+                carried_features[lineage_demes[lineage]] += len(lineage_features[lineage])
+                continue
+
+            # a lineage of the deme with probability proportional to the number of features it carries
+            while True:
+                lineage = lineages[random.integer(len(lineages))]
+                if random.uniform()*number_of_features < len(lineage_features[lineage]):
+                    break
+            carried = list(lineage_features[lineage])
+            feature = carried[random.integer(len(carried))]
+
+            if random.uniform() <= self.mutation_rate:
+                # the most recent mutation above the samples decides their trait
+                features[resolve(lineage, feature), feature] = 1 + random.integer(self.number_of_traits)
+                number_of_carriers[feature] -= 1
+            else:
+                number_of_others = len(lineages) - 1
+                source = random.integer(subpopulation_sizes[deme])
+                if source < number_of_others:
+                    # skip the lineage itself among the lineages of the deme
+                    other = lineages[source + (source >= positions[lineage])]
+                    samples = resolve(lineage, feature)
+                    if feature in lineage_features[other]:
+                        lineage_features[other][feature].extend(samples)
+                        number_of_carriers[feature] -= 1
+                    else:
+                        lineage_features[other][feature] = samples
+                        carried_features[deme] += 1
+                elif source > number_of_others and len(carried) > 1:
+                    # the source is an individual that is not ancestral to the sample (yet), a lineage carrying only
+                    # this feature is then unchanged
+                    samples = resolve(lineage, feature)
+                    if free_lineages:
+                        new_lineage = free_lineages.pop()
+                        lineage_features[new_lineage] = {feature: samples}
+                    else:
+                        new_lineage = len(lineage_demes)
+                        lineage_demes.append(deme)
+                        positions.append(0)
+                        lineage_features.append({feature: samples})
+                    add_lineage(new_lineage, deme)
+                    carried_features[deme] += 1
+
+            if number_of_carriers[feature] == 1:
+                # the last ancestor of the feature takes a trait from the stationary distribution
+                for lineages in deme_lineages:
+                    last = next((lineage for lineage in lineages if feature in lineage_features[lineage]), None)
+                    if last is not None:
+                        features[resolve(last, feature), feature] = 1 + random.integer(self.number_of_traits)
+                        break
+                number_of_carriers[feature] = 0
+
+        return features
+
+
+    def run_single_replicate(self, replicate_id: int) -> None:
+        """
+        Draw one stationary sample and measure it.
+
+        Args:
+            replicate_id (int): The number of the current replicate (for the output data columns).
+        """
+        start_time = time.time()
+
+        features = self.sample_stationary_features()
+        metapopulation = Metapopulation(self.number_of_subpopulations, self.interaction_type, self.migration_matrix,
+                                        self.sample_sizes, number_of_features = self.number_of_features,
+                                        number_of_traits = self.number_of_traits, mutation_rate = self.mutation_rate,
+                                        min_trait = 1, max_trait = self.number_of_traits)
+        metapopulation.populate_from_arrays(features, np.repeat(np.arange(self.number_of_subpopulations), self.sample_sizes))
+
+        recorder = MeasurementRecorder(1, self.number_of_subpopulations)
+        recorder.record(metapopulation)
+        self.store_replicate(recorder, replicate_id)
+
+        if self.verbose:
+            total_time = time.strftime("%H:%M:%S", time.gmtime(time.time() - start_time))
+            print(f"Coalescent sample {replicate_id} drawn in {total_time}.")
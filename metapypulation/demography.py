@@ -0,0 +1,363 @@
+"""
+A module containing the class DemographicMetapopulation, an array-based metapopulation whose subpopulations grow, shrink,
+go extinct and are recolonised, with preallocated slots for the individuals of each subpopulation.
+"""
+
+import numpy as np
+from typing import List, Tuple
+
+from .interactions import InteractionModel, get_interaction
+from .metapopulation import Metapopulation
+from .wright_fisher import _sample_without_replacement
+
+class DemographicMetapopulation():
+    """
+    A metapopulation with births and deaths regulated by the carrying capacities. Each subpopulation has a fixed number
+    of slots, allocated once: `members[d]` holds the occupied slots of subpopulation `d` first (`sizes[d]` of them), then
+    the free slots, so that the end of the list of members is the free list. A birth takes the first free slot, a death
+    swaps its slot into the free part, and a subpopulation never reallocates or moves the features of its individuals.
+
+    At each generation:
+
+    - `make_interact()`: one focal individual of each subpopulation interacts with a random individual of the same
+      subpopulation (`interactions_per_generation` times), as in `Metapopulation`, using the batch kernel of the
+      interaction model.
+    - `regulate()`: births and deaths. With "logistic" regulation, each individual gives birth with probability
+      `birth_rate` and dies with probability `birth_rate * size / carrying_capacity`, so that subpopulations grow
+      logistically to their carrying capacity. With "fixed" regulation, a fraction `birth_rate` of individuals is
+      replaced on average and the size is then brought back to the carrying capacity. Newborns copy the features of a
+      random parent of the same subpopulation. Each subpopulation then goes extinct with probability `extinction_rate`.
+    - `migrate()`: each individual of subpopulation i moves to subpopulation j with probability m_ij. Empty
+      subpopulations are recolonised by migrants. Migrants that find no free slot are lost.
+
+    Attributes:
+        number_of_subpopulations (int): how many subpopulations compose the metapopulation.
+        type_of_interaction (str): A registered interaction model with a batch kernel, e.g. "axelrod_interaction" or "neutral_interaction".
+        interaction (InteractionModel): The registered model of `type_of_interaction`.
+        migration_matrix (np.ndarray): A matrix determining migration rates between subpopulations.
+        carrying_capacities (np.ndarray): Carrying capacity of each subpopulation.
+        number_of_features (int): Total number of cultural features per individual.
+        mutation_rate (float): Probability of a mutation to occur.
+        min_trait (int): Minimum value for a trait in each feature.
+        max_trait (int): Maximum value for a trait in each feature.
+        interactions_per_generation (int): Number of interactions in each subpopulation at each generation.
+        regulation (str): Either "logistic" or "fixed".
+        birth_rate (float): Probability that an individual gives birth at each generation.
+        extinction_rate (float): Probability that a subpopulation goes extinct at each generation.
+        slots_per_subpopulation (int): Maximum size of each subpopulation.
+        features (np.ndarray): Features of the individual in each slot, of shape (subpopulations, slots, features). Free slots hold stale values.
+        origin_ids (np.ndarray): Deme of origin of the individual in each slot, of shape (subpopulations, slots).
+        members (np.ndarray): For each subpopulation, its occupied slots then its free slots, of shape (subpopulations, slots).
+        sizes (np.ndarray): Current size of each subpopulation.
+        number_of_changes (int): Number of times individuals changed their features following an interaction.
+        number_of_births (int): Total number of births.
+        number_of_deaths (int): Total number of deaths, not counting extinctions.
+        number_of_extinctions (int): Total number of extinctions of subpopulations.
+        trait_counts (np.ndarray): For interaction models that use it, the number of individuals with each trait (from `min_trait`) at each feature in each subpopulation, of shape (subpopulations, features, traits), kept up to date at each change, birth, death and migration. None otherwise.
+    """
+    def __init__(self, number_of_subpopulations: int,
+                 type_of_interaction: str,
+                 migration_matrix: np.ndarray = None,
+                 carrying_capacities: List[int] | int = 100,
+                 number_of_features: int = 5,
+                 mutation_rate: float = 0.0,
+                 min_trait: int = 1,
+                 max_trait: int = 10,
+                 interactions_per_generation: int = 1,
+                 regulation: str = "logistic",
+                 birth_rate: float = 0.1,
+                 extinction_rate: float = 0.0,
+                 slots_per_subpopulation: int = None):
+        """Creates an empty metapopulation.
+
+        Args:
+            number_of_subpopulations (int): The total number of subpopulations to create.
+            type_of_interaction (str): A registered interaction model with a batch kernel.
+            migration_matrix (np.ndarray, optional): A matrix determining migration rates between subpopulations. Defaults to None, in which case there is no migration.
+            carrying_capacities (List[int] | int, optional): Either a list of carrying capacities or single integer determining the same carrying capacity for all subpopulations. Defaults to 100.
+            number_of_features (int, optional): Total number of cultural features per individual. Defaults to 5.
+            mutation_rate (float, optional): Probability of a mutation to occur. Defaults to 0.0.
+            min_trait (int, optional): Minimum value for a trait in each feature. Defaults to 1.
+            max_trait (int, optional): Maximum value for a trait in each feature. Defaults to 10.
+            interactions_per_generation (int, optional): Number of interactions in each subpopulation at each generation. Defaults to 1.
+            regulation (str, optional): Either "logistic" or "fixed". Defaults to "logistic".
+            birth_rate (float, optional): Probability that an individual gives birth at each generation. Defaults to 0.1.
+            extinction_rate (float, optional): Probability that a subpopulation goes extinct at each generation. Defaults to 0.0.
+            slots_per_subpopulation (int, optional): Maximum size of each subpopulation. Defaults to None, in which case it is twice the largest carrying capacity.
+        """
+        if regulation not in ("logistic", "fixed"):
+            raise ValueError(f"Unknown regulation {regulation}, choose between 'logistic' and 'fixed'.")
+        self.interaction: InteractionModel = get_interaction(type_of_interaction)
+        if self.interaction.batch_kernel is None:
+            raise ValueError(f"The interaction model {type_of_interaction} has no batch kernel!")
+
+        self.number_of_subpopulations = number_of_subpopulations
+        self.type_of_interaction = type_of_interaction
+        if migration_matrix is None:
+            migration_matrix = np.zeros((number_of_subpopulations, number_of_subpopulations))
+        self.migration_matrix = migration_matrix
+        match carrying_capacities:
+            case list():
+                assert number_of_subpopulations == len(carrying_capacities)
+                self.carrying_capacities = np.array(carrying_capacities, dtype=int)
+            case int():
+                self.carrying_capacities = np.full(number_of_subpopulations, carrying_capacities, dtype=int)
+        self.number_of_features = number_of_features
+        self.mutation_rate = mutation_rate
+        self.min_trait = min_trait
+        self.max_trait = max_trait
+        self.interactions_per_generation = interactions_per_generation
+        self.regulation = regulation
+        self.birth_rate = birth_rate
+        self.extinction_rate = extinction_rate
+        if slots_per_subpopulation is None:
+            slots_per_subpopulation = 2*int(self.carrying_capacities.max())
+        self.slots_per_subpopulation = slots_per_subpopulation
+
+        shape = (number_of_subpopulations, slots_per_subpopulation)
+        self.features = np.zeros(shape + (number_of_features,), dtype=int)
+        self.origin_ids = np.zeros(shape, dtype=int)
+        self.members = np.tile(np.arange(slots_per_subpopulation), (number_of_subpopulations, 1))
+        self.sizes = np.zeros(number_of_subpopulations, dtype=int)
+        self.number_of_changes = 0
+        self.number_of_births = 0
+        self.number_of_deaths = 0
+        self.number_of_extinctions = 0
+        number_of_traits = max_trait - min_trait + 1
+        self.trait_counts = np.zeros((number_of_subpopulations, number_of_features, number_of_traits), dtype=int) if self.interaction.uses_trait_counts else None
+
+        # as in the ensemble, an individual goes to j with probability m_ij, through one uniform compared to cumulative probabilities
+        stay = np.cumprod(1 - self.migration_matrix, axis=1)
+        self._cumulative_migration_probabilities = np.cumsum(self.migration_matrix*np.hstack((np.ones((number_of_subpopulations, 1)), stay[:, :-1])), axis=1)
+        self._emigration_probabilities = 1 - stay[:, -1]
+
+
+    def populate(self) -> None:
+        """Populate all (empty) subpopulations with individuals with random sets of features, up to the carrying capacities.
+        """
+        for subpopulation in range(self.number_of_subpopulations):
+            size = min(int(self.carrying_capacities[subpopulation]), self.slots_per_subpopulation)
+            features = np.random.randint(low = self.min_trait, high = self.max_trait + 1, size = (size, self.number_of_features))
+            self._add_individuals(subpopulation, features, np.full(size, subpopulation))
+
+
+    def get_metapopulation_size(self) -> int:
+        """
+        Returns:
+            int: the number of individuals in the whole metapopulation.
+        """
+        return int(self.sizes.sum())
+
+
+    def _add_individuals(self, subpopulation: int, features: np.ndarray, origin_ids: np.ndarray) -> int:
+        """
+        Put new individuals in the first free slots of a subpopulation.
+
+        Args:
+            subpopulation (int): Id of the subpopulation.
+            features (np.ndarray): Features of the new individuals.
+            origin_ids (np.ndarray): Deme of origin of the new individuals.
+
+        Returns:
+            int: Number of individuals added, fewer than given if there were not enough free slots.
+        """
+        size = self.sizes[subpopulation]
+        number_added = min(len(features), self.slots_per_subpopulation - size)
+        slots = self.members[subpopulation, size:size + number_added]
+        self.features[subpopulation, slots] = features[:number_added]
+        self.origin_ids[subpopulation, slots] = origin_ids[:number_added]
+        self.sizes[subpopulation] += number_added
+        if self.trait_counts is not None:
+            self._count_traits_of(subpopulation, features[:number_added], 1)
+
+        return number_added
+
+
+    def _remove_individuals(self, subpopulation: int, positions: np.ndarray) -> None:
+        """
+        Free the slots of some individuals of a subpopulation. The freed slots are the first ones to be taken again.
+
+        Args:
+            subpopulation (int): Id of the subpopulation.
+            positions (np.ndarray): Distinct positions of the individuals in the occupied part of `members[subpopulation]`.
+        """
+        size = self.sizes[subpopulation]
+        staying = np.ones(size, dtype=bool)
+        staying[positions] = False
+        occupied = self.members[subpopulation, :size]
+        if self.trait_counts is not None:
+            self._count_traits_of(subpopulation, self.features[subpopulation, occupied[~staying]], -1)
+        self.members[subpopulation, :size] = np.concatenate((occupied[staying], occupied[~staying]))
+        self.sizes[subpopulation] -= len(positions)
+
+
+    def _count_traits_of(self, subpopulation: int, features: np.ndarray, sign: int) -> None:
+        """
+        Add (sign 1) or remove (sign -1) individuals from the counts of the traits of a subpopulation.
+
+        Args:
+            subpopulation (int): Id of the subpopulation.
+            features (np.ndarray): Features of the individuals, of shape (individuals, features).
+            sign (int): 1 for individuals that arrive, -1 for individuals that leave.
+        """
+        number_of_traits = self.trait_counts.shape[-1]
+        flat_indexes = np.arange(self.number_of_features)*number_of_traits + features - self.min_trait
+        self.trait_counts[subpopulation] += sign*np.bincount(flat_indexes.reshape(-1), minlength = self.number_of_features*number_of_traits).reshape(
+            self.number_of_features, number_of_traits)
+
+
+    def make_interact(self) -> int:
+        """
+        Make the interactions of one generation in each (non-empty) subpopulation.
+
+        Returns:
+            int: the number of interactions made.
+        """
+        number_of_traits = self.max_trait - self.min_trait + 1
+        subpopulations = np.arange(self.number_of_subpopulations)
+        occupied = self.sizes > 0
+        last_positions = np.maximum(self.sizes - 1, 0)
+
+        for _ in range(self.interactions_per_generation):
+            random_numbers = np.random.rand(self.number_of_subpopulations, 6)
+            # empty subpopulations point to their first slot, their interaction is discarded below
+            focal = self.members[subpopulations, np.minimum((random_numbers[:, 0]*self.sizes).astype(int), last_positions)]
+            source = self.members[subpopulations, np.minimum((random_numbers[:, 1]*self.sizes).astype(int), last_positions)]
+            counts = {"trait_counts": self.trait_counts, "demes": subpopulations} if self.trait_counts is not None else {}
+            focal_features = self.features[subpopulations, focal]
+            changing, indexes_to_copy, new_traits = self.interaction.batch_kernel(focal_features, self.features[subpopulations, source],
+                                                                                  random_numbers[:, 2:], random_numbers[:, 3] <= self.mutation_rate,
+                                                                                  self.min_trait, number_of_traits, **counts)
+            changing = changing & occupied
+            self.features[subpopulations[changing], focal[changing], indexes_to_copy[changing]] = new_traits[changing]
+            if counts:
+                # one interaction per subpopulation and round, so no count is changed twice at once
+                old_traits = focal_features[changing, indexes_to_copy[changing]]
+                self.trait_counts[subpopulations[changing], indexes_to_copy[changing], old_traits - self.min_trait] -= 1
+                self.trait_counts[subpopulations[changing], indexes_to_copy[changing], new_traits[changing] - self.min_trait] += 1
+            self.number_of_changes += int(changing.sum())
+
+        return int(occupied.sum())*self.interactions_per_generation
+
+
+    def regulate(self) -> Tuple[int, int]:
+        """
+        Births, deaths and extinctions of one generation, see the class description.
+
+        Returns:
+            Tuple[int, int]: the number of births and the number of deaths (not counting extinctions).
+        """
+        total_births, total_deaths = 0, 0
+        for subpopulation in np.nonzero(self.sizes)[0]:
+            size = int(self.sizes[subpopulation])
+            carrying_capacity = int(self.carrying_capacities[subpopulation])
+            match self.regulation:
+                case "logistic":
+                    number_of_births = np.random.binomial(size, self.birth_rate)
+                    number_of_deaths = np.random.binomial(size, min(1.0, self.birth_rate*size/max(carrying_capacity, 1)))
+                case "fixed":
+                    number_of_deaths = min(size, np.random.binomial(size, self.birth_rate) + max(0, size - carrying_capacity))
+                    number_of_births = carrying_capacity - (size - number_of_deaths)
+
+            # parents are chosen among the individuals alive before the deaths
+            parents = self.members[subpopulation, np.random.randint(0, size, size = number_of_births)]
+            newborn_features = self.features[subpopulation, parents]
+            self._remove_individuals(subpopulation, _sample_without_replacement(size, number_of_deaths))
+            number_of_births = self._add_individuals(subpopulation, newborn_features, np.full(number_of_births, subpopulation))
+            total_births += number_of_births
+            total_deaths += number_of_deaths
+
+        extinct = (self.sizes > 0) & (np.random.rand(self.number_of_subpopulations) < self.extinction_rate)
+        # all slots of an extinct subpopulation become free at once
+        self.sizes[extinct] = 0
+        if self.trait_counts is not None:
+            self.trait_counts[extinct] = 0
+        self.number_of_extinctions += int(extinct.sum())
+        self.number_of_births += total_births
+        self.number_of_deaths += total_deaths
+
+        return total_births, total_deaths
+
+
+    def migrate(self) -> int:
+        """
+        Move each individual of subpopulation i to subpopulation j with probability m_ij.
+
+        Returns:
+            int: the number of individuals that arrived in a new subpopulation.
+        """
+        features, origin_ids, destinations = [], [], []
+        for subpopulation in np.nonzero(self.sizes)[0]:
+            random_numbers = np.random.rand(self.sizes[subpopulation])
+            positions = np.nonzero(random_numbers < self._emigration_probabilities[subpopulation])[0]
+            if len(positions) == 0:
+                continue
+            slots = self.members[subpopulation, positions]
+            features.append(self.features[subpopulation, slots])
+            origin_ids.append(self.origin_ids[subpopulation, slots])
+            # the same random number, below the emigration probability, chooses the destination
+            destinations.append(np.argmax(random_numbers[positions, np.newaxis] < self._cumulative_migration_probabilities[subpopulation], axis=1))
+            self._remove_individuals(subpopulation, positions)
+
+        if not destinations:
+            return 0
+        features, origin_ids, destinations = np.concatenate(features), np.concatenate(origin_ids), np.concatenate(destinations)
+        number_of_migrants = 0
+        for destination in np.unique(destinations):
+            arriving = destinations == destination
+            number_of_migrants += self._add_individuals(destination, features[arriving], origin_ids[arriving])
+
+        return number_of_migrants
+
+
+    def count_changes(self) -> int:
+        """
+        Counts how many times individuals changed their features following an interaction.
+
+        Returns:
+            int: total number of changes.
+        """
+        return self.number_of_changes
+
+
+    def get_state(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: the features (individuals x features), the id of the subpopulation and the id of the deme of origin of each individual, as in `Metapopulation.get_state()`.
+        """
+        deme_ids, positions = np.nonzero(np.arange(self.slots_per_subpopulation) < self.sizes[:, np.newaxis])
+        slots = self.members[deme_ids, positions]
+
+        return self.features[deme_ids, slots], deme_ids, self.origin_ids[deme_ids, slots]
+
+
+    def count_traits(self) -> np.ndarray:
+        """
+        Counts the individuals with each trait at each feature, in each subpopulation, from scratch (`trait_counts` holds
+        the same counts, kept up to date, for the models that use them).
+
+        Returns:
+            np.ndarray: Array of shape (subpopulations, features, traits), where traits are counted from `min_trait`.
+        """
+        features, deme_ids, _ = self.get_state()
+        number_of_traits = self.max_trait - self.min_trait + 1
+        flat_indexes = (deme_ids[:, np.newaxis]*self.number_of_features + np.arange(self.number_of_features))*number_of_traits + features - self.min_trait
+        shape = (self.number_of_subpopulations, self.number_of_features, number_of_traits)
+
+        return np.bincount(flat_indexes.reshape(-1), minlength = np.prod(shape)).reshape(shape)
+
+
+    def to_metapopulation(self) -> Metapopulation:
+        """
+        Create a `Metapopulation` with the current state, for example to measure its diversity. Measurements that divide
+        by the size of a subpopulation are not defined for extinct subpopulations.
+
+        Returns:
+            Metapopulation: a metapopulation with the same individuals.
+        """
+        metapopulation = Metapopulation(self.number_of_subpopulations, self.type_of_interaction, self.migration_matrix,
+                                        self.sizes.tolist(), self.number_of_features, self.max_trait - self.min_trait + 1,
+                                        self.mutation_rate, self.min_trait, self.max_trait)
+        metapopulation.populate_from_arrays(*self.get_state())
+
+        return metapopulation
@@ -0,0 +1,349 @@
+"""
+A module containing an ensemble of replicates of the (Moran) metapopulation that are advanced together, with all their
+individuals in one array, so that the cost of each generation is shared by all replicates.
+"""
+
+import numpy as np
+import time
+from typing import List, Tuple
+
+from .interactions import InteractionModel, get_interaction
+from .recorder import MeasurementRecorder, measure_state
+from .simulation import Simulation
+
+class EnsembleMetapopulation():
+    """
+    Several independent replicates of a metapopulation with the same dynamics as `Metapopulation`: at each generation,
+    one focal individual of each subpopulation interacts with a random individual of the same subpopulation, and
+    migration moves random individuals between subpopulations following the migration matrix.
+
+    The state is kept in arrays of shape (replicates, individuals, ...), with the individuals of each replicate sorted by
+    subpopulation. Each replicate draws its random numbers from its own generator, so that a replicate does not depend on
+    how many other replicates are simulated with it.
+
+    Attributes:
+        number_of_replicates (int): Number of replicates.
+        number_of_subpopulations (int): how many subpopulations compose each metapopulation.
+        type_of_interaction (str): A registered interaction model with a batch kernel, e.g. "axelrod_interaction" or "neutral_interaction".
+        interaction (InteractionModel): The registered model of `type_of_interaction`.
+        migration_matrix (np.ndarray): A matrix determining migration rates between subpopulations.
+        carrying_capacities (List[int] | int): A list of carrying capacities (one for each subpopulation) or an integer (same carrying capacity for each subpopulation).
+        number_of_features (int): Total number of cultural features per individual.
+        mutation_rate (float): Probability of a mutation to occur.
+        min_trait (int): Minimum value for a trait in each feature.
+        max_trait (int): Maximum value for a trait in each feature.
+        interactions_per_generation (int): Number of interactions in each subpopulation at each generation.
+        generators (List[np.random.Generator]): Random number generator of each replicate.
+        block_size (int): Number of rounds of interactions for which random numbers are drawn at once.
+        features (np.ndarray): Array of shape (replicates, individuals, features) with the features of all individuals.
+        deme_ids (np.ndarray): Subpopulation of each individual in each replicate (sorted).
+        origin_ids (np.ndarray): Subpopulation where each individual originated, in each replicate.
+        subpopulation_sizes (np.ndarray): Current size of each subpopulation in each replicate.
+        subpopulation_offsets (np.ndarray): Index of the first individual of each subpopulation in each replicate.
+        number_of_changes (int): Number of times individuals changed their features following an interaction.
+        trait_counts (np.ndarray): For interaction models that use it, the number of individuals with each trait (from `min_trait`) at each feature in each subpopulation of each replicate, of shape (replicates, subpopulations, features, traits). None otherwise.
+    """
+    def __init__(self, number_of_replicates: int,
+                 number_of_subpopulations: int,
+                 type_of_interaction: str,
+                 migration_matrix: np.ndarray,
+                 carrying_capacities: List[int] | int = 100,
+                 number_of_features: int = 5,
+                 mutation_rate: float = 0.0,
+                 min_trait: int = 1,
+                 max_trait: int = 10,
+                 interactions_per_generation: int = 1,
+                 seed: int = None,
+                 block_size: int = 256):
+        """Creates an empty ensemble.
+
+        Args:
+            number_of_replicates (int): Number of replicates.
+            number_of_subpopulations (int): The total number of subpopulations in each replicate.
+            type_of_interaction (str): A registered interaction model with a batch kernel, e.g. "axelrod_interaction" or "neutral_interaction".
+            migration_matrix (np.ndarray): A matrix determining migration rates between subpopulations.
+            carrying_capacities (List[int] | int, optional): Either a list of carrying capacities or single integer determining the same carrying capacity for all subpopulations. Defaults to 100.
+            number_of_features (int, optional): Total number of cultural features per individual. Defaults to 5.
+            mutation_rate (float, optional): Probability of a mutation to occur. Defaults to 0.0.
+            min_trait (int, optional): Minimum value for a trait in each feature. Defaults to 1.
+            max_trait (int, optional): Maximum value for a trait in each feature. Deafults to 10.
+            interactions_per_generation (int, optional): Number of interactions in each subpopulation at each generation. Defaults to 1.
+            seed (int, optional): Seed from which the generators of the replicates are derived. Defaults to None, in which case fresh entropy is used.
+            block_size (int, optional): Number of rounds of interactions for which random numbers are drawn at once. Defaults to 256.
+        """
+        self.interaction: InteractionModel = get_interaction(type_of_interaction)
+        if self.interaction.batch_kernel is None:
+            raise ValueError(f"The interaction model {type_of_interaction} has no batch kernel!")
+        if not isinstance(interactions_per_generation, int):
+            raise ValueError("The ensemble only accepts an int number of interactions per generation!")
+
+        self.number_of_replicates = number_of_replicates
+        self.number_of_subpopulations = number_of_subpopulations
+        self.type_of_interaction = type_of_interaction
+        self.migration_matrix = migration_matrix
+        self.carrying_capacities = carrying_capacities
+        self.number_of_features = number_of_features
+        self.mutation_rate = mutation_rate
+        self.min_trait = min_trait
+        self.max_trait = max_trait
+        self.interactions_per_generation = interactions_per_generation
+        self.generators = [np.random.default_rng(sequence) for sequence in np.random.SeedSequence(seed).spawn(number_of_replicates)]
+        self.block_size = block_size
+
+        self.features = np.zeros((number_of_replicates, 0, number_of_features), dtype=int)
+        self.deme_ids = np.zeros((number_of_replicates, 0), dtype=int)
+        self.origin_ids = np.zeros((number_of_replicates, 0), dtype=int)
+        self.subpopulation_sizes = np.zeros((number_of_replicates, number_of_subpopulations), dtype=int)
+        self.subpopulation_offsets = np.zeros((number_of_replicates, number_of_subpopulations), dtype=int)
+        self.number_of_changes = 0
+        self.trait_counts = None
+
+        # migrating from deme i to the destinations j in order is a sequence of binomial draws on the individuals left,
+        # so an individual goes to j with probability m_ij * prod_{j' < j} (1 - m_ij') and stays with prod_j (1 - m_ij)
+        stay = np.cumprod(1 - migration_matrix, axis=1)
+        self._cumulative_migration_probabilities = np.cumsum(migration_matrix*np.hstack((np.ones((number_of_subpopulations, 1)), stay[:, :-1])), axis=1)
+        self._emigration_probabilities = 1 - stay[:, -1]
+        self._random_numbers = {"interaction": np.zeros((number_of_replicates, 0)), "migration": np.zeros((number_of_replicates, 0))}
+        self._next_random_numbers = {"interaction": 0, "migration": 0}
+
+
+    def populate(self) -> None:
+        """Populate all replicates with individuals with random sets of features, up to the carrying capacities.
+        """
+        match self.carrying_capacities:
+            case list():
+                assert self.number_of_subpopulations == len(self.carrying_capacities)
+                sizes = np.array(self.carrying_capacities, dtype=int)
+            case int():
+                sizes = np.full(self.number_of_subpopulations, self.carrying_capacities, dtype=int)
+
+        deme_ids = np.repeat(np.arange(self.number_of_subpopulations), sizes)
+        self.deme_ids = np.tile(deme_ids, (self.number_of_replicates, 1))
+        self.origin_ids = self.deme_ids.copy()
+        self.features = np.stack([generator.integers(self.min_trait, self.max_trait + 1, size = (len(deme_ids), self.number_of_features))
+                                  for generator in self.generators])
+        self._update_offsets()
+
+
+    def _draw_random_numbers(self, step: str) -> np.ndarray:
+        """
+        Random numbers are drawn by each generator for a block of rounds at once, and handed out one round at a time.
+
+        Args:
+            step (str): Either "interaction" or "migration".
+
+        Returns:
+            np.ndarray: Uniform random numbers for one round. For "interaction", of shape (replicates, subpopulations, 6): focal individual, source individual, then interaction, mutation, feature to copy and new trait as in `Individual`. For "migration", of shape (replicates, individuals).
+        """
+        if self._next_random_numbers[step] == self._random_numbers[step].shape[1]:
+            match step:
+                case "interaction":
+                    shape = (self.block_size, self.number_of_subpopulations, 6)
+                case "migration":
+                    # the block holds about as many numbers as the block for interactions
+                    number_of_individuals = self.features.shape[1]
+                    shape = (max(1, self.block_size*self.number_of_subpopulations*6//max(1, number_of_individuals)), number_of_individuals)
+            self._random_numbers[step] = np.stack([generator.random(shape) for generator in self.generators])
+            self._next_random_numbers[step] = 0
+        self._next_random_numbers[step] += 1
+
+        return self._random_numbers[step][:, self._next_random_numbers[step] - 1]
+
+
+    def make_interact(self) -> int:
+        """
+        Make the interactions of one generation in each subpopulation of each replicate.
+
+        Returns:
+            int: the number of interactions made.
+        """
+        number_of_traits = self.max_trait - self.min_trait + 1
+        replicates = np.arange(self.number_of_replicates)[:, np.newaxis]
+        occupied = self.subpopulation_sizes > 0
+        number_of_interactions = 0
+        counts = {}
+        if self.interaction.uses_trait_counts:
+            demes = np.arange(self.number_of_replicates*self.number_of_subpopulations).reshape(self.number_of_replicates, self.number_of_subpopulations)
+            counts = {"trait_counts": self.trait_counts.reshape(-1, self.number_of_features, number_of_traits), "demes": demes}
+
+        for _ in range(self.interactions_per_generation):
+            random_numbers = self._draw_random_numbers("interaction")
+            focal = self.subpopulation_offsets + (random_numbers[..., 0]*self.subpopulation_sizes).astype(int)
+            source = self.subpopulation_offsets + (random_numbers[..., 1]*self.subpopulation_sizes).astype(int)
+            # empty subpopulations point to a valid index, their interaction is discarded below
+            focal = np.minimum(focal, self.features.shape[1] - 1)
+            source = np.minimum(source, self.features.shape[1] - 1)
+            focal_features = self.features[replicates, focal]
+            source_features = self.features[replicates, source]
+
+            mutate = random_numbers[..., 3] <= self.mutation_rate
+            changing, indexes_to_copy, new_traits = self.interaction.batch_kernel(focal_features, source_features, random_numbers[..., 2:],
+                                                                                  mutate, self.min_trait, number_of_traits, **counts)
+            changing = changing & occupied
+
+            changing_replicates, changing_subpopulations = np.nonzero(changing)
+            self.features[changing_replicates, focal[changing], indexes_to_copy[changing]] = new_traits[changing]
+            if counts:
+                # one interaction per subpopulation and round, so no count is changed twice at once
+                old_traits = focal_features[changing, indexes_to_copy[changing]]
+                self.trait_counts[changing_replicates, changing_subpopulations, indexes_to_copy[changing], old_traits - self.min_trait] -= 1
+                self.trait_counts[changing_replicates, changing_subpopulations, indexes_to_copy[changing], new_traits[changing] - self.min_trait] += 1
+            self.number_of_changes += len(changing_replicates)
+            number_of_interactions += int(occupied.sum())
+
+        return number_of_interactions
+
+
+    def migrate(self) -> int:
+        """
+        Move random individuals between subpopulations in each replicate, following the migration matrix. Each individual
+        leaves with the total emigration rate of its subpopulation, which is the same as drawing the number of migrants
+        of each subpopulation and then random migrants.
+
+        Returns:
+            int: the number of individuals that migrated.
+        """
+        random_numbers = self._draw_random_numbers("migration")
+        leaving = random_numbers < self._emigration_probabilities[self.deme_ids]
+        if not leaving.any():
+            return 0
+
+        migrating_replicates, migrants = np.nonzero(leaving)
+        sources = self.deme_ids[migrating_replicates, migrants]
+        # the same random number, below the emigration probability, chooses the destination
+        destinations = np.argmax(random_numbers[migrating_replicates, migrants, np.newaxis] < self._cumulative_migration_probabilities[sources], axis=1)
+        self.deme_ids[migrating_replicates, migrants] = destinations
+
+        # keep individuals sorted by subpopulation
+        number_of_individuals = self.deme_ids.shape[1]
+        order = (np.argsort(self.deme_ids, axis=1, kind='stable') + number_of_individuals*np.arange(self.number_of_replicates)[:, np.newaxis]).ravel()
+        self.deme_ids = self.deme_ids.ravel()[order].reshape(self.deme_ids.shape)
+        self.origin_ids = self.origin_ids.ravel()[order].reshape(self.origin_ids.shape)
+        self.features = self.features.reshape(-1, self.number_of_features)[order].reshape(self.features.shape)
+        self._update_offsets()
+
+        return len(migrants)
+
+
+    def _update_offsets(self) -> None:
+        """
+        Recalculate the size of each subpopulation and where each subpopulation starts in the (sorted) arrays.
+        """
+        replicate_demes = self.deme_ids + self.number_of_subpopulations*np.arange(self.number_of_replicates)[:, np.newaxis]
+        self.subpopulation_sizes = np.bincount(replicate_demes.ravel(), minlength=self.number_of_replicates*self.number_of_subpopulations).reshape(self.number_of_replicates, self.number_of_subpopulations)
+        self.subpopulation_offsets = np.cumsum(self.subpopulation_sizes, axis=1) - self.subpopulation_sizes
+        if self.interaction.uses_trait_counts:
+            # counted again after migration, and updated one change at a time by the interactions
+            number_of_traits = self.max_trait - self.min_trait + 1
+            flat_indexes = ((replicate_demes[..., np.newaxis]*self.number_of_features + np.arange(self.number_of_features))*number_of_traits
+                            + self.features - self.min_trait)
+            shape = (self.number_of_replicates, self.number_of_subpopulations, self.number_of_features, number_of_traits)
+            self.trait_counts = np.bincount(flat_indexes.ravel(), minlength = np.prod(shape)).reshape(shape)
+
+
+    def get_state(self, replicate: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Args:
+            replicate (int): Index of the replicate (from 0).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: the features (individuals x features), the id of the subpopulation and the id of the deme of origin of each individual of the replicate, as in `Metapopulation.get_state()`.
+        """
+        return self.features[replicate], self.deme_ids[replicate], self.origin_ids[replicate]
+
+
+class EnsembleSimulation(Simulation):
+    """
+    A `Simulation` in which all replicates are advanced together by an `EnsembleMetapopulation`. The outputs are the same
+    as those of `Simulation` with the "moran" update mode, which is much faster for small subpopulations, where the cost
+    of a generation is dominated by the overhead of each call rather than by the number of individuals.
+
+    Attributes:
+        seed (int): Seed from which the generators of the replicates are derived.
+    """
+    def __init__(self,
+                 generations: int,
+                 number_of_subpopulations: int,
+                 migration_matrix: str | np.ndarray,
+                 interaction: str,
+                 carrying_capacities: List[int] | int,
+                 replicates: int,
+                 output_path: str,
+                 burn_in: int = 0,
+                 migration_rate: float = 0.001,
+                 mutation_rate: float = 0.0,
+                 measure_timing: int = 100,
+                 verbose: bool = True,
+                 verbose_timing: int = 10000,
+                 interactions_per_generation: int = 1,
+                 record_per_subpopulation: bool = False,
+                 aggregate_replicates: bool = False,
+                 keep_replicates: bool = True,
+                 quantiles: List[float] = None,
+                 seed: int = None):
+        """
+        Create an ensemble simulation. Arguments are the same as for `Simulation`.
+
+        Args:
+            generations (int): Number of generations to simulate.
+            number_of_subpopulations (int): Number of subpopulations in the metapopulation.
+            migration_matrix (str | np.ndarray): Type of migration topology. Either a string to generate a table or a numpy array matrix.
+            interaction (str): Type of interaction between individuals. Either "axelrod_interaction" or "neutral_interaction".
+            carrying_capacities (List[int] | int): Initial population size of each subpopulation.
+            replicates (int): Number of replicates to simulate.
+            output_path (str): Path of folder in which to save results.
+            burn_in (int, optional): Number of generations without migration in the beginning of the simulation. Defaults to 0.
+            migration_rate (float, optional): Migration rate used to generate a migration matrix when there is str input. Defaults to 0.001.
+            mutation_rate (float, optional): Probability of a mutation to occur during copying. Defaults to 0.0.
+            measure_timing (int, optional): Number of generations between measurements. Defaults to 100.
+            verbose (bool, optional): Whether to print text during the simulation. Defaults to True.
+            verbose_timing (int, optional): Number of generations between each print statement. Defaults to 10000.
+            interactions_per_generation (int, optional): Number of interactions in each subpopulation at each generation. Defaults to 1.
+            record_per_subpopulation (bool, optional): Whether to keep and save the measurements of each subpopulation. Defaults to False.
+            aggregate_replicates (bool, optional): Whether to keep a streaming summary of the replicates. Defaults to False.
+            keep_replicates (bool, optional): Whether to keep every replicate in the output tables. Defaults to True.
+            quantiles (List[float], optional): Quantiles estimated by the streaming summary. Defaults to None.
+            seed (int, optional): Seed from which the generators of the replicates are derived. Defaults to None.
+        """
+        super().__init__(generations, number_of_subpopulations, migration_matrix, interaction, carrying_capacities,
+                         replicates, output_path, burn_in = burn_in, migration_rate = migration_rate,
+                         mutation_rate = mutation_rate, measure_timing = measure_timing, verbose = verbose,
+                         verbose_timing = verbose_timing, interactions_per_generation = interactions_per_generation,
+                         record_per_subpopulation = record_per_subpopulation, aggregate_replicates = aggregate_replicates,
+                         keep_replicates = keep_replicates, quantiles = quantiles)
+        self.seed = seed
+
+
+    def run_simulation(self) -> None:
+        """
+        Run all the replicates together and save the outputs.
+        """
+        start_time = time.time()
+        ensemble = EnsembleMetapopulation(self.replicates, self.number_of_subpopulations, self.interaction_type,
+                                          self.migration_matrix, self.carrying_capacities, mutation_rate = self.mutation_rate,
+                                          interactions_per_generation = self.interactions_per_generation, seed = self.seed)
+        ensemble.populate()
+        recorders = [MeasurementRecorder(self.generations//self.measure_timing + 1, self.number_of_subpopulations) for _ in range(self.replicates)]
+
+        for t in range(self.generations + 1):
+            if self.verbose and t%self.verbose_timing == 0:
+                print(f"Ensemble of {self.replicates} replicates, gen {t}!")
+
+            if t%self.measure_timing == 0:
+                for replicate, recorder in enumerate(recorders):
+                    recorder.add_sample(measure_state(ensemble.get_state(replicate), self.number_of_subpopulations,
+                                                      ensemble.number_of_features, ensemble.min_trait, ensemble.max_trait))
+
+            if t > self.burn_in:
+                ensemble.migrate()
+
+            ensemble.make_interact()
+
+        for replicate, recorder in enumerate(recorders):
+            self.store_replicate(recorder, replicate + 1)
+
+        if self.verbose:
+            total_time = time.strftime("%H:%M:%S", time.gmtime(time.time() - start_time))
+            print(f"The ensemble ran in {total_time}.")
+
+        self.save_output()
@@ -0,0 +1,172 @@
+"""
+A module containing the evaluation of measurements on stored snapshots after the simulation, in parallel chunks and
+with a cache of the values already computed.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import json
+import numpy as np
+import os
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from .snapshots import SnapshotReader
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+def metric_name(metric: str | Tuple) -> str:
+    """
+    Args:
+        metric (str | Tuple): Name of a method of `Metapopulation`, or a tuple with the name and its arguments (e.g. ("fixation_index", 0, 1)).
+
+    Returns:
+        str: Name of the metric in the results and in the cache, e.g. "fixation_index(0, 1)".
+    """
+    if isinstance(metric, str):
+        return metric
+    return f"{metric[0]}({', '.join(str(argument) for argument in metric[1:])})"
+
+
+def evaluate_chunk(path: str, snapshots: List[Tuple[int, int]], metrics: List[str | Tuple],
+                   type_of_interaction: str = "axelrod_interaction") -> Dict[str, float | list]:
+    """
+    Compute the metrics on some snapshots of a store. Each worker opens the store itself, so that only the snapshots of its chunk are read.
+
+    Args:
+        path (str): Path prefix of the snapshot files.
+        snapshots (List[Tuple[int, int]]): (replicate, sample) indexes of the snapshots.
+        metrics (List[str | Tuple]): Metrics to compute, see `metric_name()`.
+        type_of_interaction (str, optional): Type of interaction of the rebuilt metapopulations. Defaults to "axelrod_interaction".
+
+    Returns:
+        Dict[str, float | list]: Value of each metric for each snapshot, with keys as in `MetricCache`.
+    """
+    reader = SnapshotReader(path)
+    values = {}
+    for replicate, sample in snapshots:
+        metapopulation = reader.to_metapopulation(replicate, sample, type_of_interaction)
+        for metric in metrics:
+            method, arguments = (metric, ()) if isinstance(metric, str) else (metric[0], metric[1:])
+            value = getattr(metapopulation, method)(*arguments)
+            values[MetricCache.key(replicate, sample, metric_name(metric))] = np.asarray(value).tolist()
+
+    return values
+
+
+class MetricCache():
+    """
+    Values of metrics already computed on the snapshots of a store, saved in `{path}_metrics.json`. The cache is emptied
+    when the snapshot files are written again.
+
+    Attributes:
+        file (str): Path of the cache file.
+        snapshot_time (float): Modification time of the snapshot files when the values were computed.
+        values (Dict[str, float | list]): Value of each metric, with keys "replicate/sample/metric".
+    """
+    def __init__(self, path: str):
+        """
+        Load the cache of a store, if it exists.
+
+        Args:
+            path (str): Path prefix of the snapshot files.
+        """
+        self.file = f"{path}_metrics.json"
+        self.snapshot_time = os.path.getmtime(f"{path}_features.npy")
+        self.values = {}
+        if os.path.exists(self.file):
+            with open(self.file) as file:
+                cache = json.load(file)
+            if cache["snapshot_time"] == self.snapshot_time:
+                self.values = cache["values"]
+
+
+    @staticmethod
+    def key(replicate: int, sample: int, metric: str) -> str:
+        """
+        Args:
+            replicate (int): Index of the replicate.
+            sample (int): Index of the sample.
+            metric (str): Name of the metric.
+
+        Returns:
+            str: Key of the value in the cache.
+        """
+        return f"{replicate}/{sample}/{metric}"
+
+
+    def save(self) -> None:
+        """
+        Write the cache file.
+        """
+        with open(self.file, "w") as file:
+            json.dump({"snapshot_time": self.snapshot_time, "values": self.values}, file)
+
+
+def evaluate_snapshots(path: str, metrics: List[str | Tuple], replicates: List[int] = None, samples: List[int] = None,
+                       number_of_processes: int = 1, chunk_size: int = 16, type_of_interaction: str = "axelrod_interaction",
+                       use_cache: bool = True) -> "pd.DataFrame":
+    """
+    Compute measurements on the snapshots recorded by a simulation (see `SnapshotStore`). Snapshots are split in chunks
+    that are evaluated in parallel, and values already in the cache are not computed again.
+
+    Args:
+        path (str): Path prefix of the snapshot files (`{output_path}_snapshots` for a `Simulation`).
+        metrics (List[str | Tuple]): Methods of `Metapopulation` to call, by name, or as a tuple with the name and the arguments (e.g. ("fixation_index", 0, 1)).
+        replicates (List[int], optional): Indexes of the replicates to evaluate. Defaults to None, in which case all replicates are evaluated.
+        samples (List[int], optional): Indexes of the samples to evaluate. Defaults to None, in which case all samples are evaluated.
+        number_of_processes (int, optional): Number of worker processes. Defaults to 1, in which case no process is started.
+        chunk_size (int, optional): Number of snapshots evaluated by a worker at once. Defaults to 16.
+        type_of_interaction (str, optional): Type of interaction of the rebuilt metapopulations. Defaults to "axelrod_interaction".
+        use_cache (bool, optional): Whether to read and update the cache of computed values. Defaults to True.
+
+    Returns:
+        pd.DataFrame: One row per snapshot, with columns "Replicate", "Generation" and one column per metric.
+    """
+    import pandas as pd
+
+    reader = SnapshotReader(path)
+    if replicates is None:
+        replicates = range(reader.number_of_replicates)
+    if samples is None:
+        samples = range(len(reader.times))
+    snapshots = [(int(replicate), int(sample)) for replicate in replicates for sample in samples]
+    names = [metric_name(metric) for metric in metrics]
+
+    cache = MetricCache(path) if use_cache else None
+    values = {} if cache is None else cache.values
+
+    missing = {}
+    for replicate, sample in snapshots:
+        for metric, name in zip(metrics, names):
+            if MetricCache.key(replicate, sample, name) not in values:
+                missing.setdefault((replicate, sample), []).append(metric)
+
+    # snapshots with the same missing metrics are evaluated together
+    groups: Dict[Tuple[str, ...], List[Tuple[int, int]]] = {}
+    for snapshot, missing_metrics in missing.items():
+        groups.setdefault(tuple(metric_name(metric) for metric in missing_metrics), []).append(snapshot)
+    tasks = []
+    for group in groups.values():
+        group_metrics = missing[group[0]]
+        for start in range(0, len(group), chunk_size):
+            tasks.append((path, group[start:start + chunk_size], group_metrics, type_of_interaction))
+
+    if number_of_processes == 1:
+        for task in tasks:
+            values.update(evaluate_chunk(*task))
+    elif tasks:
+        with ProcessPoolExecutor(number_of_processes) as executor:
+            for chunk_values in executor.map(evaluate_chunk, *zip(*tasks)):
+                values.update(chunk_values)
+
+    if cache is not None and tasks:
+        cache.save()
+
+    rows = []
+    for replicate, sample in snapshots:
+        row = {"Replicate": replicate, "Generation": int(reader.times[sample])}
+        for name in names:
+            row[name] = values[MetricCache.key(replicate, sample, name)]
+        rows.append(row)
+
+    return pd.DataFrame(rows)
@@ -5,6 +5,9 @@ A module containing the individual class.
 import numpy as np
 from typing import Callable, List
 
+# Tracers carried by a trait that descends from no tracer. Sets of tracers are immutable, so that copying a trait shares them.
+NO_TRACERS = frozenset()
+
 class Individual():
     """
     Base class for an individual in the metapopulation.
@@ -17,6 +20,8 @@ class Individual():
         mutation_rate (float): Probability of a random mutation to occur during cultural transmission.
         features (List[int]): List of features of the individual.
         number_of_changes (int): The number of times this individual has changed set of features following an interaction.
+        tracers (List[frozenset]): For each feature, the ids of the neutral tracers carried by the trait (see `NeutralTracers`). None when tracers are not followed.
+        network_slot (int): Slot of the individual in the social network of its subpopulation (see `SocialNetwork`). None when the subpopulation has no network.
     """
     def __init__(self, id: int, original_deme_id: int, number_of_features: int, number_of_traits: int, mutation_rate: float = 0.0, features: List = None):
         """
@@ -47,9 +52,11 @@ class Individual():
 
         self.number_of_changes = 0
         self.number_of_mutations = 0
+        self.tracers = None
+        self.network_slot = None
         
     
-    def axelrod_interaction(self, interacting_individual: "Individual") -> None:
+    def axelrod_interaction(self, interacting_individual: "Individual", random_numbers: np.ndarray = None, mutate: bool = None) -> None:
         """
         Interaction following the Axelrod model of culture dissemination. A random individual (source) is selected. The probability of interacting is given 
         by the number of traits in common between the focal individual (self) and the source divided by the total number of features. If they interact, 
@@ -57,48 +64,124 @@ class Individual():
 
         Args:
             interacting_individual (Individual): Individual with which the self individual interacts. Currently accepts only "axelrod_interaction".
+            random_numbers (np.ndarray, optional): Four uniform random numbers drawn in advance (interaction, mutation, feature to copy, new trait), as in batched interactions. Defaults to None, in which case they are drawn here.
+            mutate (bool, optional): Whether a copy would mutate, decided in advance by the subpopulation. Defaults to None, in which case a random number is drawn against the mutation rate.
         """
+        if random_numbers is not None:
+            self._axelrod_interaction_from_random_numbers(interacting_individual, random_numbers, mutate)
+            return
+
         probability_of_interaction = 1 - np.count_nonzero(self.features - interacting_individual.features)/self.number_of_features
-        [interaction_random_number, mutation_random_number] = np.random.rand(2) # generates two random numbers
+        if mutate is None:
+            [interaction_random_number, mutation_random_number] = np.random.rand(2) # generates two random numbers
+            mutate = mutation_random_number <= self.mutation_rate
+        else:
+            interaction_random_number = np.random.rand()
         if (interaction_random_number <= probability_of_interaction) and (probability_of_interaction < 1.0):
             index_to_copy = np.random.choice(np.nonzero(self.features - interacting_individual.features)[0])
-            if mutation_random_number <= self.mutation_rate:
+            if mutate:
                 # if mutation is occurring, just chose a random trait from possible traits
+                old_trait = self.features[index_to_copy]
                 self.features[index_to_copy] = np.random.randint(low = 1, high = self.number_of_traits+1, size=1)
                 self.number_of_mutations += 1
-                self.number_of_changes += 1
+                # a mutation can draw the trait the individual already has
+                if self.features[index_to_copy] != old_trait:
+                    self.number_of_changes += 1
             else:
                 self.features[index_to_copy] = interacting_individual.features[index_to_copy]
                 self.number_of_changes += 1         
 
+
+    def _axelrod_interaction_from_random_numbers(self, interacting_individual: "Individual", random_numbers: np.ndarray, mutate: bool = None) -> None:
+        """
+        Same as `axelrod_interaction`, using random numbers drawn in advance instead of drawing them one by one.
+        """
+        interaction_random_number, mutation_random_number, choice_random_number, trait_random_number = random_numbers
+        if mutate is None:
+            mutate = mutation_random_number <= self.mutation_rate
+        differing_features = np.nonzero(self.features != interacting_individual.features)[0]
+        probability_of_interaction = 1 - len(differing_features)/self.number_of_features
+        if (interaction_random_number <= probability_of_interaction) and (probability_of_interaction < 1.0):
+            index_to_copy = differing_features[int(choice_random_number*len(differing_features))]
+            old_trait = self.features[index_to_copy]
+            if mutate:
+                self.features[index_to_copy] = 1 + int(trait_random_number*self.number_of_traits)
+                self.number_of_mutations += 1
+            else:
+                self.features[index_to_copy] = interacting_individual.features[index_to_copy]
+            if self.features[index_to_copy] != old_trait:
+                self.number_of_changes += 1
+
             
-    def neutral_interaction(self, interacting_individual: "Individual") -> None:
+    def neutral_interaction(self, interacting_individual: "Individual", random_numbers: np.ndarray = None, mutate: bool = None) -> None:
         """
         Interaction following a neutral model, where replication of a trait is purely based on frequency in the population. The focal indivdual changes one 
         trait at random copying from the source individual.
+
+        Args:
+            interacting_individual (Individual): Individual with which the self individual interacts.
+            random_numbers (np.ndarray, optional): Four uniform random numbers drawn in advance (unused, mutation, feature to copy, new trait), as in batched interactions. Defaults to None, in which case they are drawn here.
+            mutate (bool, optional): Whether the copy mutates, decided in advance by the subpopulation. Defaults to None, in which case a random number is drawn against the mutation rate.
         """
-        mutation_random_number = np.random.rand()
+        if random_numbers is not None:
+            self._neutral_interaction_from_random_numbers(interacting_individual, random_numbers, mutate)
+            return
+
+        if mutate is None:
+            mutate = np.random.rand() <= self.mutation_rate
         index_to_copy = np.random.choice(range(0, self.number_of_features))
-        if mutation_random_number <= self.mutation_rate:
+        old_trait = self.features[index_to_copy]
+        if mutate:
             self.features[index_to_copy] = np.random.randint(low = 1, high = self.number_of_traits+1, size=1)
             self.number_of_mutations += 1
+            if self.tracers is not None:
+                self.tracers[index_to_copy] = NO_TRACERS
+        else:
+            self.features[index_to_copy] = interacting_individual.features[index_to_copy]
+            if self.tracers is not None:
+                self.tracers[index_to_copy] = interacting_individual.tracers[index_to_copy]
+        # copying a trait the individual already has is not a change
+        if self.features[index_to_copy] != old_trait:
             self.number_of_changes += 1
+
+
+    def _neutral_interaction_from_random_numbers(self, interacting_individual: "Individual", random_numbers: np.ndarray, mutate: bool = None) -> None:
+        """
+        Same as `neutral_interaction`, using random numbers drawn in advance instead of drawing them one by one.
+        """
+        _, mutation_random_number, choice_random_number, trait_random_number = random_numbers
+        if mutate is None:
+            mutate = mutation_random_number <= self.mutation_rate
+        index_to_copy = int(choice_random_number*self.number_of_features)
+        old_trait = self.features[index_to_copy]
+        if mutate:
+            self.features[index_to_copy] = 1 + int(trait_random_number*self.number_of_traits)
+            self.number_of_mutations += 1
+            if self.tracers is not None:
+                self.tracers[index_to_copy] = NO_TRACERS
         else:
             self.features[index_to_copy] = interacting_individual.features[index_to_copy]
+            if self.tracers is not None:
+                self.tracers[index_to_copy] = interacting_individual.tracers[index_to_copy]
+        if self.features[index_to_copy] != old_trait:
             self.number_of_changes += 1
 
             
-    def interact(self, interacting_individual: "Individual", interaction_function: str) -> None:
+    def interact(self, interacting_individual: "Individual", interaction_function: str, random_numbers: np.ndarray = None, mutate: bool = None) -> None:
         """
         Wrapper for interactions, it allows to pass any interaction that is coded for.
 
         Args:
-            interaction_function (str): The type of interaction that decides the outcome of the interaction. Current options are "neutral_interaction" and "axelrod_interaction".
+            interaction_function (str): The type of interaction that decides the outcome of the interaction. Options are "neutral_interaction", "axelrod_interaction" and any model registered with `register_interaction()`, except the models that use the counts of the traits in the subpopulation (e.g. "conformist_interaction"), which only interact within a `Subpopulation`.
             interacting_individual (Individual): Individual with which the self individual interacts.
+            random_numbers (np.ndarray, optional): Random numbers drawn in advance for the interaction. Defaults to None, in which case they are drawn here.
+            mutate (bool, optional): Whether a copy would mutate, decided in advance. Defaults to None, in which case it is drawn in the interaction.
         """
-        match interaction_function:
-            case "neutral_interaction":
-                self.neutral_interaction(interacting_individual)
-            case "axelrod_interaction":
-                self.axelrod_interaction(interacting_individual)
-                    
+        # imported here since the registry imports this module
+        from .interactions import get_interaction
+        model = get_interaction(interaction_function)
+        if model.uses_trait_counts:
+            raise ValueError(f"The interaction {interaction_function} depends on the frequencies of the traits in the subpopulation, so it can only be used within a Subpopulation!")
+        if random_numbers is None:
+            random_numbers = np.random.rand(4).tolist()
+        model.scalar_kernel(self, interacting_individual, random_numbers, mutate)
@@ -0,0 +1,109 @@
+"""
+A module containing the tools to measure where the time of a simulation goes (interactions, migration or measurements).
+"""
+
+import json
+from typing import Dict
+
+class SimulationStatistics():
+    """
+    Cumulative timers and counters of one replicate of a simulation. They are only collected when the instrumentation of
+    the `Simulation` is enabled.
+
+    Attributes:
+        generations (int): Number of generations simulated.
+        interaction_time (float): Time (in seconds) spent making individuals interact.
+        migration_time (float): Time (in seconds) spent in the migration step.
+        measurement_time (float): Time (in seconds) spent measuring the metapopulation.
+        measurement_times (Dict[str, float]): Time (in seconds) spent on each measurement.
+        number_of_interactions (int): Total number of interactions.
+        number_of_changes (int): Number of interactions that changed the features of the focal individual.
+        number_of_migrants (int): Total number of individuals that migrated.
+        number_of_measurements (int): Number of times the metapopulation was measured.
+    """
+    def __init__(self):
+        """
+        Create a set of statistics with all timers and counters at zero.
+        """
+        self.generations = 0
+        self.interaction_time = 0.0
+        self.migration_time = 0.0
+        self.measurement_time = 0.0
+        self.measurement_times: Dict[str, float] = {}
+        self.number_of_interactions = 0
+        self.number_of_changes = 0
+        self.number_of_migrants = 0
+        self.number_of_measurements = 0
+
+
+    def add_measurement_time(self, measurement: str, elapsed_time: float) -> None:
+        """
+        Add the time taken by one evaluation of a measurement.
+
+        Args:
+            measurement (str): Name of the measurement.
+            elapsed_time (float): Time (in seconds) taken by the evaluation.
+        """
+        self.measurement_times[measurement] = self.measurement_times.get(measurement, 0.0) + elapsed_time
+        self.measurement_time += elapsed_time
+
+
+    def interactions_per_second(self) -> float:
+        """
+        Returns:
+            float: Number of interactions per second of time spent in the interaction step.
+        """
+        if self.interaction_time == 0.0:
+            return 0.0
+        return self.number_of_interactions / self.interaction_time
+
+
+    def no_op_ratio(self) -> float:
+        """
+        Returns:
+            float: Fraction of the interactions that did not change the focal individual.
+        """
+        if self.number_of_interactions == 0:
+            return 0.0
+        return 1 - self.number_of_changes / self.number_of_interactions
+
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict: All timers and counters, including the derived rates.
+        """
+        return {"generations": self.generations,
+                "interaction_time": self.interaction_time,
+                "migration_time": self.migration_time,
+                "measurement_time": self.measurement_time,
+                "measurement_times": dict(self.measurement_times),
+                "number_of_interactions": self.number_of_interactions,
+                "number_of_changes": self.number_of_changes,
+                "number_of_migrants": self.number_of_migrants,
+                "number_of_measurements": self.number_of_measurements,
+                "interactions_per_second": self.interactions_per_second(),
+                "no_op_ratio": self.no_op_ratio()}
+
+
+    def summary(self) -> str:
+        """
+        Returns:
+            str: A short human-readable summary of the statistics.
+        """
+        slowest_measurement = max(self.measurement_times, key=self.measurement_times.get, default=None)
+        return (f"interactions {self.interaction_time:.2f}s ({self.interactions_per_second():.0f}/s, {100*self.no_op_ratio():.1f}% no-op), "
+                f"migration {self.migration_time:.2f}s ({self.number_of_migrants} migrants), "
+                f"measurements {self.measurement_time:.2f}s (slowest: {slowest_measurement})")
+
+
+def save_statistics(statistics: Dict[int, SimulationStatistics], output_file: str) -> None:
+    """
+    Save the statistics of several replicates in a JSON file.
+
+    Args:
+        statistics (Dict[int, SimulationStatistics]): Statistics for each replicate id.
+        output_file (str): Path of the JSON file.
+    """
+    with open(output_file, "w") as file:
+        json.dump({str(replicate_id): replicate_statistics.to_dict() for replicate_id, replicate_statistics in statistics.items()}, file, indent=2)
@@ -0,0 +1,233 @@
+"""
+A module containing the registry of interaction models. Each model has a scalar kernel, used by `Subpopulation` for
+one interaction between two `Individual` objects, and optionally a batch kernel, used by the engines that keep features
+in arrays (`EnsembleMetapopulation`, `WrightFisherMetapopulation`) for many independent interactions at once.
+"""
+
+from functools import partial
+import numpy as np
+from typing import Callable, Dict, List, Tuple
+
+from .individual import Individual
+
+class InteractionModel():
+    """
+    An interaction model, registered with `register_interaction()`.
+
+    The scalar kernel is called as `scalar_kernel(focal_individual, source_individual, random_numbers, mutate)`, with four
+    uniform random numbers (interaction, mutation, feature to copy, new trait) and whether a copy mutates (None to decide
+    it from the mutation random number and the mutation rate of the focal individual). It changes the focal individual.
+
+    The batch kernel is called as `batch_kernel(focal_features, source_features, random_numbers, mutate, min_trait,
+    number_of_traits)`, with arrays of shape (..., features) for the features, (..., 4) for the random numbers and (...)
+    for mutate. It returns, with the shape (...), whether each focal individual changes, the index of the feature that
+    changes and its new trait. An individual that copies or mutates to the trait it already has does not change, so
+    that engines can count the changes from the first array. The engine writes the changes.
+
+    Models that depend on the frequencies of the traits in the subpopulation (`uses_trait_counts`) get them from counters
+    kept up to date by the engine. The scalar kernel is then also given `trait_counts`, the number of individuals of the
+    subpopulation with each trait, for each feature (a list of dictionaries), and updates it when the focal individual
+    changes. The batch kernel is also given `trait_counts`, an array of shape (groups, features, number_of_traits) with
+    the counts of each subpopulation, and `demes`, the index of the subpopulation of each interaction in it.
+
+    Attributes:
+        name (str): Name of the model, as given in `type_of_interaction`.
+        scalar_kernel (Callable[[Individual, Individual, List[float], bool], None]): Kernel for one interaction.
+        batch_kernel (Callable[..., Tuple[np.ndarray, np.ndarray, np.ndarray]]): Kernel for many interactions at once, None if the model has none.
+        uses_trait_counts (bool): Whether the kernels need the counts of the traits in the subpopulation.
+    """
+    def __init__(self, name: str, scalar_kernel: Callable[[Individual, Individual, List[float], bool], None],
+                 batch_kernel: Callable[..., Tuple[np.ndarray, np.ndarray, np.ndarray]] = None, uses_trait_counts: bool = False):
+        """
+        Args:
+            name (str): Name of the model.
+            scalar_kernel (Callable[[Individual, Individual, List[float], bool], None]): Kernel for one interaction.
+            batch_kernel (Callable[..., Tuple[np.ndarray, np.ndarray, np.ndarray]], optional): Kernel for many interactions at once. Defaults to None.
+            uses_trait_counts (bool, optional): Whether the kernels need the counts of the traits in the subpopulation. Defaults to False.
+        """
+        self.name = name
+        self.scalar_kernel = scalar_kernel
+        self.batch_kernel = batch_kernel
+        self.uses_trait_counts = uses_trait_counts
+
+
+INTERACTION_MODELS: Dict[str, InteractionModel] = {}
+
+
+def register_interaction(name: str, scalar_kernel: Callable[[Individual, Individual, List[float], bool], None],
+                         batch_kernel: Callable[..., Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+                         uses_trait_counts: bool = False, replace: bool = False) -> InteractionModel:
+    """
+    Register an interaction model, so that it can be used by name as `type_of_interaction`.
+
+    Args:
+        name (str): Name of the model.
+        scalar_kernel (Callable[[Individual, Individual, List[float], bool], None]): Kernel for one interaction, see `InteractionModel`.
+        batch_kernel (Callable[..., Tuple[np.ndarray, np.ndarray, np.ndarray]], optional): Kernel for many interactions at once, see `InteractionModel`. Defaults to None.
+        uses_trait_counts (bool, optional): Whether the kernels need the counts of the traits in the subpopulation, see `InteractionModel`. Defaults to False.
+        replace (bool, optional): Whether to replace a model registered with the same name. Defaults to False.
+
+    Returns:
+        InteractionModel: The registered model.
+    """
+    if name in INTERACTION_MODELS and not replace:
+        raise ValueError(f"An interaction model named {name} is already registered!")
+    INTERACTION_MODELS[name] = InteractionModel(name, scalar_kernel, batch_kernel, uses_trait_counts)
+
+    return INTERACTION_MODELS[name]
+
+
+def get_interaction(name: str) -> InteractionModel:
+    """
+    Args:
+        name (str): Name of a registered model.
+
+    Returns:
+        InteractionModel: The model.
+    """
+    if name not in INTERACTION_MODELS:
+        raise ValueError(f"Unknown type of interaction {name}, choose between {', '.join(INTERACTION_MODELS)}.")
+
+    return INTERACTION_MODELS[name]
+
+
+def _copied_or_mutated_traits(source_features: np.ndarray, indexes_to_copy: np.ndarray, random_numbers: np.ndarray,
+                              mutate: np.ndarray, min_trait: int, number_of_traits: int) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: The trait of the source at the copied feature, or a random trait where the copy mutates.
+    """
+    copied_traits = np.take_along_axis(source_features, indexes_to_copy[..., np.newaxis], axis=-1)[..., 0]
+    mutated_traits = min_trait + (random_numbers[..., 3]*number_of_traits).astype(int)
+
+    return np.where(mutate, mutated_traits, copied_traits)
+
+
+def _differ(focal_features: np.ndarray, indexes_to_change: np.ndarray, new_traits: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: Whether the new trait differs from the current trait of the focal individual at the changed feature.
+    """
+    return np.take_along_axis(focal_features, indexes_to_change[..., np.newaxis], axis=-1)[..., 0] != new_traits
+
+
+def axelrod_batch_kernel(focal_features: np.ndarray, source_features: np.ndarray, random_numbers: np.ndarray, mutate: np.ndarray,
+                         min_trait: int, number_of_traits: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Batch version of `Individual.axelrod_interaction`, see `InteractionModel`.
+    """
+    number_of_features = focal_features.shape[-1]
+    differences = focal_features != source_features
+    number_of_differences = np.count_nonzero(differences, axis=-1)
+    probability_of_interaction = 1 - number_of_differences/number_of_features
+    interacting = (random_numbers[..., 0] <= probability_of_interaction) & (probability_of_interaction < 1.0)
+    # position of the k-th differing feature, k drawn uniformly among the differences
+    rank_to_copy = (random_numbers[..., 2]*number_of_differences).astype(int)
+    indexes_to_copy = np.argmax(differences & (np.cumsum(differences, axis=-1) == rank_to_copy[..., np.newaxis] + 1), axis=-1)
+    new_traits = _copied_or_mutated_traits(source_features, indexes_to_copy, random_numbers, mutate, min_trait, number_of_traits)
+
+    return interacting & _differ(focal_features, indexes_to_copy, new_traits), indexes_to_copy, new_traits
+
+
+def neutral_batch_kernel(focal_features: np.ndarray, source_features: np.ndarray, random_numbers: np.ndarray, mutate: np.ndarray,
+                         min_trait: int, number_of_traits: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Batch version of `Individual.neutral_interaction`, see `InteractionModel`.
+    """
+    indexes_to_copy = (random_numbers[..., 2]*focal_features.shape[-1]).astype(int)
+    new_traits = _copied_or_mutated_traits(source_features, indexes_to_copy, random_numbers, mutate, min_trait, number_of_traits)
+
+    return _differ(focal_features, indexes_to_copy, new_traits), indexes_to_copy, new_traits
+
+
+def conformist_interaction(focal_individual: Individual, source_individual: Individual, random_numbers: List[float], mutate: bool,
+                           trait_counts: List[Dict[int, int]], conformity: float) -> None:
+    """
+    Interaction with a frequency-dependent bias. The focal individual changes one feature at random. With probability
+    |conformity|, it adopts the most common trait of that feature in its subpopulation (conformity > 0) or the rarest
+    trait present (conformity < 0), ties being broken at random; otherwise, it copies the trait of the source as in
+    `Individual.neutral_interaction`. Copying errors occur as in the neutral model.
+
+    The frequencies are read from the counters of the subpopulation, so the cost does not depend on its size.
+
+    Args:
+        focal_individual (Individual): The individual that changes.
+        source_individual (Individual): The individual that is copied without bias.
+        random_numbers (List[float]): Four uniform random numbers (bias, mutation, feature to change, trait among the candidates or new trait).
+        mutate (bool): Whether the copy mutates. If None, it is drawn against the mutation rate of the focal individual.
+        trait_counts (List[Dict[int, int]]): Number of individuals of the subpopulation with each trait, for each feature. Updated with the change.
+        conformity (float): Strength of the bias, between -1 (always adopt the rarest trait) and 1 (always adopt the most common trait).
+    """
+    bias_random_number, mutation_random_number, choice_random_number, trait_random_number = random_numbers
+    if mutate is None:
+        mutate = mutation_random_number <= focal_individual.mutation_rate
+    index_to_change = int(choice_random_number*focal_individual.number_of_features)
+    counts = trait_counts[index_to_change]
+    if mutate:
+        new_trait = 1 + int(trait_random_number*focal_individual.number_of_traits)
+        focal_individual.number_of_mutations += 1
+    elif bias_random_number < abs(conformity):
+        target_count = max(counts.values()) if conformity > 0 else min(counts.values())
+        candidates = sorted(trait for trait, count in counts.items() if count == target_count)
+        new_trait = candidates[int(trait_random_number*len(candidates))]
+    else:
+        new_trait = int(source_individual.features[index_to_change])
+
+    old_trait = int(focal_individual.features[index_to_change])
+    if new_trait != old_trait:
+        counts[old_trait] -= 1
+        if counts[old_trait] == 0:
+            del counts[old_trait]
+        counts[new_trait] = counts.get(new_trait, 0) + 1
+        focal_individual.features[index_to_change] = new_trait
+        focal_individual.number_of_changes += 1
+
+
+def conformist_batch_kernel(focal_features: np.ndarray, source_features: np.ndarray, random_numbers: np.ndarray, mutate: np.ndarray,
+                            min_trait: int, number_of_traits: int, trait_counts: np.ndarray, demes: np.ndarray,
+                            conformity: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Batch version of `conformist_interaction`, see `InteractionModel`.
+    """
+    indexes_to_change = (random_numbers[..., 2]*focal_features.shape[-1]).astype(int)
+    counts = trait_counts[demes, indexes_to_change]
+    if conformity > 0:
+        candidates = counts == counts.max(axis=-1, keepdims=True)
+    else:
+        present = counts > 0
+        candidates = present & (counts == np.where(present, counts, np.iinfo(counts.dtype).max).min(axis=-1, keepdims=True))
+    # the k-th candidate trait, k drawn uniformly among the candidates
+    rank = (random_numbers[..., 3]*np.count_nonzero(candidates, axis=-1)).astype(int)
+    adopted_traits = min_trait + np.argmax(candidates & (np.cumsum(candidates, axis=-1) == rank[..., np.newaxis] + 1), axis=-1)
+
+    copied_traits = np.take_along_axis(source_features, indexes_to_change[..., np.newaxis], axis=-1)[..., 0]
+    new_traits = np.where(random_numbers[..., 0] < abs(conformity), adopted_traits, copied_traits)
+    mutated_traits = min_trait + (random_numbers[..., 3]*number_of_traits).astype(int)
+    new_traits = np.where(mutate, mutated_traits, new_traits)
+
+    return _differ(focal_features, indexes_to_change, new_traits), indexes_to_change, new_traits
+
+
+def register_conformist_interaction(name: str, conformity: float, replace: bool = False) -> InteractionModel:
+    """
+    Register a frequency-dependent interaction (see `conformist_interaction`) with a given strength of the bias.
+
+    Args:
+        name (str): Name of the model.
+        conformity (float): Strength of the bias, between -1 (anti-conformist) and 1 (conformist).
+        replace (bool, optional): Whether to replace a model registered with the same name. Defaults to False.
+
+    Returns:
+        InteractionModel: The registered model.
+    """
+    if not -1.0 <= conformity <= 1.0:
+        raise ValueError("The conformity must be between -1 and 1!")
+
+    return register_interaction(name, partial(conformist_interaction, conformity = conformity),
+                                partial(conformist_batch_kernel, conformity = conformity), uses_trait_counts = True, replace = replace)
+
+
+register_interaction("axelrod_interaction", Individual._axelrod_interaction_from_random_numbers, axelrod_batch_kernel)
+register_interaction("neutral_interaction", Individual._neutral_interaction_from_random_numbers, neutral_batch_kernel)
+register_conformist_interaction("conformist_interaction", 0.5)
+register_conformist_interaction("anticonformist_interaction", -0.5)
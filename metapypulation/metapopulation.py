@@ -4,13 +4,12 @@ as well as the migration rates between populations.
 """
 
 from collections.abc import Set, Iterator
-from distancia import BrayCurtis
 from itertools import pairwise, permutations
 import numpy as np
-import pandas as pd
-from typing import List
+from typing import Callable, List, Tuple
 
 from .individual import Individual
+from .networks import SocialNetwork
 from .subpopulation import Subpopulation, SetOfIndividuals
 
 class Metapopulation():
@@ -28,6 +27,7 @@ class Metapopulation():
         mutation_rate (float, optional): Probability of a mutation to occur.
         min_trait (int, optional): Minimum value for a trait in each feature. 
         max_trait (int, optional): Maximum value for a trait in each feature. 
+        interactions_per_generation (int | str): Number of interactions in each subpopulation at each generation, or "subpopulation_size" for as many interactions as individuals in the subpopulation.
     """
     def __init__(self, number_of_subpopulations: int, 
                  type_of_interaction: str,
@@ -37,7 +37,8 @@ class Metapopulation():
                  number_of_traits: int = 10,
                  mutation_rate: float = 0.0,
                  min_trait: int = 1,
-                 max_trait: int = 10
+                 max_trait: int = 10,
+                 interactions_per_generation: int | str = 1
                  ):
         """Creates an empty metapopulation.
 
@@ -51,9 +52,13 @@ class Metapopulation():
             mutation_rate (float, optional): Probability of a mutation to occur. Defaults to 0.0.
             min_trait (int, optional): Minimum value for a trait in each feature. Defaults to 1.
             max_trait (int, optional): Maximum value for a trait in each feature. Deafults to 10.
+            interactions_per_generation (int | str, optional): Number of interactions in each subpopulation at each generation. With "subpopulation_size", each subpopulation makes as many interactions as its current size (Moran time units). Defaults to 1.
         """
+        if not (isinstance(interactions_per_generation, int) or interactions_per_generation == "subpopulation_size"):
+            raise ValueError("interactions_per_generation must be an int or 'subpopulation_size'!")
+
         self.number_of_subpopulations = number_of_subpopulations
-        self.subpopulations = SetOfSubpopulations(number_of_subpopulations, type_of_interaction)
+        self.subpopulations = SetOfSubpopulations(number_of_subpopulations, type_of_interaction, mutation_rate)
         self.type_of_interaction = type_of_interaction
         self.migration_matrix = migration_matrix
         self.carrying_capacities = carrying_capacities
@@ -62,6 +67,7 @@ class Metapopulation():
         self.mutation_rate = mutation_rate
         self.min_trait = min_trait
         self.max_trait = max_trait
+        self.interactions_per_generation = interactions_per_generation
         
         
     def populate(self) -> None:
@@ -86,9 +92,41 @@ class Metapopulation():
                         set_of_features = np.random.randint(low = self.min_trait, high = self.max_trait + 1, size = self.number_of_features)
                         new_individual = Individual(i, subpopulation.id, self.number_of_features, derived_number_of_traits, self.mutation_rate, set_of_features)
                         subpopulation.add_individual(new_individual)
-                
-        
-    def migrate(self) -> None:
+
+
+    def populate_from_arrays(self, features: np.ndarray, deme_ids: np.ndarray, origin_ids: np.ndarray = None) -> None:
+        """Populate all (empty) subpopulations from a given state instead of random sets of features.
+
+        This is used whenever the state of the metapopulation was produced somewhere else (e.g. by the coalescent) and
+        the usual measurements of diversity should be run on it.
+
+        Args:
+            features (np.ndarray): Matrix of shape (number of individuals, number of features) with the features of each individual.
+            deme_ids (np.ndarray): Id of the subpopulation in which each individual is found.
+            origin_ids (np.ndarray, optional): Id of the deme where each individual originated. Defaults to None, in which case it is equal to `deme_ids`.
+        """
+        if origin_ids is None:
+            origin_ids = deme_ids
+        derived_number_of_traits = self.max_trait - self.min_trait + 1
+        local_ids = [0]*self.number_of_subpopulations
+        for set_of_features, deme_id, origin_id in zip(features, deme_ids, origin_ids):
+            new_individual = Individual(local_ids[deme_id], int(origin_id), self.number_of_features, derived_number_of_traits,
+                                        self.mutation_rate, np.array(set_of_features))
+            self.subpopulations[deme_id].add_individual(new_individual)
+            local_ids[deme_id] += 1
+
+
+    def set_networks(self, create_network: Callable[[int], SocialNetwork]) -> None:
+        """Give each (populated) subpopulation a social network, see `Subpopulation.set_network()`.
+
+        Args:
+            create_network (Callable[[int], SocialNetwork]): Function that returns a new network for a subpopulation of a given size, e.g. `lambda size: small_world_network(size, 4, 0.1)`.
+        """
+        for subpopulation in self.subpopulations:
+            subpopulation.set_network(create_network(subpopulation.get_population_size()))
+
+
+    def migrate(self) -> int:
         """A function that causes the migration step for a subpopulation. 
         When called, each subpopulation finds to what subpopulations it needs to send individuals (based on
         the migration matrix supplied), and it calls upon the `subpopulation.receive_migrants()` function of 
@@ -96,6 +134,9 @@ class Metapopulation():
         
         After each subpopulation has received the migrants, the function `subpopulation.incorporate_migrants_in_population()`
         is called for each subpopulation. This merges the incoming migrants with the already existing population.
+
+        Returns:
+            int: the number of individuals that migrated.
         """
         # for each subpopulation we create a list of individuals that will migrate, based on the migration rates matrix
         for subpopulation in self.subpopulations:
@@ -109,8 +150,12 @@ class Metapopulation():
             
                 receiving_subpopulation.receive_migrants(subpopulation, migration_rate)
         
+        number_of_migrants = 0
         for subpopulation in self.subpopulations:
-            subpopulation.incorporate_migrants_in_population() 
+            number_of_migrants += subpopulation.get_current_number_of_migrants()
+            subpopulation.incorporate_migrants_in_population()
+
+        return number_of_migrants
             
             
     def get_metapopulation_size(self) -> int:
@@ -128,12 +173,65 @@ class Metapopulation():
         return population_size
     
     
-    def make_interact(self) -> None:
+    def get_state(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gather the state of all individuals in arrays, in the same format as `populate_from_arrays()`. Individuals are
+        ordered by subpopulation.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: the features (individuals x features), the id of the subpopulation and the id of the deme of origin of each individual.
+        """
+        features = np.zeros((self.get_metapopulation_size(), self.number_of_features), dtype=int)
+        deme_ids = np.zeros(len(features), dtype=int)
+        origin_ids = np.zeros(len(features), dtype=int)
+        i = 0
+        for subpopulation in self.subpopulations:
+            for individual in subpopulation.population:
+                features[i] = individual.features
+                deme_ids[i] = subpopulation.id
+                origin_ids[i] = individual.original_deme_id
+                i += 1
+
+        return features, deme_ids, origin_ids
+    
+    
+    def make_interact(self) -> int:
+        """
+        Make the interactions of one generation in each subpopulation. With more than one interaction per generation, 
+        the interactions of each subpopulation are made in one batch.
+
+        Returns:
+            int: the number of interactions made. With a network, this includes the interactions with a free neighbouring slot, which change nothing.
         """
-        Make one interaction in each subpopulation.
+        number_of_interactions = 0
+        for subpopulation in self.subpopulations:
+            match self.interactions_per_generation:
+                case 1:
+                    subpopulation.create_interaction()
+                    number_of_interactions += 1
+                case int():
+                    subpopulation.create_interactions(self.interactions_per_generation)
+                    number_of_interactions += self.interactions_per_generation
+                case "subpopulation_size":
+                    subpopulation.create_interactions(subpopulation.get_population_size())
+                    number_of_interactions += subpopulation.get_population_size()
+
+        return number_of_interactions
+
+
+    def count_changes(self) -> int:
         """
+        Counts how many times individuals changed their features following an interaction, over the whole metapopulation.
+
+        Returns:
+            int: total number of changes.
+        """
+        number_of_changes = 0
         for subpopulation in self.subpopulations:
-            subpopulation.create_interaction()
+            for individual in subpopulation.population:
+                number_of_changes += individual.number_of_changes
+
+        return number_of_changes
             
         
     def shannon_diversity_per_subpopulation(self) -> List[float]:
@@ -372,6 +470,10 @@ class Metapopulation():
         Returns:
             bray_curtis (int): Bray-Curtis dissimilarity between two subpopulations
         """
+        # loaded here rather than with the module, importing distancia takes about a second
+        from distancia import BrayCurtis
+        import pandas as pd
+
         individuals_subpop_1 = self.subpopulations[subpop_id_1].population
         individuals_subpop_2 = self.subpopulations[subpop_id_2].population
 
@@ -432,6 +534,9 @@ class Metapopulation():
         Returns:
             bray_curtis (int): Bray-Curtis dissimilarity between two sets of subpopulations
         """
+        from distancia import BrayCurtis
+        import pandas as pd
+
 
         traits_pop_1 = []
         traits_pop_2 = []
@@ -502,10 +607,10 @@ class SetOfSubpopulations(Set):
     A class inheriting from Set to act as container of Subpopulation objects. Methods are standard for a Set.
 
     """
-    def __init__(self, number_of_subpopulations: int, type_of_interaction: str):
+    def __init__(self, number_of_subpopulations: int, type_of_interaction: str, mutation_rate: float = None):
         self.subpopulations = []
         for subpopulation in range(number_of_subpopulations):
-            self.subpopulations.append(Subpopulation(id = subpopulation, type_of_interaction = type_of_interaction))
+            self.subpopulations.append(Subpopulation(id = subpopulation, type_of_interaction = type_of_interaction, mutation_rate = mutation_rate))
         
     def __contains__(self, subpopulation: Subpopulation) -> bool:
         """Checks if an agent is in the SetOfIndividuals.
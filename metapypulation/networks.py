@@ -0,0 +1,251 @@
+"""
+A module containing social networks within subpopulations, which restrict the individuals a focal individual can
+interact with, and generators for the usual families of networks.
+"""
+
+import numpy as np
+from typing import List, Tuple
+
+from .individual import Individual
+
+class SocialNetwork():
+    """
+    A directed graph between the slots of a subpopulation, stored in compressed sparse row form: the neighbours of slot
+    `s` are `neighbours[offsets[s]:offsets[s + 1]]`. Each individual of the subpopulation occupies one slot, and a focal
+    individual copies from one of the occupants of its neighbouring slots, so that sampling a partner takes a constant
+    time whatever the size of the subpopulation.
+
+    When an individual leaves the subpopulation its slot becomes free, and an arriving migrant takes a free slot at
+    random, with the links of the slot. When there is no free slot, a new slot is added with the outgoing links of a
+    random slot, so that the graph is never rebuilt. An interaction with a free slot does not happen.
+
+    Offsets and neighbours are lists, since reading single elements of a list is much faster than of a NumPy array.
+
+    Attributes:
+        offsets (List[int]): Start of the neighbours of each slot in `neighbours`, with one more element for the end.
+        neighbours (List[int]): Neighbours of all slots, one slot after the other.
+        occupants (List[Individual]): Individual occupying each slot, None for free slots.
+        free_slots (List[int]): Slots without occupant.
+    """
+    def __init__(self, offsets: List[int], neighbours: List[int]):
+        """
+        Create a network without occupants.
+
+        Args:
+            offsets (List[int]): Start of the neighbours of each slot in `neighbours`, with one more element for the end.
+            neighbours (List[int]): Neighbours of all slots, one slot after the other.
+        """
+        self.offsets = list(offsets)
+        self.neighbours = list(neighbours)
+        self.occupants: List[Individual] = [None]*self.get_number_of_slots()
+        self.free_slots = list(range(self.get_number_of_slots()))
+
+
+    @classmethod
+    def from_edges(cls, number_of_slots: int, edges: np.ndarray, directed: bool = False) -> "SocialNetwork":
+        """
+        Args:
+            number_of_slots (int): Number of slots.
+            edges (np.ndarray): Array of shape (edges, 2) with the two slots of each edge.
+            directed (bool, optional): Whether the first slot of an edge copies from the second one only. Defaults to False, in which case both copy from each other.
+
+        Returns:
+            SocialNetwork: The network with these edges.
+        """
+        edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+        sources, targets = edges[:, 0], edges[:, 1]
+        if not directed:
+            sources, targets = np.concatenate((sources, targets)), np.concatenate((targets, sources))
+        order = np.argsort(sources, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=number_of_slots))))
+
+        return cls(offsets.tolist(), targets[order].tolist())
+
+
+    def get_number_of_slots(self) -> int:
+        """
+        Returns:
+            int: Number of slots, occupied or not.
+        """
+        return len(self.offsets) - 1
+
+
+    def get_degree(self, slot: int) -> int:
+        """
+        Args:
+            slot (int): A slot.
+
+        Returns:
+            int: Number of neighbours of the slot.
+        """
+        return self.offsets[slot + 1] - self.offsets[slot]
+
+
+    def place(self, individual: Individual, uniform: float) -> None:
+        """
+        Put an individual in a random free slot, or in a new slot if none is free.
+
+        Args:
+            individual (Individual): The individual arriving in the subpopulation.
+            uniform (float): Uniform random number on [0, 1) choosing the slot.
+        """
+        if not self.free_slots:
+            self._add_slot(uniform)
+        index = min(int(uniform*len(self.free_slots)), len(self.free_slots) - 1)
+        self.free_slots[index], self.free_slots[-1] = self.free_slots[-1], self.free_slots[index]
+        slot = self.free_slots.pop()
+        self.occupants[slot] = individual
+        individual.network_slot = slot
+
+
+    def remove(self, individual: Individual) -> None:
+        """
+        Free the slot of an individual leaving the subpopulation.
+
+        Args:
+            individual (Individual): The individual leaving the subpopulation.
+        """
+        self.occupants[individual.network_slot] = None
+        self.free_slots.append(individual.network_slot)
+        individual.network_slot = None
+
+
+    def sample_neighbour(self, individual: Individual, uniform: float) -> Individual | None:
+        """
+        Args:
+            individual (Individual): A focal individual.
+            uniform (float): Uniform random number on [0, 1) choosing the neighbour.
+
+        Returns:
+            Individual | None: The occupant of a random neighbouring slot, None if the slot is free or the individual has no neighbour.
+        """
+        start = self.offsets[individual.network_slot]
+        degree = self.offsets[individual.network_slot + 1] - start
+        if degree == 0:
+            return None
+        return self.occupants[self.neighbours[start + min(int(uniform*degree), degree - 1)]]
+
+
+    def _add_slot(self, uniform: float) -> None:
+        """
+        Add a slot at the end, with the outgoing links of a random slot.
+
+        Args:
+            uniform (float): Uniform random number on [0, 1) choosing the slot that is copied.
+        """
+        number_of_slots = self.get_number_of_slots()
+        model = min(int(uniform*number_of_slots), number_of_slots - 1)
+        self.neighbours.extend(self.neighbours[self.offsets[model]:self.offsets[model + 1]])
+        self.offsets.append(len(self.neighbours))
+        self.occupants.append(None)
+        self.free_slots.append(number_of_slots)
+
+
+def grid_network(rows: int, columns: int, periodic: bool = True) -> SocialNetwork:
+    """
+    Square lattice where each slot is linked to its four nearest neighbours (von Neumann neighbourhood), as in the
+    original Axelrod model.
+
+    Args:
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        periodic (bool, optional): Whether the edges of the grid wrap around (torus). Defaults to True.
+
+    Returns:
+        SocialNetwork: The lattice, with slot `r*columns + c` at row `r` and column `c`.
+    """
+    row, column = np.divmod(np.arange(rows*columns), columns)
+    edges = []
+    for neighbour_row, neighbour_column in ((row, column + 1), (row + 1, column)):
+        if periodic:
+            keep = np.ones(rows*columns, dtype=bool)
+        else:
+            keep = (neighbour_row < rows) & (neighbour_column < columns)
+        edges.append(np.column_stack(((row*columns + column)[keep], ((neighbour_row % rows)*columns + neighbour_column % columns)[keep])))
+    edges = np.concatenate(edges)
+    # in grids of one or two rows or columns, wrapping around links a slot to itself or twice to the same neighbour
+    edges = np.unique(np.sort(edges[edges[:, 0] != edges[:, 1]], axis=1), axis=0)
+
+    return SocialNetwork.from_edges(rows*columns, edges)
+
+
+def ring_network(number_of_slots: int, number_of_neighbours: int = 2) -> SocialNetwork:
+    """
+    Ring lattice where each slot is linked to the `number_of_neighbours/2` closest slots on each side.
+
+    Args:
+        number_of_slots (int): Number of slots.
+        number_of_neighbours (int, optional): Even number of neighbours of each slot. Defaults to 2.
+
+    Returns:
+        SocialNetwork: The ring.
+    """
+    return SocialNetwork.from_edges(number_of_slots, _ring_edges(number_of_slots, number_of_neighbours))
+
+
+def small_world_network(number_of_slots: int, number_of_neighbours: int = 4, rewiring_probability: float = 0.1) -> SocialNetwork:
+    """
+    Watts-Strogatz small-world network: a ring lattice where each edge is rewired with some probability to a random
+    slot, avoiding links of a slot to itself and repeated links.
+
+    Args:
+        number_of_slots (int): Number of slots.
+        number_of_neighbours (int, optional): Even number of neighbours of each slot in the ring before rewiring. Defaults to 4.
+        rewiring_probability (float, optional): Probability that an edge is rewired. Defaults to 0.1.
+
+    Returns:
+        SocialNetwork: The small-world network.
+    """
+    edges = _ring_edges(number_of_slots, number_of_neighbours)
+    existing = set(map(tuple, np.sort(edges, axis=1).tolist()))
+    for index in np.nonzero(np.random.rand(len(edges)) < rewiring_probability)[0]:
+        slot, old_target = edges[index]
+        new_target = np.random.randint(number_of_slots)
+        if new_target == slot or tuple(sorted((slot, new_target))) in existing:
+            continue
+        existing.remove(tuple(sorted((slot, old_target))))
+        existing.add(tuple(sorted((slot, new_target))))
+        edges[index, 1] = new_target
+
+    return SocialNetwork.from_edges(number_of_slots, edges)
+
+
+def scale_free_network(number_of_slots: int, links_per_slot: int = 2) -> SocialNetwork:
+    """
+    Barabási-Albert scale-free network: slots are added one at a time and linked to `links_per_slot` distinct existing
+    slots chosen with a probability proportional to their degree.
+
+    Args:
+        number_of_slots (int): Number of slots.
+        links_per_slot (int, optional): Number of links of each new slot. Defaults to 2.
+
+    Returns:
+        SocialNetwork: The scale-free network.
+    """
+    if not 1 <= links_per_slot < number_of_slots:
+        raise ValueError("The number of links per slot must be at least 1 and less than the number of slots!")
+
+    # the first slots form a star, then each slot appears in `ends` once per link, so that a uniform choice in `ends` is proportional to the degree
+    edges: List[Tuple[int, int]] = [(0, slot) for slot in range(1, links_per_slot + 1)]
+    ends = [end for edge in edges for end in edge]
+    for slot in range(links_per_slot + 1, number_of_slots):
+        targets = set()
+        while len(targets) < links_per_slot:
+            targets.add(ends[np.random.randint(len(ends))])
+        for target in targets:
+            edges.append((slot, target))
+            ends.extend((slot, target))
+
+    return SocialNetwork.from_edges(number_of_slots, np.array(edges))
+
+
+def _ring_edges(number_of_slots: int, number_of_neighbours: int) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: Edges of a ring lattice, each slot to its `number_of_neighbours/2` next slots.
+    """
+    if number_of_neighbours % 2 != 0 or not 0 < number_of_neighbours < number_of_slots:
+        raise ValueError("The number of neighbours must be even, positive and smaller than the number of slots!")
+
+    slots = np.arange(number_of_slots)
+    return np.concatenate([np.column_stack((slots, (slots + distance) % number_of_slots)) for distance in range(1, number_of_neighbours//2 + 1)])
@@ -0,0 +1,137 @@
+"""
+A module containing a buffer of random numbers drawn in blocks, from which the interactions and the migrations of a
+subpopulation take their random numbers one at a time.
+"""
+
+import math
+import numpy as np
+from typing import List
+
+class RandomBuffer():
+    """
+    Uniform random numbers on [0, 1) drawn from `np.random` in blocks and handed out in order. Drawing one number from
+    NumPy costs about as much as drawing a thousand, so the many scalar draws of the interaction loop are much cheaper
+    when taken from a block. Indices, binomial and geometric numbers are computed from the uniforms by inversion.
+
+    Blocks are drawn from the global NumPy generator when they are needed, so a simulation started after
+    `np.random.seed()` is reproducible. Numbers already in a buffer are not affected by a later call to `np.random.seed()`.
+    A copy of a buffer (e.g. when a metapopulation is copied with `copy.deepcopy()`) starts empty, so that copies of a
+    simulation do not repeat the same random numbers.
+
+    Attributes:
+        block_size (int): Number of uniforms drawn at once.
+    """
+    # binomial numbers with a larger expected value are drawn by NumPy, inversion would take too many steps
+    MAX_INVERSION_MEAN = 30
+
+    def __init__(self, block_size: int = 1024):
+        """
+        Create an empty buffer. The first block is drawn at the first request.
+
+        Args:
+            block_size (int, optional): Number of uniforms drawn at once. Defaults to 1024.
+        """
+        if block_size < 1:
+            raise ValueError("The block size must be positive!")
+        self.block_size = block_size
+        self._block: List[float] = []
+        self._position = 0
+
+
+    def __deepcopy__(self, memo: dict) -> "RandomBuffer":
+        return RandomBuffer(self.block_size)
+
+
+    def refill(self) -> None:
+        """
+        Draw a new block, dropping the numbers left in the current one.
+        """
+        self._block = np.random.rand(self.block_size).tolist()
+        self._position = 0
+
+
+    def uniform(self) -> float:
+        """
+        Returns:
+            float: The next uniform random number on [0, 1).
+        """
+        if self._position == len(self._block):
+            self.refill()
+        self._position += 1
+        return self._block[self._position - 1]
+
+
+    def uniforms(self, number_of_values: int) -> List[float]:
+        """
+        Args:
+            number_of_values (int): Number of uniforms.
+
+        Returns:
+            List[float]: The next uniform random numbers on [0, 1), in order.
+        """
+        values = self._block[self._position:self._position + number_of_values]
+        self._position += len(values)
+        while len(values) < number_of_values:
+            self.refill()
+            missing = self._block[:number_of_values - len(values)]
+            self._position = len(missing)
+            values += missing
+
+        return values
+
+
+    def integer(self, high: int) -> int:
+        """
+        Args:
+            high (int): Number of possible values.
+
+        Returns:
+            int: A random integer in [0, high), e.g. the index of an individual.
+        """
+        return min(int(self.uniform()*high), high - 1)
+
+
+    def binomial(self, number_of_trials: int, probability: float) -> int:
+        """
+        Draw a binomial number by inversion of its cumulative distribution, starting from 0. With a small expected value
+        (e.g. the number of migrants of a subpopulation) this takes one uniform and a few steps.
+
+        Args:
+            number_of_trials (int): Number of trials.
+            probability (float): Probability of success of each trial.
+
+        Returns:
+            int: The number of successes.
+        """
+        if probability <= 0.0 or number_of_trials == 0:
+            return 0
+        if probability >= 1.0:
+            return number_of_trials
+        if number_of_trials*probability > self.MAX_INVERSION_MEAN:
+            return int(np.random.binomial(number_of_trials, probability))
+
+        uniform = self.uniform()
+        odds = probability/(1.0 - probability)
+        successes = 0
+        mass = (1.0 - probability)**number_of_trials
+        cumulative = mass
+        while uniform > cumulative and successes < number_of_trials:
+            mass *= odds*(number_of_trials - successes)/(successes + 1)
+            successes += 1
+            cumulative += mass
+
+        return successes
+
+
+    def geometric(self, probability: float) -> int:
+        """
+        Args:
+            probability (float): Probability of success of each trial.
+
+        Returns:
+            int: The number of trials until the first success (from 1), as `np.random.geometric()`.
+        """
+        if probability >= 1.0:
+            return 1
+        return 1 + int(math.log(1.0 - self.uniform())/math.log(1.0 - probability))
+
@@ -0,0 +1,379 @@
+"""
+A module containing the recorder of the measurements taken during a simulation.
+"""
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import numpy as np
+import time
+from typing import TYPE_CHECKING, Deque, List, Tuple
+
+from .instrumentation import SimulationStatistics
+from .metapopulation import Metapopulation
+from .wright_fisher import WrightFisherMetapopulation
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Measurements taken by the recorder: method of Metapopulation with one value per subpopulation, and method with the value of the whole metapopulation.
+MEASUREMENTS = {"set_counts": ("traits_sets_per_subpopulation", "metapopulation_count_sets"),
+                "shannon": ("shannon_diversity_per_subpopulation", "metapopulation_shannon_diversity"),
+                "simpson": ("simpson_diversity_per_subpopulation", "metapopulation_simpson_diversity"),
+                "gini": ("gini_diversity_per_subpopulation", "metapopulation_gini_diversity")}
+
+class MeasurementRecorder():
+    """
+    Preallocated storage for the measurements of one replicate. For each sample, each measurement is stored for every
+    subpopulation and for the whole metapopulation, and the average over subpopulations is stored as it is recorded.
+
+    Attributes:
+        number_of_samples (int): Maximum number of samples that can be recorded.
+        number_of_subpopulations (int): Number of subpopulations in the metapopulation.
+        measurements (List[str]): Names of the measurements, in the order of the last axis of `values`.
+        values (np.ndarray): Array of shape (samples, subpopulations + 1, measurements). Index `number_of_subpopulations` on the second axis is the whole metapopulation.
+        subpopulation_means (np.ndarray): Array of shape (samples, measurements) with the averages over the subpopulations that are not empty.
+        number_of_records (int): Number of samples recorded so far.
+        generations (np.ndarray): Generation of each sample, when it is given to `record()` or `add_sample()`.
+    """
+    def __init__(self, number_of_samples: int, number_of_subpopulations: int):
+        """
+        Create an empty recorder.
+
+        Args:
+            number_of_samples (int): Maximum number of samples that can be recorded.
+            number_of_subpopulations (int): Number of subpopulations in the metapopulation.
+        """
+        self.number_of_samples = number_of_samples
+        self.number_of_subpopulations = number_of_subpopulations
+        self.measurements: List[str] = list(MEASUREMENTS)
+        self.values = np.zeros((number_of_samples, number_of_subpopulations + 1, len(self.measurements)))
+        self.subpopulation_means = np.zeros((number_of_samples, len(self.measurements)))
+        self.number_of_records = 0
+        self.generations = np.zeros(number_of_samples, dtype=int)
+
+
+    def record(self, metapopulation: Metapopulation, statistics: SimulationStatistics = None, generation: int = None) -> None:
+        """
+        Measure the metapopulation and store the values in the next sample.
+
+        Args:
+            metapopulation (Metapopulation): The metapopulation to measure.
+            statistics (SimulationStatistics, optional): If given, the time spent on each measurement is added to it. Defaults to None.
+            generation (int, optional): Generation of the sample. Defaults to None.
+        """
+        if self.number_of_records == self.number_of_samples:
+            raise IndexError(f"The recorder is full, it can only hold {self.number_of_samples} samples!")
+
+        sample = self.values[self.number_of_records]
+        for index, (subpopulation_method, metapopulation_method) in enumerate(MEASUREMENTS.values()):
+            name = self.measurements[index]
+            if statistics is not None:
+                measurement_start = time.perf_counter()
+            sample[:self.number_of_subpopulations, index] = getattr(metapopulation, subpopulation_method)()
+            if statistics is not None:
+                statistics.add_measurement_time(f"subpop_{name}", time.perf_counter() - measurement_start)
+                measurement_start = time.perf_counter()
+            sample[self.number_of_subpopulations, index] = getattr(metapopulation, metapopulation_method)()
+            if statistics is not None:
+                statistics.add_measurement_time(f"metapop_{name}", time.perf_counter() - measurement_start)
+
+        self.subpopulation_means[self.number_of_records] = self._subpopulation_means(sample)
+        if generation is not None:
+            self.generations[self.number_of_records] = generation
+        self.number_of_records += 1
+
+        if statistics is not None:
+            statistics.number_of_measurements += 1
+
+
+    def record_state(self, state: Tuple[np.ndarray, np.ndarray, np.ndarray], number_of_features: int, min_trait: int, max_trait: int,
+                     statistics: SimulationStatistics = None, generation: int = None) -> None:
+        """
+        Measure a state of the metapopulation given as arrays (see `measure_state()`) and store the values in the next
+        sample, e.g. for array-based metapopulations, which would otherwise have to build all their individuals.
+
+        Args:
+            state (Tuple[np.ndarray, np.ndarray, np.ndarray]): The features, subpopulation and deme of origin of each individual.
+            number_of_features (int): Number of cultural features per individual.
+            min_trait (int): Minimum value for a trait in each feature.
+            max_trait (int): Maximum value for a trait in each feature.
+            statistics (SimulationStatistics, optional): If given, the time spent on the measurements is added to it. Defaults to None.
+            generation (int, optional): Generation of the sample. Defaults to None.
+        """
+        if statistics is not None:
+            measurement_start = time.perf_counter()
+
+        self.add_sample(measure_state(state, self.number_of_subpopulations, number_of_features, min_trait, max_trait), generation)
+
+        if statistics is not None:
+            statistics.add_measurement_time("state_measurements", time.perf_counter() - measurement_start)
+            statistics.number_of_measurements += 1
+
+
+    def add_sample(self, sample: np.ndarray, generation: int = None) -> None:
+        """
+        Store measurements that were taken somewhere else (e.g. by `BackgroundRecorder`) in the next sample.
+
+        Args:
+            sample (np.ndarray): Array of shape (subpopulations + 1, measurements), as one sample of `values`.
+            generation (int, optional): Generation of the sample. Defaults to None.
+        """
+        if self.number_of_records == self.number_of_samples:
+            raise IndexError(f"The recorder is full, it can only hold {self.number_of_samples} samples!")
+
+        self.values[self.number_of_records] = sample
+        self.subpopulation_means[self.number_of_records] = self._subpopulation_means(sample)
+        if generation is not None:
+            self.generations[self.number_of_records] = generation
+        self.number_of_records += 1
+
+
+    def _subpopulation_means(self, sample: np.ndarray) -> np.ndarray:
+        """
+        Average each measurement over the subpopulations that are not empty (an extinct subpopulation has no diversity),
+        leaving out the undefined values of the others (e.g. the Simpson diversity of a single individual).
+
+        Args:
+            sample (np.ndarray): Array of shape (subpopulations + 1, measurements), as one sample of `values`.
+
+        Returns:
+            np.ndarray: The average of each measurement, NaN if no subpopulation has a value.
+        """
+        values = sample[:self.number_of_subpopulations]
+        # the Gini diversity is defined for every subpopulation with at least one individual
+        occupied = ~np.isnan(values[:, self.measurements.index("gini")])
+        defined = occupied[:, np.newaxis] & ~np.isnan(values)
+        with np.errstate(invalid = "ignore"):
+            return np.where(defined, values, 0).sum(axis=0) / defined.sum(axis=0)
+
+
+    def recorded_generations(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: View with the generation of each sample recorded so far.
+        """
+        return self.generations[:self.number_of_records]
+
+
+    def per_subpopulation(self, measurement: str) -> np.ndarray:
+        """
+        Args:
+            measurement (str): Name of the measurement (e.g. "gini").
+
+        Returns:
+            np.ndarray: View of shape (records, subpopulations) with the measurement in each subpopulation.
+        """
+        return self.values[:self.number_of_records, :self.number_of_subpopulations, self.measurements.index(measurement)]
+
+
+    def subpopulation_mean(self, measurement: str) -> np.ndarray:
+        """
+        Args:
+            measurement (str): Name of the measurement (e.g. "gini").
+
+        Returns:
+            np.ndarray: View with the measurement averaged over subpopulations at each record.
+        """
+        return self.subpopulation_means[:self.number_of_records, self.measurements.index(measurement)]
+
+
+    def metapopulation(self, measurement: str) -> np.ndarray:
+        """
+        Args:
+            measurement (str): Name of the measurement (e.g. "gini").
+
+        Returns:
+            np.ndarray: View with the measurement over the whole metapopulation at each record.
+        """
+        return self.values[:self.number_of_records, self.number_of_subpopulations, self.measurements.index(measurement)]
+
+
+    def per_subpopulation_table(self, measurement: str, replicate_id: int) -> "pd.DataFrame":
+        """
+        Table of the measurement in each subpopulation, in the same format as the scripts that follow single subpopulations
+        (one column per subpopulation and a "Replicate" column).
+
+        Args:
+            measurement (str): Name of the measurement (e.g. "gini").
+            replicate_id (int): Id of the replicate.
+
+        Returns:
+            pd.DataFrame: One row per record, one column per subpopulation.
+        """
+        import pandas as pd
+
+        table = pd.DataFrame(self.per_subpopulation(measurement))
+        table["Replicate"] = replicate_id
+
+        return table
+
+
+def measure_state(state: Tuple[np.ndarray, np.ndarray, np.ndarray], number_of_subpopulations: int,
+                  number_of_features: int, min_trait: int, max_trait: int) -> np.ndarray:
+    """
+    Take all measurements on a state of the metapopulation given as arrays (see `Metapopulation.get_state()`). The values
+    are the ones of the methods of `Metapopulation` in `MEASUREMENTS`, computed from the counts of each set of traits in
+    each subpopulation, without building the individuals. Empty subpopulations have no set and undefined diversities (NaN).
+    Sets are told apart from the traits actually present, so traits outside [min_trait, max_trait] (e.g. a new mutant
+    trait) are measured as well.
+
+    Args:
+        state (Tuple[np.ndarray, np.ndarray, np.ndarray]): The features, subpopulation and deme of origin of each individual.
+        number_of_subpopulations (int): Number of subpopulations in the metapopulation.
+        number_of_features (int): Number of cultural features per individual.
+        min_trait (int): Minimum value for a trait in each feature.
+        max_trait (int): Maximum value for a trait in each feature.
+
+    Returns:
+        np.ndarray: Array of shape (subpopulations + 1, measurements), as one sample of `MeasurementRecorder.values`.
+    """
+    features = np.asarray(state[0]).reshape(-1, number_of_features)
+    deme_ids = np.asarray(state[1])
+    sample = np.full((number_of_subpopulations + 1, len(MEASUREMENTS)), np.nan)
+    if len(deme_ids) == 0:
+        sample[:, 0] = 0
+        return sample
+
+    sets = trait_set_labels(features)
+    number_of_sets = int(sets.max()) + 1
+    # number of individuals with each set of traits, in each subpopulation and in the whole metapopulation
+    pairs, counts = np.unique(deme_ids.astype(np.int64)*number_of_sets + sets, return_counts = True)
+    demes = pairs // number_of_sets
+    sizes = np.bincount(deme_ids, minlength = number_of_subpopulations).astype(float)
+    total_counts = np.bincount(sets).astype(float)
+    total_counts = total_counts[total_counts > 0]
+    total_size = float(len(deme_ids))
+
+    frequencies = counts / sizes[demes]
+    total_frequencies = total_counts / total_size
+    occupied = sizes > 0
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        values = {"set_counts": (np.bincount(demes, minlength = number_of_subpopulations), len(total_counts)),
+                  # subtracted from 0, so that a single set of traits has a diversity of 0 and not -0
+                  "shannon": (0.0 - np.bincount(demes, frequencies*np.log(frequencies), number_of_subpopulations),
+                              0.0 - np.sum(total_frequencies*np.log(total_frequencies))),
+                  "simpson": (1 - np.bincount(demes, counts*(counts - 1.0), number_of_subpopulations)/(sizes*(sizes - 1)),
+                              1 - np.sum(total_counts*(total_counts - 1))/(total_size*(total_size - 1))),
+                  "gini": (1 - np.bincount(demes, frequencies*frequencies, number_of_subpopulations), 1 - np.sum(total_frequencies*total_frequencies))}
+
+    for index, name in enumerate(MEASUREMENTS):
+        per_subpopulation, whole = values[name]
+        sample[:number_of_subpopulations, index] = np.where(occupied | (name == "set_counts"), per_subpopulation, np.nan)
+        sample[number_of_subpopulations, index] = whole
+
+    return sample
+
+
+def trait_set_labels(features: np.ndarray) -> np.ndarray:
+    """
+    Args:
+        features (np.ndarray): Array of shape (individuals, features) with the traits of each individual.
+
+    Returns:
+        np.ndarray: For each individual, the index of its set of traits among the distinct sets (in lexicographic order).
+    """
+    features = np.asarray(features, dtype=np.int64)
+    if features.size == 0:
+        return np.zeros(len(features), dtype=np.int64)
+    # the traits present, which may lie outside the range of the model (e.g. a new mutant trait)
+    min_trait = int(features.min())
+    base = int(features.max()) - min_trait + 1
+    if features.shape[1]*np.log2(max(base, 2)) >= 62:
+        return np.unique(features, axis=0, return_inverse=True)[1].reshape(-1)
+    # each set of traits as one integer, in base (number of traits), with the first feature as the most significant digit
+    weights = base**np.arange(features.shape[1] - 1, -1, -1, dtype=np.int64)
+    return np.unique((features - min_trait) @ weights, return_inverse=True)[1].reshape(-1)
+
+
+class BackgroundRecorder():
+    """
+    Measurements taken by a worker process while the simulation goes on. At each sample, a copy of the state of the
+    metapopulation is handed to the worker; at most two samples are pending (double buffering), so that the simulation
+    only waits when the worker is more than one sample behind. Results are stored in order in a `MeasurementRecorder`.
+
+    Attributes:
+        recorder (MeasurementRecorder): Where the measurements are stored.
+        number_of_features (int): Number of cultural features per individual.
+        min_trait (int): Minimum value for a trait in each feature.
+        max_trait (int): Maximum value for a trait in each feature.
+        executor (ProcessPoolExecutor): The worker process.
+        owns_executor (bool): Whether the worker was started by the recorder, which then stops it.
+        pending (Deque[Tuple[Future, int]]): Measurements submitted and not yet stored, oldest first, with their generation.
+    """
+    def __init__(self, recorder: MeasurementRecorder, number_of_features: int = 5, min_trait: int = 1, max_trait: int = 10,
+                 executor: ProcessPoolExecutor = None):
+        """
+        Start the worker, or use a worker shared with other recorders (e.g. the other replicates of a simulation).
+
+        Args:
+            recorder (MeasurementRecorder): Where the measurements are stored.
+            number_of_features (int, optional): Number of cultural features per individual. Defaults to 5.
+            min_trait (int, optional): Minimum value for a trait in each feature. Defaults to 1.
+            max_trait (int, optional): Maximum value for a trait in each feature. Defaults to 10.
+            executor (ProcessPoolExecutor, optional): A running worker, stopped by its owner. Defaults to None, in which case the recorder starts its own.
+        """
+        self.recorder = recorder
+        self.number_of_features = number_of_features
+        self.min_trait = min_trait
+        self.max_trait = max_trait
+        self.owns_executor = executor is None
+        self.executor = ProcessPoolExecutor(max_workers = 1) if executor is None else executor
+        self.pending: Deque[Tuple[Future, int]] = deque()
+
+
+    def submit(self, metapopulation: Metapopulation | WrightFisherMetapopulation, statistics: SimulationStatistics = None, generation: int = None) -> None:
+        """
+        Copy the state of the metapopulation and hand it to the worker.
+
+        Args:
+            metapopulation (Metapopulation | WrightFisherMetapopulation): The metapopulation to measure.
+            statistics (SimulationStatistics, optional): If given, the time spent copying the state (and waiting for the worker) is added to it. Defaults to None.
+            generation (int, optional): Generation of the sample. Defaults to None.
+        """
+        if statistics is not None:
+            measurement_start = time.perf_counter()
+
+        if len(self.pending) == 2:
+            self._store_oldest()
+        state = tuple(np.array(array) for array in metapopulation.get_state())
+        self.pending.append((self.executor.submit(measure_state, state, self.recorder.number_of_subpopulations,
+                                                  self.number_of_features, self.min_trait, self.max_trait), generation))
+
+        if statistics is not None:
+            statistics.add_measurement_time("background_submit", time.perf_counter() - measurement_start)
+            statistics.number_of_measurements += 1
+
+
+    def join(self) -> MeasurementRecorder:
+        """
+        Wait for all pending measurements, store them and stop the worker (if the recorder started it).
+
+        Returns:
+            MeasurementRecorder: The recorder with all the measurements.
+        """
+        while self.pending:
+            self._store_oldest()
+        if self.owns_executor:
+            self.executor.shutdown()
+
+        return self.recorder
+
+
+    def close(self) -> None:
+        """
+        Drop the pending measurements and stop the worker (if the recorder started it), e.g. when the simulation failed.
+        Does nothing more after `join()`.
+        """
+        while self.pending:
+            future, _ = self.pending.popleft()
+            future.cancel()
+        if self.owns_executor:
+            self.executor.shutdown(cancel_futures = True)
+
+
+    def _store_oldest(self) -> None:
+        """
+        Wait for the oldest pending measurement and store it.
+        """
+        future, generation = self.pending.popleft()
+        self.recorder.add_sample(future.result(), generation)
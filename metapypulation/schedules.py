@@ -0,0 +1,257 @@
+"""
+A module containing the schedules of measurements of a simulation: at a fixed stride, log-spaced, at given generations,
+denser within windows (e.g. around migration pulses), or only when the metapopulation changed.
+"""
+
+import numpy as np
+from typing import List, Tuple
+
+from .metapopulation import Metapopulation
+from .recorder import trait_set_labels
+from .wright_fisher import WrightFisherMetapopulation
+
+class MeasurementSchedule():
+    """
+    Generations at which a simulation is measured. A schedule plans a set of generations in advance; adaptive schedules
+    (`is_adaptive`) may then skip some of them, depending on the state of the metapopulation, in `should_measure()`.
+    The first planned generation is always 0 and the last one is the last generation of the simulation.
+
+    Attributes:
+        is_adaptive (bool): Whether planned measurements may be skipped, so that replicates have different numbers of measurements.
+    """
+    is_adaptive = False
+
+    def planned_generations(self, generations: int) -> np.ndarray:
+        """
+        Args:
+            generations (int): Number of generations of the simulation (the last generation is `generations`).
+
+        Returns:
+            np.ndarray: Sorted generations at which the simulation may be measured.
+        """
+        raise NotImplementedError
+
+
+    def reset(self) -> None:
+        """
+        Forget the state of the previous replicate, before a new one starts.
+        """
+
+
+    def should_measure(self, generation: int, metapopulation: Metapopulation | WrightFisherMetapopulation) -> bool:
+        """
+        Args:
+            generation (int): A planned generation.
+            metapopulation (Metapopulation | WrightFisherMetapopulation): The metapopulation at this generation.
+
+        Returns:
+            bool: Whether to measure the metapopulation.
+        """
+        return True
+
+
+class RegularSchedule(MeasurementSchedule):
+    """
+    A measurement every `stride` generations, as given by `measure_timing` in `Simulation`.
+
+    Attributes:
+        stride (int): Number of generations between measurements.
+    """
+    def __init__(self, stride: int):
+        """
+        Args:
+            stride (int): Number of generations between measurements.
+        """
+        if stride < 1:
+            raise ValueError("The number of generations between measurements must be positive!")
+        self.stride = stride
+
+
+    def planned_generations(self, generations: int) -> np.ndarray:
+        return np.arange(0, generations + 1, self.stride)
+
+
+class LogSchedule(MeasurementSchedule):
+    """
+    Measurements evenly spaced on a log scale of time, dense during the early transient and sparse at equilibrium.
+
+    Attributes:
+        number_of_measurements (int): Number of measurements, before removing the generations that round to the same integer.
+    """
+    def __init__(self, number_of_measurements: int):
+        """
+        Args:
+            number_of_measurements (int): Number of measurements. Early generations that round to the same integer are measured once.
+        """
+        if number_of_measurements < 2:
+            raise ValueError("A log-spaced schedule needs at least two measurements!")
+        self.number_of_measurements = number_of_measurements
+
+
+    def planned_generations(self, generations: int) -> np.ndarray:
+        return np.unique(np.round(np.geomspace(1, generations + 1, self.number_of_measurements)).astype(int) - 1)
+
+
+class ExplicitSchedule(MeasurementSchedule):
+    """
+    Measurements at given generations (with generation 0 and the last generation added).
+
+    Attributes:
+        generations (List[int]): The generations to measure.
+    """
+    def __init__(self, generations: List[int]):
+        """
+        Args:
+            generations (List[int]): The generations to measure.
+        """
+        self.generations = [int(generation) for generation in generations]
+
+
+    def planned_generations(self, generations: int) -> np.ndarray:
+        planned = np.array(self.generations + [0, generations], dtype=int)
+        return np.unique(planned[(planned >= 0) & (planned <= generations)])
+
+
+class WindowSchedule(MeasurementSchedule):
+    """
+    Measurements at a base stride, and at a finer stride within windows of generations, e.g. around migration pulses
+    (see `pulse_windows()`).
+
+    Attributes:
+        stride (int): Number of generations between measurements outside the windows.
+        windows (List[Tuple[int, int, int]]): First and last generation (included) of each window, and the number of generations between measurements within it.
+    """
+    def __init__(self, stride: int, windows: List[Tuple[int, int, int]]):
+        """
+        Args:
+            stride (int): Number of generations between measurements outside the windows.
+            windows (List[Tuple[int, int, int]]): First and last generation (included) of each window, and the number of generations between measurements within it.
+        """
+        if stride < 1 or any(window_stride < 1 for _, _, window_stride in windows):
+            raise ValueError("The number of generations between measurements must be positive!")
+        self.stride = stride
+        self.windows = [tuple(window) for window in windows]
+
+
+    def planned_generations(self, generations: int) -> np.ndarray:
+        planned = [np.arange(0, generations + 1, self.stride), [generations]]
+        for start, end, window_stride in self.windows:
+            planned.append(np.arange(max(start, 0), min(end, generations) + 1, window_stride))
+        return np.unique(np.concatenate(planned).astype(int))
+
+
+def pulse_windows(first_pulse: int, period: int, number_of_pulses: int, before: int, after: int, stride: int = 1) -> List[Tuple[int, int, int]]:
+    """
+    Windows around regular migration pulses, for `WindowSchedule`.
+
+    Args:
+        first_pulse (int): Generation of the first pulse.
+        period (int): Number of generations between pulses.
+        number_of_pulses (int): Number of pulses.
+        before (int): Number of generations measured before each pulse.
+        after (int): Number of generations measured after each pulse.
+        stride (int, optional): Number of generations between measurements within the windows. Defaults to 1.
+
+    Returns:
+        List[Tuple[int, int, int]]: The windows.
+    """
+    return [(first_pulse + pulse*period - before, first_pulse + pulse*period + after, stride) for pulse in range(number_of_pulses)]
+
+
+class ChangeTriggeredSchedule(MeasurementSchedule):
+    """
+    Measurements at the generations planned by another schedule, taken only when the number of distinct sets of traits
+    in the metapopulation changed by more than `threshold` since the last measurement, or when `max_gap` generations
+    passed without measurement. Counting the sets of traits is much cheaper than the full set of measurements, so quiet
+    phases of the dynamics cost little. The first and last planned generations are always measured.
+
+    Replicates then have measurements at different generations, so the output tables are indexed by generation, with
+    missing values where a replicate was not measured.
+
+    Attributes:
+        candidates (MeasurementSchedule): Schedule of the generations at which a measurement is considered.
+        threshold (float): Change of the number of sets of traits above which the metapopulation is measured.
+        max_gap (int): Number of generations after which the metapopulation is measured anyway, None for no limit.
+        last_generation (int): Last generation measured in the current replicate.
+        last_number_of_sets (int): Number of sets of traits at the last measurement of the current replicate.
+    """
+    is_adaptive = True
+
+    def __init__(self, candidates: MeasurementSchedule, threshold: float, max_gap: int = None):
+        """
+        Args:
+            candidates (MeasurementSchedule): Schedule of the generations at which a measurement is considered.
+            threshold (float): Change of the number of sets of traits above which the metapopulation is measured.
+            max_gap (int, optional): Number of generations after which the metapopulation is measured anyway. Defaults to None, for no limit.
+        """
+        if candidates.is_adaptive:
+            raise ValueError("The candidate generations must be planned in advance!")
+        self.candidates = candidates
+        self.threshold = threshold
+        self.max_gap = max_gap
+        self._last_planned = None
+        self.reset()
+
+
+    def planned_generations(self, generations: int) -> np.ndarray:
+        planned = self.candidates.planned_generations(generations)
+        self._last_planned = int(planned[-1])
+        return planned
+
+
+    def reset(self) -> None:
+        self.last_generation = None
+        self.last_number_of_sets = None
+
+
+    def should_measure(self, generation: int, metapopulation: Metapopulation | WrightFisherMetapopulation) -> bool:
+        number_of_sets = count_trait_sets(metapopulation.get_state()[0])
+        measure = (self.last_generation is None or generation == self._last_planned
+                   or abs(number_of_sets - self.last_number_of_sets) > self.threshold
+                   or (self.max_gap is not None and generation - self.last_generation >= self.max_gap))
+        if measure:
+            self.last_generation = generation
+            self.last_number_of_sets = number_of_sets
+
+        return measure
+
+
+def count_trait_sets(features: np.ndarray) -> int:
+    """
+    Args:
+        features (np.ndarray): Array of shape (individuals, features) with the traits of each individual.
+
+    Returns:
+        int: Number of distinct sets of traits.
+    """
+    if len(features) == 0:
+        return 0
+    return int(trait_set_labels(features).max()) + 1
+
+
+def make_schedule(description: dict) -> MeasurementSchedule:
+    """
+    Build a schedule from its description in an experiment file, e.g. `{"type": "log", "number_of_measurements": 200}`,
+    `{"type": "explicit", "generations": [...]}`, `{"type": "windows", "stride": 1000, "windows": [[start, end, stride], ...]}`,
+    `{"type": "regular", "stride": 100}`, or `{"type": "change", "threshold": 2, "max_gap": 10000, "candidates": {...}}`.
+
+    Args:
+        description (dict): Type of the schedule and the arguments of its class.
+
+    Returns:
+        MeasurementSchedule: The schedule.
+    """
+    arguments = dict(description)
+    match arguments.pop("type", None):
+        case "regular":
+            return RegularSchedule(**arguments)
+        case "log":
+            return LogSchedule(**arguments)
+        case "explicit":
+            return ExplicitSchedule(**arguments)
+        case "windows":
+            return WindowSchedule(**arguments)
+        case "change":
+            return ChangeTriggeredSchedule(make_schedule(arguments.pop("candidates")), **arguments)
+        case schedule_type:
+            raise ValueError(f"Unknown type of schedule {schedule_type}, choose between 'regular', 'log', 'explicit', 'windows' and 'change'.")
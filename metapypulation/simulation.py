@@ -2,19 +2,36 @@
 A module containing the tools to simulate a metapopulation and output the result in data tables.
 """
 
+from concurrent.futures import ProcessPoolExecutor
 from itertools import product
 import numpy as np
-import pandas as pd
-from typing import List
+from typing import TYPE_CHECKING, Dict, List, Tuple
 import time
 
 from .metapopulation import Metapopulation
 from .subpopulation import Subpopulation
 from .individual import Individual
+from .instrumentation import SimulationStatistics, save_statistics
+from .aggregation import ReplicateAggregator
+from .demography import DemographicMetapopulation
+from .recorder import MEASUREMENTS, BackgroundRecorder, MeasurementRecorder
+from .schedules import MeasurementSchedule, RegularSchedule
+from .snapshots import SnapshotStore
+from .wright_fisher import WrightFisherMetapopulation
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Names of the output tables, one for the average over subpopulations and one for the whole metapopulation for each measurement.
+OUTPUT_TABLES = [f"subpop_{measurement}" for measurement in MEASUREMENTS] + [f"metapop_{measurement}" for measurement in MEASUREMENTS]
 
 class Simulation():
     """
     Base class for the simulation of the metapopulation.
+
+    The output tables (`subpop_*`, `metapop_*` and `per_subpopulation`) are built from the stored replicates when they are
+    first read, and kept until a new replicate is stored: a table read twice is the same object, and changes made to it
+    are lost only when a new replicate is stored.
     
     Attributes:
         generations (int): Number of generations to simulate.
@@ -29,6 +46,13 @@ class Simulation():
         verbose_timing (int): Number of generations between each print statement.
         migration_matrix (str | np.ndarray): Type of migration topology ('island' or 'stepping stone'), or matrix of migrations between demes.
         mutation_rate (float): Probability of a mutation to occur during copying.
+        interactions_per_generation (int | str): Number of interactions in each subpopulation at each generation (see `Metapopulation`).
+        instrumentation (bool): Whether to collect timers and counters for each replicate.
+        statistics (Dict[int, SimulationStatistics]): Timers and counters of each replicate, when instrumentation is enabled.
+        update_mode (str): How a generation is simulated: "moran" (one interaction per subpopulation), "wright_fisher" (all individuals at once) or "demographic" (interactions, then births and deaths).
+        regulation (str): Regulation of the sizes of the subpopulations in "demographic" mode, "logistic" or "fixed" (see `DemographicMetapopulation`).
+        birth_rate (float): Probability that an individual gives birth at each generation in "demographic" mode.
+        extinction_rate (float): Probability that a subpopulation goes extinct at each generation in "demographic" mode.
         subpop_set_counts (pd.DataFrame): Collects the number of unique set counts per subpopulation averaged over subpopulations.
         subpop_shannon (pd.DataFrame): Collects the Shannon diversity index per subpopulation averaged over subpopulations.
         subpop_simpson (pd.DataFrame): Collects the Simpson diversity index per subpopulation averaged over subpopulations.
@@ -37,6 +61,18 @@ class Simulation():
         metapop_shannon (pd.DataFrame): Collects the Shannon diversity index over the whole metapopulation.
         metapop_simpson (pd.DataFrame): Collects the Simpson diversity index over the whole metapopulation.
         metapop_gini (pd.DataFrame): Collects the Gini diversity index over the whole metapopulation.
+        record_per_subpopulation (bool): Whether to keep the measurements of each subpopulation (and not only their average).
+        per_subpopulation (Dict[str, pd.DataFrame]): For each measurement, its value in each subpopulation (columns) at each time (rows), with a "Replicate" column.
+        aggregate_replicates (bool): Whether to keep a streaming summary (mean, standard deviation, minimum, maximum, quantiles) of the replicates.
+        keep_replicates (bool): Whether to keep every replicate in the output tables.
+        quantiles (List[float]): Quantiles estimated by the streaming summary.
+        aggregator (ReplicateAggregator): Streaming summary of the replicates, when `aggregate_replicates` is True.
+        snapshots (bool): Whether to store the full state of the metapopulation at each measurement.
+        snapshot_store (SnapshotStore): Memory-mapped files with the snapshots, when `snapshots` is True.
+        deferred_measurements (bool): Whether measurements are left to `evaluate_snapshots()` instead of being taken during the simulation.
+        background_measurements (bool): Whether measurements are taken by a worker process while the simulation goes on.
+        measurement_schedule (MeasurementSchedule): Generations at which the metapopulation is measured.
+        measurement_generations (np.ndarray): Generations planned by the schedule.
     """
     def __init__(self, 
                  generations: int,
@@ -51,7 +87,21 @@ class Simulation():
                  mutation_rate: float = 0.0,
                  measure_timing: int = 100,
                  verbose: bool = True,
-                 verbose_timing: int = 10000):
+                 verbose_timing: int = 10000,
+                 update_mode: str = "moran",
+                 interactions_per_generation: int | str = 1,
+                 instrumentation: bool = False,
+                 record_per_subpopulation: bool = False,
+                 aggregate_replicates: bool = False,
+                 keep_replicates: bool = True,
+                 quantiles: List[float] = None,
+                 snapshots: bool = False,
+                 deferred_measurements: bool = False,
+                 background_measurements: bool = False,
+                 measurement_schedule: MeasurementSchedule = None,
+                 regulation: str = "logistic",
+                 birth_rate: float = 0.1,
+                 extinction_rate: float = 0.0):
         """
         Create a simulation.
 
@@ -59,7 +109,7 @@ class Simulation():
             generations (int): Number of generations to simulate.
             number_of_subpopulations (int): Number of subpopulations in the metapopulation.
             migration_matrix (str | np.ndarray): Type of migration topology. Either a string to generate a table or a numpy array matrix.
-            interaction (str): Type of interaction between individuals. Currently accepts only "axelrod_interaction" and "neutral_interaction".
+            interaction (str): Type of interaction between individuals. "axelrod_interaction", "neutral_interaction" or any model registered with `register_interaction()`.
             carrying_capacities (List[int] | int): Initial population size of each subpopulation. Either a list with a carrying capacity for each subpopulation, or an int with equal carrying capacity for all subpopulations.
             replicates (int): Number of replicates to simulate.
             output_path (str): Path of folder in which to save results. TODO Creates new folder if it does not exist.
@@ -69,6 +119,20 @@ class Simulation():
             measure_timing (int, optional): Number of generations between measurements. Defaults to 100.
             verbose (bool, optional): Whether to print text during the simulation. Defaults to True.
             verbose_timing (int, optional): Number of generations between each print statement. Defaults to 10000.  
+            update_mode (str, optional): Either "moran", where a generation is one interaction per subpopulation, "wright_fisher", where all individuals in all subpopulations update at once from the previous generation, or "demographic", where a generation is one interaction per subpopulation followed by births and deaths, so that subpopulations grow, shrink, go extinct and are recolonised (see `DemographicMetapopulation`). Defaults to "moran".
+            interactions_per_generation (int | str, optional): Number of interactions in each subpopulation at each generation in "moran" and "demographic" modes, or "subpopulation_size" for as many interactions as individuals (Moran time units, "moran" mode only). Defaults to 1.
+            instrumentation (bool, optional): Whether to time the interaction, migration and measurement steps and count interactions and migrants. The statistics are saved with the results. Defaults to False.
+            record_per_subpopulation (bool, optional): Whether to keep and save the measurements of each subpopulation, in addition to their average. Defaults to False.
+            aggregate_replicates (bool, optional): Whether to keep a streaming summary of the replicates for each output table, saved as `{output_path}_{table}_summary.csv`. Defaults to False.
+            keep_replicates (bool, optional): Whether to keep every replicate in the output tables. With `aggregate_replicates`, setting it to False makes memory independent of the number of replicates. Defaults to True.
+            quantiles (List[float], optional): Quantiles (between 0 and 1) estimated by the streaming summary. Defaults to None.
+            snapshots (bool, optional): Whether to store the features, subpopulation and deme of origin of every individual at each measurement in memory-mapped files `{output_path}_snapshots_*`, to be read with `SnapshotReader`. Defaults to False.
+            deferred_measurements (bool, optional): Whether to only store snapshots during the simulation and leave the measurements to `evaluate_snapshots()`. Requires `snapshots`. Defaults to False.
+            background_measurements (bool, optional): Whether to hand a copy of the state to a worker process at each measurement, so that the measurements are computed while the simulation goes on. Defaults to False.
+            measurement_schedule (MeasurementSchedule, optional): Generations at which to measure (log-spaced, explicit, windows, change-triggered, see `schedules`). The output tables are then indexed by generation instead of by measurement. Defaults to None, for a measurement every `measure_timing` generations.
+            regulation (str, optional): In "demographic" mode, "logistic" for logistic growth to the carrying capacities, or "fixed" to bring each subpopulation back to its carrying capacity after births and deaths. Defaults to "logistic".
+            birth_rate (float, optional): In "demographic" mode, probability that an individual gives birth at each generation. Defaults to 0.1.
+            extinction_rate (float, optional): In "demographic" mode, probability that a subpopulation goes extinct at each generation. Defaults to 0.0.
         """
         self.generations = generations
         self.burn_in = burn_in
@@ -80,90 +144,202 @@ class Simulation():
         self.output_path = output_path
         
         self.measure_timing = measure_timing
+        self.measurement_schedule = RegularSchedule(measure_timing) if measurement_schedule is None else measurement_schedule
+        self.measurement_generations = self.measurement_schedule.planned_generations(generations)
+        if self.measurement_schedule.is_adaptive and (snapshots or aggregate_replicates):
+            raise ValueError("With an adaptive schedule, replicates are measured at different generations and cannot be stored as snapshots or aggregated!")
         
         self.verbose = verbose
         self.verbose_timing = verbose_timing
 
         self.mutation_rate = mutation_rate
 
+        if update_mode not in ("moran", "wright_fisher", "demographic"):
+            raise ValueError(f"Unknown update mode {update_mode}, choose between 'moran', 'wright_fisher' and 'demographic'.")
+        if update_mode == "demographic" and snapshots:
+            raise ValueError("The size of a demographic metapopulation changes, so it cannot be stored as snapshots!")
+        if update_mode == "demographic" and not isinstance(interactions_per_generation, int):
+            raise ValueError("In demographic mode, the number of interactions per generation must be an integer!")
+        self.update_mode = update_mode
+        self.interactions_per_generation = interactions_per_generation
+        self.regulation = regulation
+        self.birth_rate = birth_rate
+        self.extinction_rate = extinction_rate
+        self.instrumentation = instrumentation
+        self.statistics: Dict[int, SimulationStatistics] = {}
+        self.record_per_subpopulation = record_per_subpopulation
+        self._columns: Dict[str, List[Tuple[int, np.ndarray, np.ndarray]]] = {table: [] for table in OUTPUT_TABLES}
+        self._per_subpopulation_columns: Dict[str, List[Tuple[int, np.ndarray, np.ndarray]]] = {measurement: [] for measurement in MEASUREMENTS}
+        # output tables built from the columns when they are read, see `__getattr__()`
+        self._tables: Dict[str, "pd.DataFrame | Dict[str, pd.DataFrame]"] = {}
+
+        if not (keep_replicates or aggregate_replicates):
+            raise ValueError("The results must be either kept for each replicate or aggregated!")
+        self.aggregate_replicates = aggregate_replicates
+        self.keep_replicates = keep_replicates
+        self.quantiles = quantiles
+        self.aggregator: ReplicateAggregator = None
+        self.snapshots = snapshots
+        self.snapshot_store: SnapshotStore = None
+        if deferred_measurements and not snapshots:
+            raise ValueError("Deferred measurements are computed from the snapshots, which must be stored!")
+        self.deferred_measurements = deferred_measurements
+        self.background_measurements = background_measurements
+        # worker process shared by the background recorders of the replicates of `run_simulation()`
+        self._measurement_executor: ProcessPoolExecutor = None
+
         match migration_matrix:
             case str():
                 self.create_migration_table(migration_matrix, migration_rate)# np.genfromtxt(f'./configs/{migration_matrix}.csv', delimiter=',')
             case np.ndarray():
                 self.migration_matrix = migration_matrix
-                
-        self.subpop_set_counts = pd.DataFrame()
-        self.subpop_shannon = pd.DataFrame()
-        self.subpop_simpson = pd.DataFrame()
-        self.subpop_gini = pd.DataFrame()
-        self.metapop_set_counts = pd.DataFrame()
-        self.metapop_shannon = pd.DataFrame()
-        self.metapop_simpson = pd.DataFrame()
-        self.metapop_gini = pd.DataFrame()
         
     
+    def __getattr__(self, name: str) -> "pd.DataFrame | Dict[str, pd.DataFrame]":
+        """
+        Build the output tables (`subpop_gini`, ..., `per_subpopulation`) the first time they are read, so that pandas is
+        only imported when the tables are needed. A table is then kept, so that it is the same object at each read and
+        changes made to it stay, until a new replicate is stored or the results are emptied.
+        """
+        if name not in OUTPUT_TABLES and name != "per_subpopulation":
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        # read through __dict__, since attributes missing before __init__ (e.g. while unpickling) come back here
+        tables = self.__dict__.get("_tables")
+        if tables is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        if name not in tables:
+            tables[name] = self._build_table(name)
+
+        return tables[name]
+
+
+    def _build_table(self, name: str) -> "pd.DataFrame | Dict[str, pd.DataFrame]":
+        """
+        Args:
+            name (str): Name of an output table, or "per_subpopulation".
+
+        Returns:
+            pd.DataFrame | Dict[str, pd.DataFrame]: The table, with one column per replicate (or, for `per_subpopulation`, one table per measurement).
+        """
+        import pandas as pd
+
+        if name == "per_subpopulation":
+            return {measurement: pd.concat([pd.DataFrame(values, index=index).assign(Replicate=replicate_id) for replicate_id, values, index in columns]) if columns else pd.DataFrame()
+                    for measurement, columns in self._per_subpopulation_columns.items()}
+        if not self._columns[name]:
+            return pd.DataFrame()
+        table = pd.concat([pd.Series(values, index=index, name=replicate_id) for replicate_id, values, index in self._columns[name]], axis=1)
+        # replicates measured at different generations are joined in the order the generations are first seen
+        return table if self.indexed_by_measurement() else table.sort_index()
+
+    
     def empty_lists(self):
-        self.subpop_set_counts = pd.DataFrame()
-        self.subpop_shannon = pd.DataFrame()
-        self.subpop_simpson = pd.DataFrame()
-        self.subpop_gini = pd.DataFrame()
-        self.metapop_set_counts = pd.DataFrame()
-        self.metapop_shannon = pd.DataFrame()
-        self.metapop_simpson = pd.DataFrame()
-        self.metapop_gini = pd.DataFrame()
+        self._columns = {table: [] for table in OUTPUT_TABLES}
+        self.statistics = {}
+        self._per_subpopulation_columns = {measurement: [] for measurement in MEASUREMENTS}
+        self._tables = {}
+        self.aggregator = None
+        self.snapshot_store = None
 
         
-    def run_single_replicate(self, replicate_id: int) -> None:
+    def run_single_replicate(self, replicate_id: int) -> MeasurementRecorder:
         """
         Run one replicate of the simulation.
 
         Args:
             replicate_id (int): The number of the current replicate (for the output data columns).
+
+        Returns:
+            MeasurementRecorder: The measurements of the replicate, already added to the output tables.
         """
-        metapopulation = Metapopulation(self.number_of_subpopulations, self.interaction_type, self.migration_matrix, 
-                                        self.carrying_capacities, mutation_rate = self.mutation_rate)
+        match self.update_mode:
+            case "moran":
+                metapopulation = Metapopulation(self.number_of_subpopulations, self.interaction_type, self.migration_matrix, 
+                                                self.carrying_capacities, mutation_rate = self.mutation_rate,
+                                                interactions_per_generation = self.interactions_per_generation)
+            case "wright_fisher":
+                metapopulation = WrightFisherMetapopulation(self.number_of_subpopulations, self.interaction_type, self.migration_matrix, 
+                                                            self.carrying_capacities, mutation_rate = self.mutation_rate)
+            case "demographic":
+                metapopulation = DemographicMetapopulation(self.number_of_subpopulations, self.interaction_type, self.migration_matrix,
+                                                           self.carrying_capacities, mutation_rate = self.mutation_rate,
+                                                           interactions_per_generation = self.interactions_per_generation,
+                                                           regulation = self.regulation, birth_rate = self.birth_rate,
+                                                           extinction_rate = self.extinction_rate)
         metapopulation.populate()
         
-        set_counts = []
-        shannon = []
-        simpson = []
-        gini = []
-        metapop_counts = []
-        metapop_shannon = []
-        metapop_simpson = []
-        metapop_gini = []
+        recorder = MeasurementRecorder(len(self.measurement_generations), self.number_of_subpopulations)
+        background_recorder = BackgroundRecorder(recorder, executor = self._measurement_executor) if self.background_measurements and not self.deferred_measurements else None
+        if self.snapshots and self.snapshot_store is None:
+            self.snapshot_store = SnapshotStore(f"{self.output_path}_snapshots", self.replicates,
+                                                self.measurement_generations,
+                                                metapopulation.get_metapopulation_size(), self.number_of_subpopulations)
+        statistics = SimulationStatistics() if self.instrumentation else None
+        planned = self.measurement_generations.tolist() + [-1]
+        next_planned = 0
+        self.measurement_schedule.reset()
+        sample = 0
         
         start_time = time.time()
-        for t in range(self.generations + 1):
-            if self.verbose:
-                if t%self.verbose_timing == 0:
-                    print(f"Replicate {replicate_id}, gen {t}!")
-                    # TODO print other fun stuff
+        try:
+            for t in range(self.generations + 1):
+                if self.verbose:
+                    if t%self.verbose_timing == 0:
+                        print(f"Replicate {replicate_id}, gen {t}!")
+                        # TODO print other fun stuff
                     
-            if t%self.measure_timing == 0:
-                set_counts.append(np.mean(metapopulation.traits_sets_per_subpopulation()))
-                shannon.append(np.mean(metapopulation.shannon_diversity_per_subpopulation()))
-                simpson.append(np.mean(metapopulation.simpson_diversity_per_subpopulation()))
-                gini.append(np.mean(metapopulation.gini_diversity_per_subpopulation()))
-                metapop_counts.append(metapopulation.metapopulation_count_sets())
-                metapop_shannon.append(metapopulation.metapopulation_shannon_diversity())
-                metapop_simpson.append(metapopulation.metapopulation_simpson_diversity())
-                metapop_gini.append(metapopulation.metapopulation_gini_diversity())
+                if t == planned[next_planned]:
+                    next_planned += 1
+                    if self.measurement_schedule.should_measure(t, metapopulation):
+                        if background_recorder is not None:
+                            background_recorder.submit(metapopulation, statistics, t)
+                        elif not self.deferred_measurements:
+                            if self.update_mode != "moran":
+                                # measured from the arrays, without building the individuals
+                                recorder.record_state(metapopulation.get_state(), metapopulation.number_of_features, metapopulation.min_trait,
+                                                      metapopulation.max_trait, statistics, t)
+                            else:
+                                recorder.record(metapopulation, statistics, t)
+                        if self.snapshot_store is not None:
+                            self.snapshot_store.write(replicate_id - 1, sample, metapopulation)
+                        sample += 1
             
-
-            if t > self.burn_in:
-                metapopulation.migrate()
-            
-            metapopulation.make_interact()
+                if statistics is None:
+                    if t > self.burn_in:
+                        metapopulation.migrate()
+                
+                    metapopulation.make_interact()
+                    if self.update_mode == "demographic":
+                        metapopulation.regulate()
+                else:
+                    phase_start = time.perf_counter()
+                    if t > self.burn_in:
+                        statistics.number_of_migrants += metapopulation.migrate()
+                    statistics.migration_time += time.perf_counter() - phase_start
+                
+                    phase_start = time.perf_counter()
+                    statistics.number_of_interactions += metapopulation.make_interact()
+                    if self.update_mode == "demographic":
+                        metapopulation.regulate()
+                    statistics.interaction_time += time.perf_counter() - phase_start
         
-        self.subpop_set_counts = pd.concat([self.subpop_set_counts, pd.Series(set_counts, name=replicate_id)], axis=1)
-        self.subpop_shannon = pd.concat([self.subpop_shannon, pd.Series(shannon, name=replicate_id)], axis=1)
-        self.subpop_simpson = pd.concat([self.subpop_simpson, pd.Series(simpson, name=replicate_id)], axis=1)
-        self.subpop_gini = pd.concat([self.subpop_gini, pd.Series(gini, name=replicate_id)], axis=1)
-        self.metapop_set_counts = pd.concat([self.metapop_set_counts, pd.Series(metapop_counts, name=replicate_id)], axis=1)
-        self.metapop_shannon = pd.concat([self.metapop_shannon, pd.Series(metapop_shannon, name=replicate_id)], axis=1)
-        self.metapop_simpson = pd.concat([self.metapop_simpson, pd.Series(metapop_simpson, name=replicate_id)], axis=1)
-        self.metapop_gini = pd.concat([self.metapop_gini, pd.Series(metapop_gini, name=replicate_id)], axis=1)
+            if background_recorder is not None:
+                background_recorder.join()
+        finally:
+            # measurements still pending after an error are dropped, and a worker owned by the recorder is stopped
+            if background_recorder is not None:
+                background_recorder.close()
+        if not self.deferred_measurements:
+            self.store_replicate(recorder, replicate_id)
+        if self.snapshot_store is not None:
+            self.snapshot_store.flush()
+        
+        if statistics is not None:
+            statistics.generations = self.generations + 1
+            statistics.number_of_changes = metapopulation.count_changes()
+            self.statistics[replicate_id] = statistics
+            if self.verbose:
+                print(f"Replicate {replicate_id}: {statistics.summary()}")
                              
         if self.verbose:
             end_time = time.time()
@@ -171,8 +347,47 @@ class Simulation():
             total_time = time.strftime("%H:%M:%S", time.gmtime(total_time))
 
             print(f"{t} generations ran in {total_time}.")
+
+        return recorder
             
 
+    def store_replicate(self, recorder: MeasurementRecorder, replicate_id: int) -> None:
+        """
+        Add the measurements of one replicate to the output tables.
+
+        Args:
+            recorder (MeasurementRecorder): The measurements of the replicate.
+            replicate_id (int): The number of the replicate (for the output data columns).
+        """
+        if self.aggregate_replicates:
+            if self.aggregator is None:
+                self.aggregator = ReplicateAggregator(recorder.number_of_records, OUTPUT_TABLES, self.quantiles)
+            replicate = {}
+            for measurement in MEASUREMENTS:
+                replicate[f"subpop_{measurement}"] = recorder.subpopulation_mean(measurement)
+                replicate[f"metapop_{measurement}"] = recorder.metapopulation(measurement)
+            self.aggregator.add(replicate)
+        
+        # the tables read so far no longer hold every replicate
+        self._tables = {}
+        # with the default schedule, rows are numbered by measurement as they always were
+        index = None if self.indexed_by_measurement() else recorder.recorded_generations().copy()
+        for measurement in MEASUREMENTS:
+            if self.keep_replicates:
+                self._columns[f"subpop_{measurement}"].append((replicate_id, recorder.subpopulation_mean(measurement).copy(), index))
+                self._columns[f"metapop_{measurement}"].append((replicate_id, recorder.metapopulation(measurement).copy(), index))
+            if self.record_per_subpopulation:
+                self._per_subpopulation_columns[measurement].append((replicate_id, recorder.per_subpopulation(measurement).copy(), index))
+
+
+    def indexed_by_measurement(self) -> bool:
+        """
+        Returns:
+            bool: Whether the rows of the output tables are the numbers of the measurements (with a measurement every `measure_timing` generations), rather than generations.
+        """
+        return type(self.measurement_schedule) is RegularSchedule
+
+
     def run_simulation(self) -> None:
         """
         Run all the replicates and print some outputs.
@@ -186,15 +401,23 @@ class Simulation():
                     print(f"Simulating {self.replicates} replicates of a custom migration model with {self.number_of_subpopulations}.")
         
         start_time = time.time()
-        for replicate in range(1, self.replicates + 1):
-            self.run_single_replicate(replicate)
-            
-            if self.verbose:
-                end_time = time.time()
-                total_time = end_time - start_time
-                total_time = time.strftime("%H:%M:%S", time.gmtime(total_time))
+        if self.background_measurements and not self.deferred_measurements:
+            # one worker process measures all the replicates
+            self._measurement_executor = ProcessPoolExecutor(max_workers = 1)
+        try:
+            for replicate in range(1, self.replicates + 1):
+                self.run_single_replicate(replicate)
+                
+                if self.verbose:
+                    end_time = time.time()
+                    total_time = end_time - start_time
+                    total_time = time.strftime("%H:%M:%S", time.gmtime(total_time))
 
-                print(f"Replicate {replicate} ran in {total_time}.")
+                    print(f"Replicate {replicate} ran in {total_time}.")
+        finally:
+            if self._measurement_executor is not None:
+                self._measurement_executor.shutdown(cancel_futures = True)
+                self._measurement_executor = None
             
         if self.verbose:
             end_time = time.time()
@@ -210,14 +433,26 @@ class Simulation():
         """
         Save output to input folder.
         """
-        self.subpop_set_counts.to_csv(f"{self.output_path}_subpop_set_counts.csv", sep=",")
-        self.subpop_shannon.to_csv(f"{self.output_path}_subpop_shannon.csv", sep=",")
-        self.subpop_simpson.to_csv(f"{self.output_path}_subpop_simpson.csv", sep=",")
-        self.subpop_gini.to_csv(f"{self.output_path}_subpop_gini.csv", sep=",")
-        self.metapop_set_counts.to_csv(f"{self.output_path}_metapop_set_counts.csv", sep=",")
-        self.metapop_shannon.to_csv(f"{self.output_path}_metapop_shannon.csv", sep=",")
-        self.metapop_simpson.to_csv(f"{self.output_path}_metapop_simpson.csv", sep=",")
-        self.metapop_gini.to_csv(f"{self.output_path}_metapop_gini.csv", sep=",")
+        if self.keep_replicates and not self.deferred_measurements:
+            self.subpop_set_counts.to_csv(f"{self.output_path}_subpop_set_counts.csv", sep=",")
+            self.subpop_shannon.to_csv(f"{self.output_path}_subpop_shannon.csv", sep=",")
+            self.subpop_simpson.to_csv(f"{self.output_path}_subpop_simpson.csv", sep=",")
+            self.subpop_gini.to_csv(f"{self.output_path}_subpop_gini.csv", sep=",")
+            self.metapop_set_counts.to_csv(f"{self.output_path}_metapop_set_counts.csv", sep=",")
+            self.metapop_shannon.to_csv(f"{self.output_path}_metapop_shannon.csv", sep=",")
+            self.metapop_simpson.to_csv(f"{self.output_path}_metapop_simpson.csv", sep=",")
+            self.metapop_gini.to_csv(f"{self.output_path}_metapop_gini.csv", sep=",")
+        if self.aggregator is not None:
+            for table in OUTPUT_TABLES:
+                summary = self.aggregator.summary(table)
+                if not self.indexed_by_measurement():
+                    summary.index = self.measurement_generations
+                summary.to_csv(f"{self.output_path}_{table}_summary.csv", sep=",")
+        if self.record_per_subpopulation:
+            for measurement, table in self.per_subpopulation.items():
+                table.to_csv(f"{self.output_path}_per_subpop_{measurement}.csv", sep=",")
+        if self.instrumentation:
+            save_statistics(self.statistics, f"{self.output_path}_statistics.json")
         
     
     def create_migration_table(self, type_of_model, migration_rate: float) -> None:
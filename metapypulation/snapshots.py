@@ -0,0 +1,190 @@
+"""
+A module containing the storage of the full state of the metapopulation at sample times, in memory-mapped files, so
+that any measurement can be computed afterwards without running the simulation again.
+"""
+
+import json
+import numpy as np
+from typing import Tuple
+
+from .metapopulation import Metapopulation
+from .wright_fisher import WrightFisherMetapopulation
+
+class SnapshotStore():
+    """
+    Preallocated memory-mapped files holding, for each replicate and each sample, the features, the subpopulation and
+    the deme of origin of every individual. The size of the metapopulation must stay the same during the simulation
+    (which is the case with migration).
+
+    Files are `{path}_features.npy` (replicates x samples x individuals x features), `{path}_deme_ids.npy` and
+    `{path}_origin_ids.npy` (replicates x samples x individuals), and `{path}.json` with the sample times and the
+    parameters needed to rebuild a `Metapopulation`. They are read with `SnapshotReader`.
+
+    Attributes:
+        path (str): Path prefix of the files.
+        times (np.ndarray): Generation of each sample.
+        number_of_subpopulations (int): Number of subpopulations in the metapopulation.
+        features (np.memmap): Features of each individual in each sample of each replicate.
+        deme_ids (np.memmap): Subpopulation of each individual in each sample of each replicate.
+        origin_ids (np.memmap): Deme of origin of each individual in each sample of each replicate.
+    """
+    def __init__(self, path: str, number_of_replicates: int, times: np.ndarray, number_of_individuals: int,
+                 number_of_subpopulations: int, number_of_features: int = 5, min_trait: int = 1, max_trait: int = 10):
+        """
+        Create the files of the store, with all snapshots set to zero.
+
+        Args:
+            path (str): Path prefix of the files.
+            number_of_replicates (int): Number of replicates.
+            times (np.ndarray): Generation of each sample.
+            number_of_individuals (int): Size of the metapopulation.
+            number_of_subpopulations (int): Number of subpopulations in the metapopulation.
+            number_of_features (int, optional): Number of cultural features per individual. Defaults to 5.
+            min_trait (int, optional): Minimum value for a trait in each feature. Defaults to 1.
+            max_trait (int, optional): Maximum value for a trait in each feature. Defaults to 10.
+        """
+        self.path = path
+        self.times = np.asarray(times)
+        self.number_of_subpopulations = number_of_subpopulations
+
+        # the smallest integer types that hold the values keep the files compact
+        trait_type = np.result_type(np.min_scalar_type(min_trait), np.min_scalar_type(max_trait))
+        deme_type = np.min_scalar_type(number_of_subpopulations)
+        shape = (number_of_replicates, len(self.times), number_of_individuals)
+        self.features = np.lib.format.open_memmap(f"{path}_features.npy", mode="w+", dtype=trait_type, shape=shape + (number_of_features,))
+        self.deme_ids = np.lib.format.open_memmap(f"{path}_deme_ids.npy", mode="w+", dtype=deme_type, shape=shape)
+        self.origin_ids = np.lib.format.open_memmap(f"{path}_origin_ids.npy", mode="w+", dtype=deme_type, shape=shape)
+
+        with open(f"{path}.json", "w") as file:
+            json.dump({"times": self.times.tolist(), "number_of_subpopulations": number_of_subpopulations,
+                       "number_of_features": number_of_features, "min_trait": min_trait, "max_trait": max_trait}, file)
+
+
+    def write(self, replicate: int, sample: int, metapopulation: Metapopulation | WrightFisherMetapopulation) -> None:
+        """
+        Store the current state of the metapopulation.
+
+        Args:
+            replicate (int): Index of the replicate (from 0).
+            sample (int): Index of the sample (from 0).
+            metapopulation (Metapopulation | WrightFisherMetapopulation): The metapopulation to store.
+        """
+        features, deme_ids, origin_ids = metapopulation.get_state()
+        if len(features) != self.features.shape[2]:
+            raise ValueError(f"The store holds {self.features.shape[2]} individuals, the metapopulation has {len(features)}!")
+
+        self.features[replicate, sample] = features
+        self.deme_ids[replicate, sample] = deme_ids
+        self.origin_ids[replicate, sample] = origin_ids
+
+
+    def flush(self) -> None:
+        """
+        Write the changes to the files.
+        """
+        self.features.flush()
+        self.deme_ids.flush()
+        self.origin_ids.flush()
+
+
+class SnapshotReader():
+    """
+    Read-only access to the files of a `SnapshotStore`. The files are memory-mapped, so only the slices that are used are
+    read from the disk.
+
+    Attributes:
+        times (np.ndarray): Generation of each sample.
+        number_of_subpopulations (int): Number of subpopulations in the metapopulation.
+        number_of_features (int): Number of cultural features per individual.
+        min_trait (int): Minimum value for a trait in each feature.
+        max_trait (int): Maximum value for a trait in each feature.
+        features (np.memmap): Features of each individual in each sample of each replicate.
+        deme_ids (np.memmap): Subpopulation of each individual in each sample of each replicate.
+        origin_ids (np.memmap): Deme of origin of each individual in each sample of each replicate.
+    """
+    def __init__(self, path: str):
+        """
+        Open the files of a store.
+
+        Args:
+            path (str): Path prefix of the files, as given to `SnapshotStore`.
+        """
+        with open(f"{path}.json") as file:
+            metadata = json.load(file)
+        self.times = np.array(metadata["times"])
+        self.number_of_subpopulations = metadata["number_of_subpopulations"]
+        self.number_of_features = metadata["number_of_features"]
+        self.min_trait = metadata["min_trait"]
+        self.max_trait = metadata["max_trait"]
+
+        self.features = np.load(f"{path}_features.npy", mmap_mode="r")
+        self.deme_ids = np.load(f"{path}_deme_ids.npy", mmap_mode="r")
+        self.origin_ids = np.load(f"{path}_origin_ids.npy", mmap_mode="r")
+
+
+    @property
+    def number_of_replicates(self) -> int:
+        """
+        Returns:
+            int: Number of replicates in the store.
+        """
+        return self.features.shape[0]
+
+
+    def time_index(self, generation: int) -> int:
+        """
+        Args:
+            generation (int): A generation at which a sample was taken.
+
+        Returns:
+            int: Index of the sample taken at that generation.
+        """
+        index = int(np.searchsorted(self.times, generation))
+        if index == len(self.times) or self.times[index] != generation:
+            raise KeyError(f"No sample was taken at generation {generation}!")
+        return index
+
+
+    def get_state(self, replicate: int, sample: int, deme: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Read one snapshot, optionally restricted to the individuals of one subpopulation.
+
+        Args:
+            replicate (int): Index of the replicate (from 0).
+            sample (int): Index of the sample (from 0), see `time_index()`.
+            deme (int, optional): Id of a subpopulation. Defaults to None, in which case the whole metapopulation is read.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: the features, the id of the subpopulation and the id of the deme of origin of each individual.
+        """
+        deme_ids = np.asarray(self.deme_ids[replicate, sample], dtype=int)
+        if deme is None:
+            individuals = slice(None)
+        else:
+            individuals = np.nonzero(deme_ids == deme)[0]
+
+        return (np.asarray(self.features[replicate, sample, individuals], dtype=int), deme_ids[individuals],
+                np.asarray(self.origin_ids[replicate, sample, individuals], dtype=int))
+
+
+    def to_metapopulation(self, replicate: int, sample: int, type_of_interaction: str = "axelrod_interaction") -> Metapopulation:
+        """
+        Rebuild the metapopulation of one snapshot, for example to compute a measurement that was not taken during the simulation.
+
+        Args:
+            replicate (int): Index of the replicate (from 0).
+            sample (int): Index of the sample (from 0), see `time_index()`.
+            type_of_interaction (str, optional): Type of interaction of the metapopulation. Defaults to "axelrod_interaction".
+
+        Returns:
+            Metapopulation: a metapopulation with the individuals of the snapshot.
+        """
+        features, deme_ids, origin_ids = self.get_state(replicate, sample)
+        metapopulation = Metapopulation(self.number_of_subpopulations, type_of_interaction,
+                                        carrying_capacities = np.bincount(deme_ids, minlength=self.number_of_subpopulations).tolist(),
+                                        number_of_features = self.number_of_features,
+                                        number_of_traits = self.max_trait - self.min_trait + 1,
+                                        min_trait = self.min_trait, max_trait = self.max_trait)
+        metapopulation.populate_from_arrays(features, deme_ids, origin_ids)
+
+        return metapopulation
@@ -0,0 +1,198 @@
+"""
+A module containing a multilevel splitting estimator of the probability that a new trait spreads, for events too rare
+to be estimated with independent replicates.
+"""
+
+import copy
+import numpy as np
+from statistics import NormalDist
+from typing import Callable, List, Tuple
+
+from .metapopulation import Metapopulation
+
+class SplittingEstimator():
+    """
+    Fixed splitting estimator of the probability that a trait reaches a final threshold (of carriers or of demes where
+    it is found) before it is lost and before a maximum number of generations.
+
+    The spread of the trait is measured by a score, and intermediate thresholds (levels) are set between the initial
+    score and the final one. Each run starts from a new metapopulation (a root); when a run first reaches level k, it is
+    split into `splits[k]` copies that go on independently. A run that reaches the final level counts with weight
+    1 / (product of the splits of the levels it crossed), so that the sum of the weights of a root is an unbiased
+    estimate of the probability. Roots are independent, which gives the confidence interval.
+
+    Compared to independent replicates, little time is spent on the many runs where the trait is lost early, and the
+    rare runs where it spreads are followed many times.
+
+    Attributes:
+        create_metapopulation (Callable[[], Metapopulation]): Function that returns a new metapopulation in which the trait was just introduced.
+        trait (int): The trait that is followed.
+        feature (int): The feature at which the trait is followed, None for any feature.
+        levels (List[int]): Increasing thresholds of the score. The last one is the event whose probability is estimated.
+        splits (List[int]): Number of copies made of a run when it reaches each intermediate level.
+        score (str): Either "carriers" (number of individuals with the trait) or "demes" (number of subpopulations where the trait is found).
+        max_generations (int): Number of generations after which a run that did not reach the last level fails.
+        migrate (bool): Whether migration happens at each generation.
+        check_interval (int): Number of generations between evaluations of the score.
+        root_estimates (np.ndarray): Estimate of the probability given by each root.
+        level_hits (np.ndarray): Number of runs that reached each level.
+        generations_simulated (int): Total number of generations simulated by all runs.
+    """
+    def __init__(self,
+                 create_metapopulation: Callable[[], Metapopulation],
+                 trait: int,
+                 levels: List[int],
+                 splits: List[int] | int,
+                 max_generations: int,
+                 feature: int = None,
+                 score: str = "carriers",
+                 migrate: bool = True,
+                 check_interval: int = 1):
+        """
+        Create an estimator.
+
+        Args:
+            create_metapopulation (Callable[[], Metapopulation]): Function that returns a new metapopulation in which the trait was just introduced.
+            trait (int): The trait that is followed.
+            levels (List[int]): Increasing thresholds of the score. The last one is the event whose probability is estimated.
+            splits (List[int] | int): Number of copies made of a run when it reaches each intermediate level (one less than the number of levels), or the same number for all levels.
+            max_generations (int): Number of generations after which a run that did not reach the last level fails.
+            feature (int, optional): The feature at which the trait is followed. Defaults to None, in which case the trait is followed at any feature.
+            score (str, optional): Either "carriers" (number of individuals with the trait) or "demes" (number of subpopulations where the trait is found). Defaults to "carriers".
+            migrate (bool, optional): Whether migration happens at each generation. Defaults to True.
+            check_interval (int, optional): Number of generations between evaluations of the score. Levels crossed between two evaluations are only seen if the trait is still above them. Defaults to 1.
+        """
+        if score not in ("carriers", "demes"):
+            raise ValueError(f"Unknown score {score}, choose between 'carriers' and 'demes'.")
+        if any(lower >= upper for lower, upper in zip(levels, levels[1:])):
+            raise ValueError("The levels must be increasing!")
+
+        match splits:
+            case list():
+                assert len(splits) == len(levels) - 1
+                self.splits = splits
+            case int():
+                self.splits = [splits]*(len(levels) - 1)
+
+        self.create_metapopulation = create_metapopulation
+        self.trait = trait
+        self.feature = feature
+        self.levels = levels
+        self.score = score
+        self.max_generations = max_generations
+        self.migrate = migrate
+        self.check_interval = check_interval
+
+        self.root_estimates = np.zeros(0)
+        self.level_hits = np.zeros(len(levels), dtype=int)
+        self.generations_simulated = 0
+
+
+    def evaluate_score(self, metapopulation: Metapopulation) -> int:
+        """
+        Args:
+            metapopulation (Metapopulation): The metapopulation of a run.
+
+        Returns:
+            int: The current score of the trait, 0 when it is lost.
+        """
+        counts = [subpopulation.count_trait(self.trait, self.feature) for subpopulation in metapopulation.subpopulations]
+        if self.score == "carriers":
+            return sum(counts)
+        return np.count_nonzero(counts)
+
+
+    def run_root(self) -> float:
+        """
+        Run one root and all the runs split from it.
+
+        Returns:
+            float: The estimate of the probability given by the root.
+        """
+        estimate = 0.0
+        # runs waiting to be simulated: metapopulation, generation, next level and weight
+        runs: List[Tuple[Metapopulation, int, int, float]] = [(self.create_metapopulation(), 0, 0, 1.0)]
+        while runs:
+            metapopulation, generation, level, weight = runs.pop()
+            reached = False
+            while generation < self.max_generations:
+                if self.migrate:
+                    metapopulation.migrate()
+                metapopulation.make_interact()
+                generation += 1
+                self.generations_simulated += 1
+
+                if generation%self.check_interval != 0:
+                    continue
+                score = self.evaluate_score(metapopulation)
+                if score == 0:
+                    break
+                if score >= self.levels[level]:
+                    reached = True
+                    break
+
+            if not reached:
+                continue
+
+            # a run can cross several levels at once, it is then split for each of them
+            while level < len(self.levels) - 1 and score >= self.levels[level]:
+                self.level_hits[level] += 1
+                weight /= self.splits[level]
+                for _ in range(self.splits[level] - 1):
+                    runs.append((copy.deepcopy(metapopulation), generation, level + 1, weight))
+                level += 1
+            if level == len(self.levels) - 1 and score >= self.levels[level]:
+                self.level_hits[level] += 1
+                estimate += weight
+            else:
+                runs.append((metapopulation, generation, level, weight))
+
+        return estimate
+
+
+    def run(self, number_of_roots: int) -> float:
+        """
+        Run new roots and add them to the estimate.
+
+        Args:
+            number_of_roots (int): Number of independent roots.
+
+        Returns:
+            float: The estimate of the probability over all roots so far.
+        """
+        self.root_estimates = np.concatenate((self.root_estimates, [self.run_root() for _ in range(number_of_roots)]))
+
+        return self.estimate()
+
+
+    def estimate(self) -> float:
+        """
+        Returns:
+            float: The unbiased estimate of the probability, the mean of the estimates of the roots.
+        """
+        return float(np.mean(self.root_estimates))
+
+
+    def standard_error(self) -> float:
+        """
+        Returns:
+            float: Standard error of the estimate, from the variance between independent roots.
+        """
+        if len(self.root_estimates) < 2:
+            return np.nan
+        return float(np.std(self.root_estimates, ddof=1) / np.sqrt(len(self.root_estimates)))
+
+
+    def confidence_interval(self, confidence: float = 0.95) -> Tuple[float, float]:
+        """
+        Args:
+            confidence (float, optional): Confidence level of the interval. Defaults to 0.95.
+
+        Returns:
+            Tuple[float, float]: Normal approximation of the confidence interval of the probability, clipped to [0, 1].
+        """
+        z = NormalDist().inv_cdf(0.5 + confidence/2)
+        estimate = self.estimate()
+        half_width = z*self.standard_error()
+
+        return max(0.0, estimate - half_width), min(1.0, estimate + half_width)
@@ -3,11 +3,15 @@ A module containing the subpopulation class.
 """
 
 from collections.abc import Iterator, MutableSet
+from functools import partial
 import numpy as np
 import random
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
 from .individual import Individual
+from .interactions import InteractionModel, get_interaction
+from .networks import SocialNetwork
+from .random_buffer import RandomBuffer
 
 
 class Subpopulation():
@@ -19,21 +23,41 @@ class Subpopulation():
         population (SetOfIndividuals): Set containing all the individuals in the subpopulation
         outgoing_migrants (SetOfIndividuals): Set containing individuals that are being prepared for emigration. Empty outside of the migration step.
         incoming_migrants (SetOfIndividuals): Set containind individuals that were received through immigration. Empty outside of the migration step.
-        type_of_interaction (str): The type of interaction to implement between individuals for cultural changes. Currently accepts only "axelrod_interaction".
+        type_of_interaction (str): The type of interaction to implement between individuals for cultural changes. Any model registered with `register_interaction()`, e.g. "axelrod_interaction" or "neutral_interaction".
+        interaction (InteractionModel): The registered model of `type_of_interaction`, resolved once when the subpopulation is created.
+        mutation_rate (float): Probability that a copy mutates. If given, the interactions in which a mutation occurs are drawn in advance by the subpopulation, and interactions in between do not draw random numbers for mutation. None if individuals draw mutations themselves.
+        random_buffer (RandomBuffer): Block of random numbers from which interactions, mutations and emigrations take their random numbers.
+        trait_counts (List[Dict[int, int]]): For each feature, the number of individuals with each trait, kept up to date when individuals arrive, leave or change. Only kept for interaction models that use it, None otherwise.
+        network (SocialNetwork): Social network restricting the partners of each individual, see `set_network()`. None if any two individuals can interact.
     """
-    def __init__(self, id: int, type_of_interaction: str):
+    def __init__(self, id: int, type_of_interaction: str, mutation_rate: float = None, block_size: int = 1024):
         """
         Create a new subpopulation.
 
         Args:
             id (int): Identifier of the population.
-            type_of_interaction (str): The type of interaction to implement between individuals for cultural changes. Currently accepts only "axelrod_interaction".
+            type_of_interaction (str): The type of interaction to implement between individuals for cultural changes. Any model registered with `register_interaction()`.
+            mutation_rate (float, optional): Probability that a copy mutates, the same as for the individuals. Defaults to None, in which case individuals draw mutations themselves at each interaction.
+            block_size (int, optional): Number of random numbers drawn at once by the subpopulation. Defaults to 1024.
         """
         self.id = id
         self.population = SetOfIndividuals(self)
         self.outgoing_migrants = SetOfIndividuals(self) # CONSIDER removing since migration works with incoming_migrants
         self.incoming_migrants = SetOfIndividuals(self)
         self.type_of_interaction = type_of_interaction
+        self.interaction: InteractionModel = get_interaction(type_of_interaction)
+        self._interaction_kernel = self.interaction.scalar_kernel
+        self.trait_counts: List[Dict[int, int]] = None
+        if self.interaction.uses_trait_counts:
+            self.trait_counts = []
+            self._interaction_kernel = partial(self.interaction.scalar_kernel, trait_counts = self.trait_counts)
+        self.network: SocialNetwork = None
+        self.mutation_rate = mutation_rate
+        self.random_buffer = RandomBuffer(block_size)
+        # mutations are a Bernoulli process over interactions, so the number of interactions until the next one is geometric
+        self._interactions_until_mutation = np.inf
+        if mutation_rate:
+            self._interactions_until_mutation = self.random_buffer.geometric(mutation_rate)
         
         
     def get_population_size(self) -> int:
@@ -67,11 +91,12 @@ class Subpopulation():
         """
         # CONSIDER removing this function if self.outgoing_migrants falls out of use.
         size = self.get_population_size()
-        number_of_migrants = np.random.binomial(size, migration_rate)
+        number_of_migrants = self.random_buffer.binomial(size, migration_rate)
         if number_of_migrants > 0:
-            individuals_to_remove = self.population.sample_and_remove(number_of_migrants)
+            individuals_to_remove = self.population.sample_and_remove(number_of_migrants, self.random_buffer)
             for individual in individuals_to_remove:
-                self.outgoing_migrants.add(individual)   
+                self.outgoing_migrants.add(individual)
+                self._individual_leaves(individual)   
                 
     
     def receive_migrants(self, giving_subpopulation: "Subpopulation", migration_rate: float) -> None:
@@ -85,11 +110,13 @@ class Subpopulation():
             List[Individual]: A list of individuals from the giving subpopulation.
         """
         population_size = giving_subpopulation.get_population_size()
-        number_of_migrants = np.random.binomial(population_size, migration_rate)
+        # emigrants are drawn from the random numbers of the giving subpopulation
+        number_of_migrants = giving_subpopulation.random_buffer.binomial(population_size, migration_rate)
         if number_of_migrants > 0:
-            individuals_to_remove = giving_subpopulation.population.sample_and_remove(number_of_migrants)
+            individuals_to_remove = giving_subpopulation.population.sample_and_remove(number_of_migrants, giving_subpopulation.random_buffer)
             for individual in individuals_to_remove:
                 self.incoming_migrants.add(individual)
+                giving_subpopulation._individual_leaves(individual)
             
                 
     def incorporate_migrants_in_population(self) -> None:
@@ -98,6 +125,7 @@ class Subpopulation():
         """
         for individual in self.incoming_migrants:
             self.population.add(individual)
+            self._individual_arrives(individual)
         
         self.incoming_migrants.empty_set()
         
@@ -110,16 +138,148 @@ class Subpopulation():
             individual (Individual): individual to be added to the subpopulation.
         """
         self.population.add(individual)
+        self._individual_arrives(individual)
+
+
+    def set_network(self, network: SocialNetwork) -> None:
+        """
+        Restrict interactions to a social network: from now on, a focal individual copies from one of its neighbours in
+        the network. The individuals of the subpopulation take the first slots, in order, and migrants take free slots.
+
+        Args:
+            network (SocialNetwork): A network without occupants, with at least as many slots as individuals.
+        """
+        if network.get_number_of_slots() < self.get_population_size():
+            raise ValueError(f"The network has {network.get_number_of_slots()} slots for {self.get_population_size()} individuals!")
+
+        for slot, individual in enumerate(self.population.individuals):
+            network.occupants[slot] = individual
+            individual.network_slot = slot
+        network.free_slots = list(range(self.get_population_size(), network.get_number_of_slots()))
+        self.network = network
+
+
+    def _individual_arrives(self, individual: "Individual") -> None:
+        """
+        Update the trait counters and the network for an individual that joined the population.
+
+        Args:
+            individual (Individual): The new individual.
+        """
+        if self.trait_counts is not None:
+            self._count_traits(individual, 1)
+        if self.network is not None:
+            self.network.place(individual, self.random_buffer.uniform())
+
+
+    def _individual_leaves(self, individual: "Individual") -> None:
+        """
+        Update the trait counters and the network for an individual that left the population.
+
+        Args:
+            individual (Individual): The individual that left.
+        """
+        if self.trait_counts is not None:
+            self._count_traits(individual, -1)
+        if self.network is not None:
+            self.network.remove(individual)
+
+
+    def _count_traits(self, individual: "Individual", change: int) -> None:
+        """
+        Add the traits of an individual to the counters of the subpopulation, or remove them.
+
+        Args:
+            individual (Individual): An individual that arrives in the subpopulation or leaves it.
+            change (int): 1 when the individual arrives, -1 when it leaves.
+        """
+        if not self.trait_counts:
+            self.trait_counts.extend({} for _ in range(individual.number_of_features))
+        for counts, trait in zip(self.trait_counts, individual.features):
+            trait = int(trait)
+            counts[trait] = counts.get(trait, 0) + change
+            if counts[trait] == 0:
+                del counts[trait]
         
 
     def create_interaction(self) -> None:
         """
-        Samples two individuals at random in the subpopulation and makes them interact.
+        Samples two individuals at random in the subpopulation and makes them interact. With a network, the second
+        individual is a random neighbour of the first one, and nothing happens if the neighbouring slot is free. Random
+        numbers and mutations are drawn as for one interaction of `create_interactions()`, so that both use the random
+        numbers in the same way: an interaction with a free slot still takes its six random numbers and its place in the
+        waiting time to the next mutation.
+        """
+        size = self.get_population_size()
+        focus_individual = self.population.individuals[self.random_buffer.integer(size)]
+        if self.network is None:
+            interacting_individual = self.population.individuals[self.random_buffer.integer(size)]
+        else:
+            interacting_individual = self.network.sample_neighbour(focus_individual, self.random_buffer.uniform())
+        random_numbers = self.random_buffer.uniforms(4)
+        mutate = None
+        if self.mutation_rate is not None:
+            # the countdown of `draw_mutations()` for a single interaction
+            self._interactions_until_mutation -= 1
+            mutate = self._interactions_until_mutation == 0
+            if mutate:
+                self._interactions_until_mutation = self.random_buffer.geometric(self.mutation_rate)
+        if interacting_individual is not None:
+            self._interaction_kernel(focus_individual, interacting_individual, random_numbers, mutate)
+
+
+    def create_interactions(self, number_of_interactions: int) -> None:
+        """
+        Make a batch of interactions, one after the other, each between two individuals sampled at random in the subpopulation
+        (or, with a network, a random individual and one of its neighbours). All the random numbers for the batch are taken
+        from the buffer at once, but the kernel is still called once per interaction, in Python: in the Moran process each
+        interaction sees the result of the previous ones, and pairs of the batch share individuals (and, for frequency-
+        dependent models, the counts of the subpopulation), so the interactions cannot be applied together. Models that
+        need whole-array updates run in `WrightFisherMetapopulation`, `DemographicMetapopulation` or `EnsembleMetapopulation`.
+
+        Args:
+            number_of_interactions (int): Number of interactions to make.
+        """
+        size = self.get_population_size()
+        random_numbers = self.random_buffer.uniforms(6*number_of_interactions)
+        mutations = self.draw_mutations(number_of_interactions)
+        individuals = self.population.individuals
+        kernel = self._interaction_kernel
+        network = self.network
+        for start, mutate in zip(range(0, 6*number_of_interactions, 6), mutations):
+            # the first two numbers pick the pair, the last four are used by the interaction
+            focus_individual = individuals[min(int(random_numbers[start]*size), size - 1)]
+            if network is None:
+                interacting_individual = individuals[min(int(random_numbers[start + 1]*size), size - 1)]
+            else:
+                interacting_individual = network.sample_neighbour(focus_individual, random_numbers[start + 1])
+                # a free neighbouring slot: the interaction does not happen, but it has used its mutation, as in `create_interaction()`
+                if interacting_individual is None:
+                    continue
+            kernel(focus_individual, interacting_individual, random_numbers[start + 2:start + 6], mutate)
+
+
+    def draw_mutations(self, number_of_interactions: int) -> List[bool | None]:
+        """
+        Decide which of the next interactions mutate, by skipping from one mutation to the next with geometric waiting times.
+
+        Args:
+            number_of_interactions (int): Number of interactions.
+
+        Returns:
+            List[bool | None]: Whether each interaction mutates, or None for each interaction if individuals draw mutations themselves.
         """
-        index_focus, index_interacting = np.random.choice(range(self.get_population_size()), 2)
-        focus_individual = self.population.individuals[index_focus]
-        interacting_individual = self.population.individuals[index_interacting]
-        focus_individual.interact(interacting_individual, self.type_of_interaction)
+        if self.mutation_rate is None:
+            return [None]*number_of_interactions
+
+        mutations = [False]*number_of_interactions
+        position = self._interactions_until_mutation - 1
+        while position < number_of_interactions:
+            mutations[position] = True
+            position += self.random_buffer.geometric(self.mutation_rate)
+        self._interactions_until_mutation = position - number_of_interactions + 1
+
+        return mutations
     
 
     def get_traits_sets(self) -> np.ndarray:
@@ -173,6 +333,22 @@ class Subpopulation():
             feature_is_found = (trait in traits[:,feature])
 
         return feature_is_found
+
+
+    def count_trait(self, trait: int, feature: int = None) -> int:
+        """
+        Count the individuals that carry a given trait at a given feature.
+
+        Args:
+            trait (int): the int referring to the trait that needs to be counted.
+            feature (Optional, int): the feature that needs to be checked (index from 0 to N_features-1). If None, individuals carrying the trait at any feature are counted. Default is None.
+        Returns:
+            int: the number of individuals carrying the trait.
+        """
+        if feature is None:
+            return sum(1 for individual in self.population if trait in individual.features)
+
+        return sum(1 for individual in self.population if individual.features[feature] == trait)
             
         
     def shannon_diversity(self) -> float:
@@ -337,17 +513,25 @@ class SetOfIndividuals(MutableSet):
         """
         random.shuffle(self.individuals)
         
-    def sample_and_remove(self, number_of_individuals: int) -> List[Individual]:
+    def sample_and_remove(self, number_of_individuals: int, random_buffer: RandomBuffer = None) -> List[Individual]:
         """
         Sample an individual, remove it from the Set and return it in a list.
 
         Args:
             number_of_individuals (int): Number of individuals to sample randomly. 
+            random_buffer (RandomBuffer, optional): Buffer from which the sample is drawn. Defaults to None, in which case the whole set is shuffled with `random.shuffle()`.
 
         Returns:
             List[Individual]: List of all the individuals that have been sampled from the population.
         """
-        self.shuffle()
+        if random_buffer is None:
+            self.shuffle()
+        else:
+            # partial Fisher-Yates shuffle: only the last number_of_individuals positions are drawn
+            size = len(self.individuals)
+            for last in range(size - 1, size - 1 - number_of_individuals, -1):
+                index = random_buffer.integer(last + 1)
+                self.individuals[index], self.individuals[last] = self.individuals[last], self.individuals[index]
         
         list_of_individuals = []
         for i in range(number_of_individuals):
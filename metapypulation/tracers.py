@@ -0,0 +1,175 @@
+"""
+A module containing neutral tracers, labels attached to traits that are inherited when the trait is copied, to follow
+the fate of many new variants in a single run of the neutral model.
+"""
+
+import numpy as np
+from typing import TYPE_CHECKING, List
+
+from .individual import NO_TRACERS
+from .metapopulation import Metapopulation
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+class NeutralTracers():
+    """
+    Tracers of new variants in a metapopulation with "neutral_interaction". A tracer is introduced on one feature of one
+    individual and is carried by every trait that descends from it by copying; it is lost from a trait when the trait is
+    overwritten or mutated. Since neutral copying does not depend on the values of the traits, and tracers do not change
+    the features, each tracer follows the dynamics of a single new mutant, independently of the other tracers: one run
+    with many tracers replaces many runs with one mutant each.
+
+    Carriers are counted when `update()` is called, so the times of loss and fixation are known up to the interval
+    between updates.
+
+    Attributes:
+        metapopulation (Metapopulation): The metapopulation in which tracers are followed.
+        introduction_times (List[int]): Generation at which each tracer was introduced.
+        introduction_demes (List[int]): Subpopulation in which each tracer was introduced.
+        introduction_features (List[int]): Feature on which each tracer was introduced.
+        loss_times (List[float]): Generation at which each tracer was found lost, NaN if it was not.
+        fixation_times (List[float]): Generation at which each tracer was first found in all individuals, NaN if it was not.
+        generations (List[int]): Generation of each update.
+        carrier_counts (List[np.ndarray]): At each update, the number of carriers of each tracer (rows) in each subpopulation (columns).
+    """
+    def __init__(self, metapopulation: Metapopulation):
+        """
+        Start following tracers in a populated metapopulation.
+
+        Args:
+            metapopulation (Metapopulation): A metapopulation with "neutral_interaction".
+        """
+        if metapopulation.type_of_interaction != "neutral_interaction":
+            raise ValueError("Tracers are only neutral with 'neutral_interaction'!")
+
+        self.metapopulation = metapopulation
+        self.introduction_times: List[int] = []
+        self.introduction_demes: List[int] = []
+        self.introduction_features: List[int] = []
+        self.loss_times: List[float] = []
+        self.fixation_times: List[float] = []
+        self.generations: List[int] = []
+        self.carrier_counts: List[np.ndarray] = []
+
+        for subpopulation in metapopulation.subpopulations:
+            for individual in subpopulation.population:
+                if individual.tracers is None:
+                    individual.tracers = [NO_TRACERS]*individual.number_of_features
+
+
+    def get_number_of_tracers(self) -> int:
+        """
+        Returns:
+            int: the number of tracers introduced so far.
+        """
+        return len(self.introduction_times)
+
+
+    def introduce(self, deme: int, generation: int, feature: int = None, individual: int = None) -> int:
+        """
+        Introduce a new tracer on a random individual of a subpopulation, as a new mutant would appear.
+
+        Args:
+            deme (int): Id of the subpopulation.
+            generation (int): Current generation.
+            feature (int, optional): Feature on which the tracer is introduced. Defaults to None, in which case it is random.
+            individual (int, optional): Index of the individual in the subpopulation. Defaults to None, in which case it is random.
+
+        Returns:
+            int: the id of the tracer.
+        """
+        subpopulation = self.metapopulation.subpopulations[deme]
+        if individual is None:
+            individual = np.random.randint(subpopulation.get_population_size())
+        individual = subpopulation.population[individual]
+        if feature is None:
+            feature = np.random.randint(individual.number_of_features)
+
+        tracer = self.get_number_of_tracers()
+        individual.tracers[feature] = individual.tracers[feature] | {tracer}
+        self.introduction_times.append(generation)
+        self.introduction_demes.append(deme)
+        self.introduction_features.append(feature)
+        self.loss_times.append(np.nan)
+        self.fixation_times.append(np.nan)
+
+        return tracer
+
+
+    def count_carriers(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: The number of carriers of each tracer (rows) in each subpopulation (columns).
+        """
+        counts = np.zeros((self.get_number_of_tracers(), self.metapopulation.number_of_subpopulations), dtype=int)
+        for subpopulation in self.metapopulation.subpopulations:
+            for individual in subpopulation.population:
+                for tracers in individual.tracers:
+                    for tracer in tracers:
+                        counts[tracer, subpopulation.id] += 1
+
+        return counts
+
+
+    def update(self, generation: int) -> np.ndarray:
+        """
+        Count the carriers of each tracer and record the tracers that were lost or fixed since the last update.
+
+        Args:
+            generation (int): Current generation.
+
+        Returns:
+            np.ndarray: The number of carriers of each tracer (rows) in each subpopulation (columns).
+        """
+        counts = self.count_carriers()
+        total_counts = counts.sum(axis=1)
+        metapopulation_size = self.metapopulation.get_metapopulation_size()
+        for tracer, total_count in enumerate(total_counts):
+            if total_count == 0 and np.isnan(self.loss_times[tracer]):
+                self.loss_times[tracer] = generation
+            if total_count == metapopulation_size and np.isnan(self.fixation_times[tracer]):
+                self.fixation_times[tracer] = generation
+
+        self.generations.append(generation)
+        self.carrier_counts.append(counts)
+
+        return counts
+
+
+    def summary(self) -> "pd.DataFrame":
+        """
+        Returns:
+            pd.DataFrame: One row per tracer, with the deme, feature and time of introduction, the times of loss and fixation, and the number of carriers and of subpopulations reached at the last update.
+        """
+        import pandas as pd
+
+        summary = pd.DataFrame({"deme": self.introduction_demes, "feature": self.introduction_features,
+                                "introduced": self.introduction_times, "lost": self.loss_times, "fixed": self.fixation_times})
+        if self.carrier_counts:
+            last_counts = np.zeros((self.get_number_of_tracers(), self.metapopulation.number_of_subpopulations), dtype=int)
+            last_counts[:len(self.carrier_counts[-1])] = self.carrier_counts[-1]
+            summary["carriers"] = last_counts.sum(axis=1)
+            summary["demes_reached"] = np.count_nonzero(last_counts, axis=1)
+        summary.index.name = "tracer"
+
+        return summary
+
+
+    def carrier_table(self) -> "pd.DataFrame":
+        """
+        Table of the history of the tracers, in the same format as the per-subpopulation tables of `Simulation`.
+
+        Returns:
+            pd.DataFrame: One row per tracer and update, with one column per subpopulation and the columns "Generation" and "Tracer".
+        """
+        import pandas as pd
+
+        tables = []
+        for generation, counts in zip(self.generations, self.carrier_counts):
+            table = pd.DataFrame(counts)
+            table["Generation"] = generation
+            table["Tracer"] = np.arange(len(counts))
+            tables.append(table)
+
+        return pd.concat(tables, ignore_index=True)
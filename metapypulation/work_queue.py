@@ -0,0 +1,315 @@
+"""
+A module containing a work queue in a shared folder, so that the replicates of experiments can be run by workers on
+several machines without a scheduler. Used from the command line as
+
+    python -m metapypulation --queue QUEUE experiment.toml     # add the replicates of an experiment to the queue
+    python -m metapypulation --work QUEUE                      # run tasks until the queue is empty (on each node)
+    python -m metapypulation --collect QUEUE                   # write the outputs of the finished experiments
+"""
+
+import json
+import numpy as np
+import os
+import pickle
+import socket
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from .cli import replicate_seed, run_replicate, simulation_parameters
+from .instrumentation import SimulationStatistics
+from .recorder import MeasurementRecorder
+from .simulation import Simulation
+
+TASK_STATES = ("pending", "claimed", "done")
+
+class WorkQueue():
+    """
+    A queue of tasks (one replicate of one experiment) in a folder shared by all workers. Each task is a small JSON file
+    that moves between the folders `pending`, `claimed` and `done`. A worker claims a task by renaming it from `pending`
+    to `claimed`, which is atomic on a POSIX file system, so that two workers never run the same task. While it runs
+    the task, the worker touches the claimed file (heartbeat); a claimed task that was not touched for longer than a
+    timeout belongs to a crashed worker and is put back in `pending` by `reclaim()`.
+
+    The result of a task is written to `shards/{task}.pkl` (through a temporary file and a rename, so that a shard is
+    never read half-written), before the task is moved to `done`. Replicates are seeded from the seed of their experiment
+    and their number, so a task run twice (e.g. by a worker that was only slow) writes the same shard.
+
+    Attributes:
+        directory (str): Folder of the queue.
+    """
+    def __init__(self, directory: str):
+        """
+        Open a queue, creating its folders if needed.
+
+        Args:
+            directory (str): Folder of the queue, on a file system shared by all workers.
+        """
+        self.directory = directory
+        for folder in TASK_STATES + ("experiments", "shards"):
+            os.makedirs(os.path.join(directory, folder), exist_ok=True)
+
+
+    def submit(self, config: Dict[str, dict], name: str) -> List[str]:
+        """
+        Add one task per replicate of an experiment.
+
+        Args:
+            config (Dict[str, dict]): The sections of the experiment, see `cli`. The [stop] section is ignored, since tasks are independent.
+            name (str): Name of the experiment, unique in the queue.
+
+        Returns:
+            List[str]: Names of the tasks.
+        """
+        parameters = simulation_parameters(config)
+        if parameters.get("snapshots", False):
+            raise ValueError("Snapshots are written by a single process and cannot be stored through the queue.")
+        experiment_path = self._path("experiments", name)
+        if os.path.exists(experiment_path):
+            raise ValueError(f"An experiment named {name} is already in the queue!")
+
+        config = {section: dict(keys) for section, keys in config.items()}
+        run = config.setdefault("run", {})
+        if run.get("seed") is None:
+            run["seed"] = int(np.random.SeedSequence().generate_state(1)[0])
+        self._write_json(experiment_path, config)
+
+        tasks = []
+        for replicate_id in range(1, parameters["replicates"] + 1):
+            task = f"{name}__{replicate_id:06d}"
+            self._write_json(self._path("pending", task), {"experiment": name, "replicate_id": replicate_id,
+                                                           "seed": replicate_seed(run["seed"], replicate_id)})
+            tasks.append(task)
+
+        return tasks
+
+
+    def claim(self) -> str | None:
+        """
+        Claim a pending task.
+
+        Returns:
+            str | None: Name of the claimed task, None if no task is pending.
+        """
+        for task in self.tasks("pending"):
+            try:
+                # the rename keeps the time of the file, which must be fresh as soon as the task is claimed, or `reclaim()`
+                # could put it back in the queue before the first heartbeat
+                os.utime(self._path("pending", task))
+                os.rename(self._path("pending", task), self._path("claimed", task))
+            except FileNotFoundError:
+                # claimed by another worker in the meantime
+                continue
+            return task
+
+        return None
+
+
+    def heartbeat(self, task: str) -> None:
+        """
+        Mark a claimed task as still running.
+
+        Args:
+            task (str): Name of the task.
+        """
+        try:
+            os.utime(self._path("claimed", task))
+        except FileNotFoundError:
+            # reclaimed after a timeout, the task is run again elsewhere and writes the same shard
+            pass
+
+
+    def reclaim(self, timeout: float) -> List[str]:
+        """
+        Put back in the queue the claimed tasks without heartbeat for longer than `timeout`.
+
+        Args:
+            timeout (float): Time in seconds after which a claimed task is considered abandoned.
+
+        Returns:
+            List[str]: Names of the reclaimed tasks.
+        """
+        reclaimed = []
+        now = time.time()
+        for task in self.tasks("claimed"):
+            try:
+                if now - os.stat(self._path("claimed", task)).st_mtime > timeout:
+                    os.rename(self._path("claimed", task), self._path("pending", task))
+                    reclaimed.append(task)
+            except FileNotFoundError:
+                continue
+
+        return reclaimed
+
+
+    def complete(self, task: str, recorder: MeasurementRecorder, statistics: SimulationStatistics = None) -> None:
+        """
+        Write the result of a task and move it to `done`.
+
+        Args:
+            task (str): Name of the task.
+            recorder (MeasurementRecorder): The measurements of the replicate.
+            statistics (SimulationStatistics, optional): Its statistics, with instrumentation. Defaults to None.
+        """
+        shard_path = os.path.join(self.directory, "shards", f"{task}.pkl")
+        temporary_path = f"{shard_path}.{socket.gethostname()}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            pickle.dump((recorder, statistics), file)
+        os.replace(temporary_path, shard_path)
+        try:
+            os.rename(self._path("claimed", task), self._path("done", task))
+        except FileNotFoundError:
+            # reclaimed in the meantime: the shard is written, so the task is done wherever it is
+            for state in ("pending", "claimed"):
+                try:
+                    os.rename(self._path(state, task), self._path("done", task))
+                except FileNotFoundError:
+                    pass
+
+
+    def run_task(self, task: str, heartbeat_interval: float = 60.0) -> None:
+        """
+        Run a claimed task and write its result, touching the task every `heartbeat_interval` seconds meanwhile.
+
+        Args:
+            task (str): Name of the task.
+            heartbeat_interval (float, optional): Time in seconds between heartbeats. Defaults to 60.
+        """
+        description = self._read_json(self._path("claimed", task))
+        parameters = simulation_parameters(self.experiment(description["experiment"]))
+        finished = threading.Event()
+
+        def beat() -> None:
+            while not finished.wait(heartbeat_interval):
+                self.heartbeat(task)
+
+        heart = threading.Thread(target=beat, daemon=True)
+        heart.start()
+        try:
+            recorder, statistics = run_replicate(parameters, description["replicate_id"], description["seed"])
+        finally:
+            finished.set()
+            heart.join()
+        self.complete(task, recorder, statistics)
+
+
+    def experiment(self, name: str) -> Dict[str, dict]:
+        """
+        Args:
+            name (str): Name of an experiment of the queue.
+
+        Returns:
+            Dict[str, dict]: The sections of the experiment, with its seed.
+        """
+        return self._read_json(self._path("experiments", name))
+
+
+    def tasks(self, state: str) -> List[str]:
+        """
+        Args:
+            state (str): "pending", "claimed" or "done".
+
+        Returns:
+            List[str]: Names of the tasks in this state.
+        """
+        if state not in TASK_STATES:
+            raise ValueError(f"Unknown state {state}, choose between {', '.join(TASK_STATES)}.")
+        return sorted(file_name.removesuffix(".json") for file_name in os.listdir(os.path.join(self.directory, state))
+                      if file_name.endswith(".json"))
+
+
+    def status(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: Number of tasks in each state.
+        """
+        return {state: len(self.tasks(state)) for state in TASK_STATES}
+
+
+    def collect(self, name: str, allow_partial: bool = False) -> Simulation:
+        """
+        Merge the shards of an experiment into the outputs of `Simulation`, saved at the output path of the experiment.
+
+        Args:
+            name (str): Name of the experiment.
+            allow_partial (bool, optional): Whether to save the outputs when some replicates are not done yet. Defaults to False.
+
+        Returns:
+            Simulation: The simulation holding the output tables.
+        """
+        parameters = simulation_parameters(self.experiment(name))
+        shards: List[Tuple[int, str]] = []
+        for replicate_id in range(1, parameters["replicates"] + 1):
+            shard_path = os.path.join(self.directory, "shards", f"{name}__{replicate_id:06d}.pkl")
+            if os.path.exists(shard_path):
+                shards.append((replicate_id, shard_path))
+        if not shards or (len(shards) < parameters["replicates"] and not allow_partial):
+            raise ValueError(f"Only {len(shards)} of the {parameters['replicates']} replicates of {name} are done.")
+
+        output_directory = os.path.dirname(parameters["output_path"])
+        if output_directory:
+            os.makedirs(output_directory, exist_ok=True)
+        simulation = Simulation(**parameters)
+        for replicate_id, shard_path in shards:
+            with open(shard_path, "rb") as file:
+                recorder, statistics = pickle.load(file)
+            simulation.store_replicate(recorder, replicate_id)
+            if statistics is not None:
+                simulation.statistics[replicate_id] = statistics
+        simulation.save_output()
+
+        return simulation
+
+
+    def _path(self, folder: str, name: str) -> str:
+        return os.path.join(self.directory, folder, f"{name}.json")
+
+
+    def _write_json(self, path: str, content: dict) -> None:
+        """
+        Write a JSON file through a temporary file, so that other workers never read it half-written.
+        """
+        temporary_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(content, file)
+        os.replace(temporary_path, path)
+
+
+    def _read_json(self, path: str) -> dict:
+        with open(path) as file:
+            return json.load(file)
+
+
+def run_worker(directory: str, timeout: float = 3600.0, poll_interval: float = 10.0, max_tasks: int = None, verbose: bool = True) -> int:
+    """
+    Run tasks of a queue until none is pending or claimed. While other workers still run tasks, the worker waits for
+    them, since their tasks are reclaimed if they crash.
+
+    Args:
+        directory (str): Folder of the queue.
+        timeout (float, optional): Time in seconds without heartbeat after which a claimed task is reclaimed. Defaults to 3600.
+        poll_interval (float, optional): Time in seconds between checks of the queue while waiting. Defaults to 10.
+        max_tasks (int, optional): Number of tasks after which the worker stops. Defaults to None, for no limit.
+        verbose (bool, optional): Whether to print each task. Defaults to True.
+
+    Returns:
+        int: Number of tasks run by this worker.
+    """
+    queue = WorkQueue(directory)
+    tasks_run = 0
+    while max_tasks is None or tasks_run < max_tasks:
+        queue.reclaim(timeout)
+        task = queue.claim()
+        if task is None:
+            if not queue.tasks("claimed"):
+                break
+            time.sleep(poll_interval)
+            continue
+
+        start_time = time.perf_counter()
+        queue.run_task(task, heartbeat_interval = timeout/4)
+        tasks_run += 1
+        if verbose:
+            print(f"Task {task} done in {time.perf_counter() - start_time:.1f} s.")
+
+    return tasks_run
@@ -0,0 +1,293 @@
+"""
+A module containing the class WrightFisherMetapopulation, an array-based metapopulation in which all individuals
+update their features at once at each generation (synchronous, Wright-Fisher-like generations).
+"""
+
+import numpy as np
+from typing import List, Tuple
+
+from .interactions import InteractionModel, get_interaction
+from .metapopulation import Metapopulation
+
+class WrightFisherMetapopulation():
+    """
+    A metapopulation where, at each generation, every individual of every subpopulation interacts at the same time with a
+    random individual of its subpopulation, taken from a snapshot of the previous generation. The state is kept in arrays
+    (individuals sorted by subpopulation) so that interactions and migration are whole-array operations.
+
+    Attributes:
+        number_of_subpopulations (int): how many subpopulations compose the metapopulation.
+        type_of_interaction (str): The type of interaction to implement between individuals. Accepts "axelrod_interaction", "neutral_interaction" and registered models with a batch kernel.
+        interaction (InteractionModel): The registered model of `type_of_interaction`.
+        migration_matrix (np.ndarray): A matrix determining migration rates between subpopulations.
+        carrying_capacities (List[int] | int): A list of carrying capacities (one for each subpopulation) or an integer (same carrying capacity for each subpopulation).
+        number_of_features (int): Total number of cultural features per individual.
+        number_of_traits (int): Number of different possible traits for each cultural feature.
+        mutation_rate (float): Probability of a mutation to occur.
+        min_trait (int): Minimum value for a trait in each feature.
+        max_trait (int): Maximum value for a trait in each feature.
+        features (np.ndarray): Matrix of shape (number of individuals, number of features) with the features of all individuals.
+        deme_ids (np.ndarray): Subpopulation of each individual (sorted).
+        origin_ids (np.ndarray): Subpopulation where each individual originated.
+        subpopulation_sizes (np.ndarray): Current size of each subpopulation.
+        subpopulation_offsets (np.ndarray): Index of the first individual of each subpopulation in the arrays.
+        number_of_changes (int): Number of times individuals changed their features following an interaction.
+    """
+    def __init__(self, number_of_subpopulations: int,
+                 type_of_interaction: str,
+                 migration_matrix: np.ndarray = None,
+                 carrying_capacities: List[int] | int = 100,
+                 number_of_features: int = 5,
+                 number_of_traits: int = 10,
+                 mutation_rate: float = 0.0,
+                 min_trait: int = 1,
+                 max_trait: int = 10
+                 ):
+        """Creates an empty metapopulation. Arguments are the same as for `Metapopulation`.
+
+        Args:
+            number_of_subpopulations (int): The total number of subpopulations to create.
+            type_of_interaction (str): "axelrod_interaction", "neutral_interaction" or a registered model with a batch kernel.
+            migration_matrix (np.ndarray, optional): A matrix determining migration rates between subpopulations. Defaults to None.
+            carrying_capacities (List[int] | int, optional): Either a list of carrying capacities or single integer determining the same carrying capacity for all subpopulations. Defaults to 100.
+            number_of_features (int, optional): Total number of cultural features per individual. Defaults to 5.
+            number_of_traits (int, optional): Number of different possible traits for each cultural feature. Defaults to 10.
+            mutation_rate (float, optional): Probability of a mutation to occur. Defaults to 0.0.
+            min_trait (int, optional): Minimum value for a trait in each feature. Defaults to 1.
+            max_trait (int, optional): Maximum value for a trait in each feature. Deafults to 10.
+        """
+        self.interaction: InteractionModel = get_interaction(type_of_interaction)
+        if self.interaction.batch_kernel is None:
+            raise ValueError(f"The interaction model {type_of_interaction} has no batch kernel!")
+
+        self.number_of_subpopulations = number_of_subpopulations
+        self.type_of_interaction = type_of_interaction
+        self.migration_matrix = migration_matrix
+        self.carrying_capacities = carrying_capacities
+        self.number_of_features = number_of_features
+        self.number_of_traits = number_of_traits
+        self.mutation_rate = mutation_rate
+        self.min_trait = min_trait
+        self.max_trait = max_trait
+
+        self.features = np.zeros((0, number_of_features), dtype=int)
+        self.deme_ids = np.zeros(0, dtype=int)
+        self.origin_ids = np.zeros(0, dtype=int)
+        self._update_offsets()
+        self.number_of_changes = 0
+
+
+    def populate(self) -> None:
+        """Populate all subpopulations with individuals with random sets of features, up to the carrying capacities.
+        """
+        match self.carrying_capacities:
+            case list():
+                assert self.number_of_subpopulations == len(self.carrying_capacities)
+                sizes = np.array(self.carrying_capacities, dtype=int)
+            case int():
+                sizes = np.full(self.number_of_subpopulations, self.carrying_capacities, dtype=int)
+
+        self.deme_ids = np.repeat(np.arange(self.number_of_subpopulations), sizes)
+        self.origin_ids = self.deme_ids.copy()
+        self.features = np.random.randint(low = self.min_trait, high = self.max_trait + 1, size = (len(self.deme_ids), self.number_of_features))
+        self._update_offsets()
+
+
+    def _update_offsets(self, subpopulation_sizes: np.ndarray = None) -> None:
+        """
+        Recalculate the size of each subpopulation and where each subpopulation starts in the (sorted) arrays.
+
+        Args:
+            subpopulation_sizes (np.ndarray, optional): The sizes, when they are already known. Defaults to None, in which case they are counted.
+        """
+        if subpopulation_sizes is None:
+            subpopulation_sizes = np.bincount(self.deme_ids, minlength=self.number_of_subpopulations)
+        self.subpopulation_sizes = subpopulation_sizes
+        self.subpopulation_offsets = np.concatenate(([0], np.cumsum(self.subpopulation_sizes)[:-1]))
+        # per-individual copies, so that sampling partners does not need to look them up at every generation
+        self._individual_offsets = np.repeat(self.subpopulation_offsets, self.subpopulation_sizes)
+        self._individual_subpopulation_sizes = np.repeat(self.subpopulation_sizes, self.subpopulation_sizes)
+
+
+    def get_metapopulation_size(self) -> int:
+        """
+        Calculates the full size of the metapopulation.
+
+        Returns:
+            int: the number of individuals in the whole metapopulation.
+        """
+        return len(self.deme_ids)
+
+
+    def make_interact(self) -> int:
+        """
+        Make every individual interact once with a random individual (possibly itself) of its own subpopulation. All
+        individuals copy from the state of the previous generation.
+
+        Returns:
+            int: the number of interactions made.
+        """
+        population_size = self.get_metapopulation_size()
+        if population_size == 0:
+            return 0
+
+        # all the new traits are read from the current state before any of them is written, so that every individual
+        # copies from the previous generation
+        snapshot = self.features
+        sources = self._individual_offsets + (np.random.rand(population_size)*self._individual_subpopulation_sizes).astype(int)
+        derived_number_of_traits = self.max_trait - self.min_trait + 1
+
+        match self.type_of_interaction:
+            case "neutral_interaction":
+                changing = np.arange(population_size)
+                indexes_to_copy = np.random.randint(0, self.number_of_features, size = population_size)
+            case "axelrod_interaction":
+                differences = snapshot != snapshot[sources]
+                probability_of_interaction = 1 - np.count_nonzero(differences, axis=1)/self.number_of_features
+                interacting = (np.random.rand(population_size) <= probability_of_interaction) & (probability_of_interaction < 1.0)
+                changing = np.nonzero(interacting)[0]
+                # a random feature among the ones that differ is the one with the largest random key
+                indexes_to_copy = np.argmax(np.random.rand(len(changing), self.number_of_features)*differences[changing], axis=1)
+            case _:
+                # other models go through their batch kernel, all individuals at once
+                random_numbers = np.random.rand(population_size, 4)
+                # the counts of the previous generation are the ones all individuals see
+                counts = {"trait_counts": self.count_traits(), "demes": self.deme_ids} if self.interaction.uses_trait_counts else {}
+                interacting, indexes_to_copy, new_traits = self.interaction.batch_kernel(snapshot, snapshot[sources], random_numbers,
+                                                                                         random_numbers[:, 1] <= self.mutation_rate,
+                                                                                         self.min_trait, derived_number_of_traits, **counts)
+                changing = np.nonzero(interacting)[0]
+                flat_features = self.features.reshape(-1)
+                flat_features[changing*self.number_of_features + indexes_to_copy[changing]] = new_traits[changing]
+                self.number_of_changes += len(changing)
+                return population_size
+
+        # flat indexes into the features matrix are faster than pairs of (row, column) indexes
+        flat_features = self.features.reshape(-1)
+        new_traits = flat_features[sources[changing]*self.number_of_features + indexes_to_copy]
+
+        # mutations occur independently with probability mutation_rate in each changing individual: draw how many, then which
+        number_of_mutations = np.random.binomial(len(changing), self.mutation_rate)
+        mutations = _sample_without_replacement(len(changing), number_of_mutations)
+        new_traits[mutations] = np.random.randint(low = self.min_trait, high = self.max_trait + 1, size = number_of_mutations)
+
+        targets = changing*self.number_of_features + indexes_to_copy
+        # copying or mutating to the trait an individual already has is not a change
+        self.number_of_changes += int(np.count_nonzero(flat_features[targets] != new_traits))
+        flat_features[targets] = new_traits
+
+        return population_size
+
+
+    def count_traits(self) -> np.ndarray:
+        """
+        Counts the individuals with each trait at each feature, in each subpopulation.
+
+        Returns:
+            np.ndarray: Array of shape (subpopulations, features, traits), where traits are counted from `min_trait`.
+        """
+        number_of_traits = self.max_trait - self.min_trait + 1
+        flat_indexes = (self.deme_ids[:, np.newaxis]*self.number_of_features + np.arange(self.number_of_features))*number_of_traits + self.features - self.min_trait
+
+        return np.bincount(flat_indexes.reshape(-1), minlength = self.number_of_subpopulations*self.number_of_features*number_of_traits).reshape(
+            self.number_of_subpopulations, self.number_of_features, number_of_traits)
+
+
+    def count_changes(self) -> int:
+        """
+        Counts how many times individuals changed their features following an interaction.
+
+        Returns:
+            int: total number of changes.
+        """
+        return self.number_of_changes
+
+
+    def migrate(self) -> int:
+        """
+        Migration step. Each individual in subpopulation i moves to subpopulation j with probability given by the migration
+        matrix (entry i, j), and stays with the remaining probability.
+
+        Returns:
+            int: the number of individuals that migrated.
+        """
+        population_size = self.get_metapopulation_size()
+        if population_size == 0:
+            return 0
+
+        # the number of emigrants of each subpopulation is binomial, and only those individuals are drawn
+        emigration_rates = self.migration_matrix.sum(axis=1)
+        number_of_movers = np.random.binomial(self.subpopulation_sizes, emigration_rates)
+        if not number_of_movers.any():
+            return 0
+
+        old_sizes = self.subpopulation_sizes
+        old_offsets = self.subpopulation_offsets
+        movers = []
+        for deme in np.nonzero(number_of_movers)[0]:
+            deme_movers = old_offsets[deme] + _sample_without_replacement(old_sizes[deme], number_of_movers[deme])
+            self.deme_ids[deme_movers] = np.random.choice(self.number_of_subpopulations, size = number_of_movers[deme],
+                                                          p = self.migration_matrix[deme]/emigration_rates[deme])
+            movers.append(deme_movers)
+        movers = np.concatenate(movers)
+        new_sizes = old_sizes - number_of_movers + np.bincount(self.deme_ids[movers], minlength = self.number_of_subpopulations)
+        new_ends = np.cumsum(new_sizes)
+
+        # individuals stay sorted by subpopulation, in any order within it: only the movers and the individuals that the
+        # new boundaries between subpopulations leave outside of their block are out of place. Each block has as many
+        # out-of-place positions as out-of-place individuals of its subpopulation, which are put there.
+        candidates = [movers]
+        for old_start, old_end, new_start, new_end in zip(old_offsets, old_offsets + old_sizes, new_ends - new_sizes, new_ends):
+            candidates.append(np.arange(old_start, min(old_end, new_start)))
+            candidates.append(np.arange(max(old_start, new_end), old_end))
+        candidates = np.unique(np.concatenate(candidates))
+        out_of_place = candidates[self.deme_ids[candidates] != np.searchsorted(new_ends, candidates, side='right')]
+        order = out_of_place[np.argsort(self.deme_ids[out_of_place], kind='stable')]
+        self.deme_ids[out_of_place] = self.deme_ids[order]
+        self.origin_ids[out_of_place] = self.origin_ids[order]
+        self.features[out_of_place] = self.features[order]
+        self._update_offsets(new_sizes)
+
+        return int(number_of_movers.sum())
+
+
+    def get_state(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: the features (individuals x features), the id of the subpopulation and the id of the deme of origin of each individual, as in `Metapopulation.get_state()`.
+        """
+        return self.features, self.deme_ids, self.origin_ids
+
+
+    def to_metapopulation(self) -> Metapopulation:
+        """
+        Create a `Metapopulation` with the current state, for example to measure its diversity.
+
+        Returns:
+            Metapopulation: a metapopulation with the same individuals.
+        """
+        metapopulation = Metapopulation(self.number_of_subpopulations, self.type_of_interaction, self.migration_matrix,
+                                        self.carrying_capacities, self.number_of_features, self.number_of_traits,
+                                        self.mutation_rate, self.min_trait, self.max_trait)
+        metapopulation.populate_from_arrays(self.features, self.deme_ids, self.origin_ids)
+
+        return metapopulation
+
+
+def _sample_without_replacement(population_size: int, number_of_samples: int) -> np.ndarray:
+    """
+    Sample distinct indexes between 0 and population_size - 1. Unlike `np.random.choice(..., replace=False)`, the cost
+    does not depend on the population size, which matters when only a few out of many individuals are drawn.
+
+    Args:
+        population_size (int): Number of indexes to sample from.
+        number_of_samples (int): Number of distinct indexes to sample.
+
+    Returns:
+        np.ndarray: Sorted array of distinct indexes.
+    """
+    samples = np.unique(np.random.randint(0, population_size, size = number_of_samples))
+    while len(samples) < number_of_samples:
+        samples = np.unique(np.concatenate((samples, np.random.randint(0, population_size, size = number_of_samples - len(samples)))))
+
+    return samples
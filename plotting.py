@@ -1,21 +1,26 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 
-def plot_comparison_set_counts(dataset_1, dataset_2, title, legend_1, legend_2, output_file):
-    dataset_1_local = pd.read_csv(f"{dataset_1}_subpop_set_counts.csv", index_col=0)
-    dataset_2_local = pd.read_csv(f"{dataset_2}_subpop_set_counts.csv", index_col=0)
-    dataset_1_global = pd.read_csv(f"{dataset_1}_metapop_set_counts.csv", index_col=0)
-    dataset_2_global = pd.read_csv(f"{dataset_2}_metapop_set_counts.csv", index_col=0)
+from metapypulation.aggregation import load_summary
+
+# Output table of each measure, in the files of a dataset.
+METAPOPULATION_TABLES = {'set_counts': 'metapop_set_counts', 'shannon': 'metapop_shannon', 'simpson': 'metapop_simpson', 'gini': 'metapop_gini',
+                         'beta': 'beta_diversity', 'bray-curtis-0-4': 'bray-curtis_0-4'}
+SUBPOPULATION_TABLES = {'set_counts': 'subpop_set_counts', 'shannon': 'subpop_shannon', 'simpson': 'subpop_simpson', 'gini': 'subpop_gini'}
+
+
+def plot_mean_and_std(summary, color, alpha, label=None):
+    """Plot the mean of a summary (see `metapypulation.aggregation.load_summary`) with a band of one standard deviation."""
+    line, = plt.plot(summary["mean"], color = color, label=label)
+    plt.fill_between(summary.index, summary["mean"] - summary["std"], summary["mean"] + summary["std"], color=color, alpha=alpha)
 
-    plt.plot(dataset_1_local.mean(axis=1), color = 'xkcd:sky blue')
-    plt.plot(dataset_1_global.mean(axis=1), color = 'xkcd:blue')
-    plt.plot(dataset_2_local.mean(axis=1), color = 'tan')
-    plt.plot(dataset_2_global.mean(axis=1), color = 'xkcd:puce')
+    return line
 
-    plt.fill_between(dataset_1_local.index, dataset_1_local.mean(axis=1) - dataset_1_local.std(axis=1), dataset_1_local.mean(axis=1) + dataset_1_local.std(axis=1), color='xkcd:sky blue', alpha=0.3)
-    plt.fill_between(dataset_2_local.index, dataset_2_local.mean(axis=1) - dataset_2_local.std(axis=1), dataset_2_local.mean(axis=1) + dataset_2_local.std(axis=1), color='tan', alpha=0.3)
-    plt.fill_between(dataset_1_global.index, dataset_1_global.mean(axis=1) - dataset_1_global.std(axis=1), dataset_1_global.mean(axis=1) + dataset_1_global.std(axis=1), color='xkcd:blue', alpha=0.3)
-    plt.fill_between(dataset_2_global.index, dataset_2_global.mean(axis=1) - dataset_2_global.std(axis=1), dataset_2_global.mean(axis=1) + dataset_2_global.std(axis=1), color='xkcd:puce', alpha=0.3)
+
+def plot_comparison_set_counts(dataset_1, dataset_2, title, legend_1, legend_2, output_file):
+    for dataset, table, color in ((dataset_1, "subpop_set_counts", 'xkcd:sky blue'), (dataset_1, "metapop_set_counts", 'xkcd:blue'),
+                                  (dataset_2, "subpop_set_counts", 'tan'), (dataset_2, "metapop_set_counts", 'xkcd:puce')):
+        plot_mean_and_std(load_summary(dataset, table), color, 0.3)
 
     plt.axvline(500, color="black", linestyle='--', ymax=1)
 
@@ -29,20 +34,9 @@ def plot_comparison_set_counts(dataset_1, dataset_2, title, legend_1, legend_2,
 
 
 def plot_comparison_gini(dataset_1, dataset_2, title, legend_1, legend_2, output_file):
-    dataset_1_local = pd.read_csv(f"{dataset_1}_subpop_gini.csv", index_col=0)
-    dataset_2_local = pd.read_csv(f"{dataset_2}_subpop_gini.csv", index_col=0)
-    dataset_1_global = pd.read_csv(f"{dataset_1}_metapop_gini.csv", index_col=0)
-    dataset_2_global = pd.read_csv(f"{dataset_2}_metapop_gini.csv", index_col=0)
-
-    plt.plot(dataset_1_local.mean(axis=1), color = 'xkcd:sky blue')
-    plt.plot(dataset_1_global.mean(axis=1), color = 'xkcd:blue')
-    plt.plot(dataset_2_local.mean(axis=1), color = 'tan')
-    plt.plot(dataset_2_global.mean(axis=1), color = 'xkcd:puce')
-
-    plt.fill_between(dataset_1_local.index, dataset_1_local.mean(axis=1) - dataset_1_local.std(axis=1), dataset_1_local.mean(axis=1) + dataset_1_local.std(axis=1), color='xkcd:sky blue', alpha=0.3)
-    plt.fill_between(dataset_2_local.index, dataset_2_local.mean(axis=1) - dataset_2_local.std(axis=1), dataset_2_local.mean(axis=1) + dataset_2_local.std(axis=1), color='tan', alpha=0.3)
-    plt.fill_between(dataset_1_global.index, dataset_1_global.mean(axis=1) - dataset_1_global.std(axis=1), dataset_1_global.mean(axis=1) + dataset_1_global.std(axis=1), color='xkcd:blue', alpha=0.3)
-    plt.fill_between(dataset_2_global.index, dataset_2_global.mean(axis=1) - dataset_2_global.std(axis=1), dataset_2_global.mean(axis=1) + dataset_2_global.std(axis=1), color='xkcd:puce', alpha=0.3)
+    for dataset, table, color in ((dataset_1, "subpop_gini", 'xkcd:sky blue'), (dataset_1, "metapop_gini", 'xkcd:blue'),
+                                  (dataset_2, "subpop_gini", 'tan'), (dataset_2, "metapop_gini", 'xkcd:puce')):
+        plot_mean_and_std(load_summary(dataset, table), color, 0.3)
 
     plt.axvline(500, color="black", linestyle='--', ymax=1)
 
@@ -56,55 +50,20 @@ def plot_comparison_gini(dataset_1, dataset_2, title, legend_1, legend_2, output
 
 
 def metapopulation_plot_comparison(dataset_1, dataset_2, title, legend_1, legend_2, output_file, what_measure, number_of_pulses = 5, length_of_pulses = 1, settling_period = 99,  dataset_3 = None, legend_3 = None):
-    if what_measure == 'set_counts':
-        dataset_1_global = pd.read_csv(f"{dataset_1}_metapop_set_counts.csv", index_col=0)
-        dataset_2_global = pd.read_csv(f"{dataset_2}_metapop_set_counts.csv", index_col=0)
-    elif what_measure == 'shannon':
-        dataset_1_global == pd.read_csv(f"{dataset_1}_metapop_shannon.csv", index_col=0)
-        dataset_2_global = pd.read_csv(f"{dataset_2}_metapop_shannon.csv", index_col=0)
-    elif what_measure == 'simpson':
-        dataset_1_global = pd.read_csv(f"{dataset_1}_metapop_simpson.csv", index_col=0)
-        dataset_2_global = pd.read_csv(f"{dataset_2}_metapop_simpson.csv", index_col=0)
-    elif what_measure == 'gini':
-        dataset_1_global = pd.read_csv(f"{dataset_1}_metapop_gini.csv", index_col=0)
-        dataset_2_global = pd.read_csv(f"{dataset_2}_metapop_gini.csv", index_col=0)
-    elif what_measure == 'beta':
-        dataset_1_global = pd.read_csv(f"{dataset_1}_beta_diversity.csv", index_col=0)
-        dataset_2_global = pd.read_csv(f"{dataset_2}_beta_diversity.csv", index_col=0)
-    elif what_measure == 'bray-curtis-0-4':
-        dataset_1_global = pd.read_csv(f"{dataset_1}_bray-curtis_0-4.csv", index_col=0)
-        dataset_2_global = pd.read_csv(f"{dataset_2}_bray-curtis_0-4.csv", index_col=0)
-    else:
-        raise ValueError("You need to decide what measure you will plot: 'set_counts', 'shannon', 'simpson' or 'gini'?")
+    if what_measure not in METAPOPULATION_TABLES:
+        raise ValueError(f"You need to decide what measure you will plot: {', '.join(METAPOPULATION_TABLES)}?")
     
     color1 = "xkcd:medium blue"
     color2 = "xkcd:violet"
     color3 = "xkcd:dark orange"
 
-    line1, = plt.plot(dataset_1_global.mean(axis=1), color = color1, label=f"{legend_1}")
-    line2, = plt.plot(dataset_2_global.mean(axis=1), color = color2, label=f"{legend_2}")
-    
-    plt.fill_between(dataset_1_global.index, dataset_1_global.mean(axis=1) - dataset_1_global.std(axis=1), dataset_1_global.mean(axis=1) + dataset_1_global.std(axis=1), color=color1, alpha=0.2)
-    plt.fill_between(dataset_2_global.index, dataset_2_global.mean(axis=1) - dataset_2_global.std(axis=1), dataset_2_global.mean(axis=1) + dataset_2_global.std(axis=1), color=color2, alpha=0.2)
+    line1 = plot_mean_and_std(load_summary(dataset_1, METAPOPULATION_TABLES[what_measure]), color1, 0.2, label=f"{legend_1}")
+    line2 = plot_mean_and_std(load_summary(dataset_2, METAPOPULATION_TABLES[what_measure]), color2, 0.2, label=f"{legend_2}")
     
     plt.axvline(500, color="black", linestyle='--', ymax=1)
 
     if dataset_3 is not None:
-        if what_measure == 'set_counts':
-            dataset_3_global = pd.read_csv(f"{dataset_3}_metapop_set_counts.csv", index_col=0)
-        elif what_measure == 'shannon':
-            dataset_3_global == pd.read_csv(f"{dataset_3}_metapop_shannon.csv", index_col=0)
-        elif what_measure == 'simpson':
-            dataset_3_global = pd.read_csv(f"{dataset_3}_metapop_simpson.csv", index_col=0)
-        elif what_measure == 'gini':
-            dataset_3_global = pd.read_csv(f"{dataset_3}_metapop_gini.csv", index_col=0)
-        elif what_measure == 'beta':
-            dataset_3_global = pd.read_csv(f"{dataset_3}_beta_diversity.csv", index_col=0)
-        else:
-            print("You need to decide what measure you will plot: 'set_counts', 'shannon', 'simpson' or 'gini'?")
-
-        line3, = plt.plot(dataset_3_global.mean(axis=1), color = color3, label=f"{legend_3}")
-        plt.fill_between(dataset_3_global.index, dataset_3_global.mean(axis=1) - dataset_3_global.std(axis=1), dataset_3_global.mean(axis=1) + dataset_3_global.std(axis=1), color=color3, alpha=0.2)
+        line3 = plot_mean_and_std(load_summary(dataset_3, METAPOPULATION_TABLES[what_measure]), color3, 0.2, label=f"{legend_3}")
 
     if dataset_3 is not None:
         plt.legend(loc=3, handles=[line1, line2, line3])
@@ -134,47 +93,20 @@ def metapopulation_plot_comparison(dataset_1, dataset_2, title, legend_1, legend
 
 
 def subpopulation_plot_comparison(dataset_1, dataset_2, title, legend_1, legend_2, output_file, what_measure, number_of_pulses = 5, length_of_pulses = 1, settling_period = 99,  dataset_3 = None, legend_3 = None):
-    if what_measure == 'set_counts':
-        dataset_1_global = pd.read_csv(f"{dataset_1}_subpop_set_counts.csv", index_col=0)
-        dataset_2_global = pd.read_csv(f"{dataset_2}_subpop_set_counts.csv", index_col=0)
-    elif what_measure == 'shannon':
-        dataset_1_global == pd.read_csv(f"{dataset_1}_subpop_shannon.csv", index_col=0)
-        dataset_2_global = pd.read_csv(f"{dataset_2}_subpop_shannon.csv", index_col=0)
-    elif what_measure == 'simpson':
-        dataset_1_global = pd.read_csv(f"{dataset_1}_subpop_simpson.csv", index_col=0)
-        dataset_2_global = pd.read_csv(f"{dataset_2}_subpop_simpson.csv", index_col=0)
-    elif what_measure == 'gini':
-        dataset_1_global = pd.read_csv(f"{dataset_1}_subpop_gini.csv", index_col=0)
-        dataset_2_global = pd.read_csv(f"{dataset_2}_subpop_gini.csv", index_col=0)
-    else:
-        raise ValueError("You need to decide what measure you will plot: 'set_counts', 'shannon', 'simpson' or 'gini'?")
+    if what_measure not in SUBPOPULATION_TABLES:
+        raise ValueError(f"You need to decide what measure you will plot: {', '.join(SUBPOPULATION_TABLES)}?")
     
     color1 = "xkcd:medium blue"
     color2 = "xkcd:violet"
     color3 = "xkcd:dark orange"
 
-    line1, = plt.plot(dataset_1_global.mean(axis=1), color = color1, label=f"{legend_1}")
-    line2, = plt.plot(dataset_2_global.mean(axis=1), color = color2, label=f"{legend_2}")
-    
-    plt.fill_between(dataset_1_global.index, dataset_1_global.mean(axis=1) - dataset_1_global.std(axis=1), dataset_1_global.mean(axis=1) + dataset_1_global.std(axis=1), color=color1, alpha=0.2)
-    plt.fill_between(dataset_2_global.index, dataset_2_global.mean(axis=1) - dataset_2_global.std(axis=1), dataset_2_global.mean(axis=1) + dataset_2_global.std(axis=1), color=color2, alpha=0.2)
+    line1 = plot_mean_and_std(load_summary(dataset_1, SUBPOPULATION_TABLES[what_measure]), color1, 0.2, label=f"{legend_1}")
+    line2 = plot_mean_and_std(load_summary(dataset_2, SUBPOPULATION_TABLES[what_measure]), color2, 0.2, label=f"{legend_2}")
     
     plt.axvline(500, color="black", linestyle='--', ymax=1)
 
     if dataset_3 is not None:
-        if what_measure == 'set_counts':
-            dataset_3_global = pd.read_csv(f"{dataset_3}_subpop_set_counts.csv", index_col=0)
-        elif what_measure == 'shannon':
-            dataset_3_global == pd.read_csv(f"{dataset_3}_subpop_shannon.csv", index_col=0)
-        elif what_measure == 'simpson':
-            dataset_3_global = pd.read_csv(f"{dataset_3}_subpop_simpson.csv", index_col=0)
-        elif what_measure == 'gini':
-            dataset_3_global = pd.read_csv(f"{dataset_3}_subpop_gini.csv", index_col=0)
-        else:
-            print("You need to decide what measure you will plot: 'set_counts', 'shannon', 'simpson' or 'gini'?")
-
-        line3, = plt.plot(dataset_3_global.mean(axis=1), color = color3, label=f"{legend_3}")
-        plt.fill_between(dataset_3_global.index, dataset_3_global.mean(axis=1) - dataset_3_global.std(axis=1), dataset_3_global.mean(axis=1) + dataset_3_global.std(axis=1), color=color3, alpha=0.2)
+        line3 = plot_mean_and_std(load_summary(dataset_3, SUBPOPULATION_TABLES[what_measure]), color3, 0.2, label=f"{legend_3}")
 
     if dataset_3 is not None:
         plt.legend(loc=3, handles=[line1, line2, line3])
@@ -203,18 +135,11 @@ def subpopulation_plot_comparison(dataset_1, dataset_2, title, legend_1, legend_
 
 
 def plot_comparison_gini_pulses(dataset_1, dataset_2, title, legend_1, legend_2, number_of_pulses, length_of_pulses, settling_period, output_file, dataset_3=None, legend_3=None):
-    dataset_1_local = pd.read_csv(f"{dataset_1}_subpop_gini.csv", index_col=0)
-    dataset_2_local = pd.read_csv(f"{dataset_2}_subpop_gini.csv", index_col=0)
-
-    line1, = plt.plot(dataset_1_local.mean(axis=1), color = 'xkcd:sky blue', label=f"{legend_1} subpop avg")
-    line2, = plt.plot(dataset_2_local.mean(axis=1), color = 'tan', label=f"{legend_2} subpop avg")
-    plt.fill_between(dataset_1_local.index, dataset_1_local.mean(axis=1) - dataset_1_local.std(axis=1), dataset_1_local.mean(axis=1) + dataset_1_local.std(axis=1), color='xkcd:sky blue', alpha=0.3)
-    plt.fill_between(dataset_2_local.index, dataset_2_local.mean(axis=1) - dataset_2_local.std(axis=1), dataset_2_local.mean(axis=1) + dataset_2_local.std(axis=1), color='tan', alpha=0.3)
+    line1 = plot_mean_and_std(load_summary(dataset_1, "subpop_gini"), 'xkcd:sky blue', 0.3, label=f"{legend_1} subpop avg")
+    line2 = plot_mean_and_std(load_summary(dataset_2, "subpop_gini"), 'tan', 0.3, label=f"{legend_2} subpop avg")
     
     if dataset_3 is not None:
-        dataset_3_local = pd.read_csv(f"{dataset_3}_subpop_gini.csv", index_col=0)
-        line3, = plt.plot(dataset_3_local.mean(axis=1), color = 'mediumpurple', label=f"{legend_3} subpop avg")
-        plt.fill_between(dataset_3_local.index, dataset_3_local.mean(axis=1) - dataset_3_local.std(axis=1), dataset_3_local.mean(axis=1) + dataset_3_local.std(axis=1), color='mediumpurple', alpha=0.3)
+        line3 = plot_mean_and_std(load_summary(dataset_3, "subpop_gini"), 'mediumpurple', 0.3, label=f"{legend_3} subpop avg")
         #plt.legend([f"{legend_1} subpop avg", f"{legend_2} subpop avg", f"{legend_3} subpop avg"])
         plt.legend(loc=3, handles=[line1, line2, line3])
     
@@ -0,0 +1,15 @@
+import pytest
+
+@pytest.fixture
+def small_experiment():
+    """
+    Sections of a small experiment (3 replicates of 40 generations), with its outputs at a given path.
+    """
+    def make_experiment(path: str) -> dict:
+        return {"topology": {"number_of_subpopulations": 3, "migration_matrix": "island", "migration_rate": 0.01, "carrying_capacities": 20},
+                "interaction": {"type": "neutral_interaction", "mutation_rate": 0.001},
+                "schedule": {"generations": 40, "measure_timing": 10},
+                "run": {"replicates": 3, "seed": 5},
+                "output": {"path": path}}
+
+    return make_experiment
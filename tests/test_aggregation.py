@@ -0,0 +1,105 @@
+import numpy as np
+import os
+import pandas as pd
+import pytest
+
+from metapypulation.aggregation import ReplicateAggregator, cached_summary, compare_tables, load_summary, summarize_csv, summarize_table, window_means
+
+def test_add():
+    replicates = np.random.rand(20, 5)
+    aggregator = ReplicateAggregator(5, ["gini"], quantiles = [0.5], reservoir_size = 50)
+    for replicate in replicates:
+        aggregator.add({"gini": replicate})
+    
+    assert aggregator.number_of_replicates == 20
+    assert np.allclose(aggregator.mean("gini"), replicates.mean(axis=0))
+    assert np.allclose(aggregator.std("gini"), replicates.std(axis=0, ddof=1))
+    assert np.allclose(aggregator.minima["gini"], replicates.min(axis=0))
+    assert np.allclose(aggregator.maxima["gini"], replicates.max(axis=0))
+    # all replicates fit in the reservoir, so the quantiles are exact
+    assert np.allclose(aggregator.quantile("gini", 0.5), np.median(replicates, axis=0))
+    
+    summary = aggregator.summary("gini")
+    assert list(summary.columns) == ["mean", "std", "min", "max", "q0.5"]
+    assert summary.shape == (5, 5)
+
+
+def test_reservoir():
+    aggregator = ReplicateAggregator(3, ["gini", "shannon"], quantiles = [0.1, 0.9], reservoir_size = 10)
+    for value in range(100):
+        aggregator.add({"gini": np.full(3, value), "shannon": np.full(3, -value)})
+    
+    # the same replicates are kept for all measurements
+    assert np.allclose(aggregator.reservoirs["gini"], -aggregator.reservoirs["shannon"])
+    assert np.all(aggregator.quantile("gini", 0.1) <= aggregator.quantile("gini", 0.9))
+    
+    with pytest.raises(ValueError):
+        ReplicateAggregator(3, ["gini"]).quantile("gini", 0.5)
+    assert np.all(np.isnan(ReplicateAggregator(3, ["gini"]).std("gini")))
+
+
+def test_summarize_table():
+    table = pd.DataFrame(np.random.rand(5, 20))
+    summary = summarize_table(table, quantiles = [0.5])
+    assert list(summary.columns) == ["mean", "std", "min", "max", "q0.5"]
+    assert np.allclose(summary["mean"], table.values.mean(axis=1))
+    assert np.allclose(summary["std"], table.values.std(axis=1, ddof=1))
+    assert np.allclose(summary["q0.5"], np.median(table.values, axis=1))
+
+
+def test_cached_summary(tmp_path):
+    source_path = tmp_path / "run_subpop_gini.csv"
+    source = pd.DataFrame(np.random.rand(5, 3))
+    source.to_csv(source_path)
+    summary = cached_summary(str(source_path))
+    cache_path = tmp_path / ".summaries" / "run_subpop_gini.csv"
+    assert cache_path.exists()
+    assert np.allclose(summary.values, summarize_table(source).values)
+
+    # an unchanged source is read from the cache
+    pd.DataFrame({"mean": [1.0]}).to_csv(cache_path)
+    assert list(cached_summary(str(source_path))["mean"]) == [1.0]
+    # other quantiles or a changed source rebuild the summary
+    assert cached_summary(str(source_path), quantiles = [0.5]).shape == (5, 5)
+    pd.DataFrame(np.ones((4, 3))).to_csv(source_path)
+    assert np.allclose(cached_summary(str(source_path))["mean"], 1.0)
+    assert np.allclose(load_summary(str(tmp_path / "run"), "subpop_gini")["mean"], 1.0)
+    with pytest.raises(FileNotFoundError):
+        load_summary(str(tmp_path / "run"), "metapop_gini")
+
+
+def test_cached_summary_hash(tmp_path):
+    source_path = tmp_path / "run_subpop_gini.csv"
+    pd.DataFrame(np.random.rand(5, 3)).to_csv(source_path)
+    cached_summary(str(source_path), validation = "hash")
+    cache_path = tmp_path / ".summaries" / "run_subpop_gini.csv"
+    pd.DataFrame({"mean": [1.0]}).to_csv(cache_path)
+
+    # touching the source changes its modification time but not its content
+    os.utime(source_path, ns = (0, 0))
+    assert list(cached_summary(str(source_path), validation = "hash")["mean"]) == [1.0]
+    # without hashing, a new modification time rebuilds the summary
+    os.utime(source_path, ns = (1, 1))
+    assert cached_summary(str(source_path))["mean"].size == 5
+
+
+def test_chunked_aggregation(tmp_path):
+    table_1, table_2 = pd.DataFrame(np.random.rand(25, 6)), pd.DataFrame(np.random.rand(25, 4) + 1)
+    table_1.to_csv(tmp_path / "run_1.csv")
+    table_2.to_csv(tmp_path / "run_2.csv")
+
+    summary = summarize_csv(str(tmp_path / "run_1.csv"), quantiles = [0.1], chunk_rows = 7)
+    assert np.allclose(summary.values, summarize_table(table_1, quantiles = [0.1]).values)
+
+    means = window_means(str(tmp_path / "run_1.csv"), [(0, 10), (5, 25)], chunk_rows = 4)
+    assert list(means.columns) == ["0-10", "5-25"]
+    assert np.allclose(means["0-10"], table_1.values[:10].mean(axis=0))
+    assert np.allclose(means["5-25"], table_1.values[5:].mean(axis=0))
+
+    comparison = compare_tables(str(tmp_path / "run_1.csv"), str(tmp_path / "run_2.csv"), chunk_rows = 10)
+    assert comparison.shape == (25, 5)
+    assert np.allclose(comparison["difference"], table_1.mean(axis=1) - table_2.mean(axis=1))
+    assert np.all(comparison["t"] < 0)
+    table_2.iloc[:20].to_csv(tmp_path / "run_3.csv")
+    with pytest.raises(ValueError):
+        compare_tables(str(tmp_path / "run_1.csv"), str(tmp_path / "run_3.csv"), chunk_rows = 10)
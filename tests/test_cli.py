@@ -0,0 +1,63 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from metapypulation.cli import load_config, main, run_experiment, simulation_parameters
+
+def test_load_config(tmp_path):
+    (tmp_path / "experiment.toml").write_text('[topology]\nnumber_of_subpopulations = 3\nmigration_matrix = [[0, 0.1], [0.1, 0]]\n')
+    (tmp_path / "experiment.json").write_text(json.dumps({"topology": {"number_of_subpopulations": 3}}))
+    assert load_config(str(tmp_path / "experiment.toml"))["topology"]["migration_matrix"] == [[0, 0.1], [0.1, 0]]
+    assert load_config(str(tmp_path / "experiment.json")) == {"topology": {"number_of_subpopulations": 3}}
+    with pytest.raises(ValueError):
+        load_config(str(tmp_path / "experiment.txt"))
+
+
+def test_simulation_parameters(small_experiment):
+    config = small_experiment("results/test")
+    config["topology"]["migration_matrix"] = [[0, 0.1], [0.1, 0]]
+    parameters = simulation_parameters(config)
+    assert parameters["interaction"] == "neutral_interaction"
+    assert parameters["output_path"] == "results/test"
+    assert parameters["migration_matrix"].shape == (2, 2)
+    assert not parameters["verbose"]
+
+    config["interaction"]["update_mode"] = "demographic"
+    config["demography"] = {"regulation": "fixed", "birth_rate": 0.2}
+    parameters = simulation_parameters(config)
+    assert parameters["regulation"] == "fixed" and parameters["birth_rate"] == 0.2
+
+    config["output"]["unknown"] = 1
+    with pytest.raises(ValueError):
+        simulation_parameters(config)
+    del config["output"]
+    with pytest.raises(ValueError):
+        simulation_parameters(config)
+
+
+def test_workers_give_the_same_outputs(tmp_path, small_experiment):
+    run_experiment(small_experiment(str(tmp_path / "serial" / "run")), workers = 1, verbose = False)
+    throughput = run_experiment(small_experiment(str(tmp_path / "parallel" / "run")), workers = 2, verbose = False)
+    assert throughput["replicates"] == 3
+    assert throughput["generations"] == 3*41
+
+    serial = pd.read_csv(tmp_path / "serial" / "run_metapop_gini.csv")
+    parallel = pd.read_csv(tmp_path / "parallel" / "run_metapop_gini.csv")
+    assert serial.shape[1] >= 3
+    assert np.allclose(serial.values, parallel.values)
+
+
+def test_stop_conditions(tmp_path, small_experiment):
+    config = small_experiment(str(tmp_path / "run"))
+    config["stop"] = {"max_wall_time": 0}
+    assert run_experiment(config, workers = 1, verbose = False)["replicates"] == 1
+
+    config["stop"] = {"target_table": "unknown"}
+    with pytest.raises(ValueError):
+        run_experiment(config, verbose = False)
+
+
+def test_main(tmp_path, small_experiment):
+    (tmp_path / "experiment.json").write_text(json.dumps(small_experiment(str(tmp_path / "run"))))
+    assert main([str(tmp_path / "experiment.json"), "--workers", "1", "--quiet"]) == 0
+    assert (tmp_path / "run_metapop_gini.csv").exists()
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from metapypulation.coalescent import CoalescentSimulation
+
+def test_sample_stationary_features():
+    coalescent = CoalescentSimulation(3, 'island', [10, 20, 30], 1, 'something.csv', mutation_rate = 0.01,
+                                      number_of_features = 4, number_of_traits = 6, verbose = False)
+    features = coalescent.sample_stationary_features()
+    
+    assert features.shape == (60, 4)
+    assert features.min() >= 1
+    assert features.max() <= 6
+    
+    coalescent = CoalescentSimulation(3, 'island', 30, 1, 'something.csv', mutation_rate = 0.01, sample_sizes = 5, verbose = False)
+    assert coalescent.sample_stationary_features().shape == (15, 5)
+
+
+def test_run_single_replicate():
+    coalescent = CoalescentSimulation(2, 'island', 20, 3, 'something.csv', mutation_rate = 0.05, verbose = False)
+    for replicate in range(1, 4):
+        coalescent.run_single_replicate(replicate)
+
+    assert coalescent.subpop_gini.shape == (1, 3)
+    assert coalescent.metapop_set_counts.shape == (1, 3)
+    # the metapopulation cannot have fewer sets than its subpopulations
+    assert np.all(coalescent.metapop_set_counts.values >= coalescent.subpop_set_counts.values)
+    
+    with pytest.raises(ValueError):
+        CoalescentSimulation(2, 'island', 20, 3, 'something.csv', mutation_rate = 0.0)
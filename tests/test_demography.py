@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from metapypulation.demography import DemographicMetapopulation
+
+def check_slots(metapop):
+    for subpopulation in range(metapop.number_of_subpopulations):
+        assert sorted(metapop.members[subpopulation]) == list(range(metapop.slots_per_subpopulation))
+        
+        
+def test_logistic_growth():
+    np.random.seed(1)
+    metapop = DemographicMetapopulation(3, "neutral_interaction", carrying_capacities=[50, 100, 200], birth_rate=0.2)
+    metapop.populate()
+    metapop.sizes[:] = 5
+    for _ in range(300):
+        metapop.make_interact()
+        metapop.regulate()
+        
+    assert np.all(np.abs(metapop.sizes - np.array([50, 100, 200])) < np.array([25, 35, 50]))
+    assert metapop.number_of_births > 0 and metapop.number_of_deaths > 0
+    check_slots(metapop)
+    
+    
+def test_fixed_size_extinction_and_recolonisation():
+    np.random.seed(2)
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = DemographicMetapopulation(4, "axelrod_interaction", migrations, carrying_capacities=20, regulation="fixed",
+                                        extinction_rate=0.05, mutation_rate=0.01)
+    metapop.populate()
+    recolonised = False
+    for _ in range(200):
+        extinct = metapop.sizes == 0
+        metapop.migrate()
+        metapop.make_interact()
+        metapop.regulate()
+        recolonised |= np.any(extinct & (metapop.sizes == 20))
+        assert np.all((metapop.sizes == 0) | (metapop.sizes == 20))
+        
+    assert metapop.number_of_extinctions > 0
+    assert recolonised
+    check_slots(metapop)
+    
+    features, deme_ids, origin_ids = metapop.get_state()
+    assert len(features) == metapop.get_metapopulation_size()
+    assert np.array_equal(np.bincount(deme_ids, minlength=4), metapop.sizes)
+    assert metapop.to_metapopulation().get_metapopulation_size() == metapop.get_metapopulation_size()
+    
+    
+def test_full_subpopulations_lose_migrants():
+    np.random.seed(3)
+    metapop = DemographicMetapopulation(2, "neutral_interaction", np.array([[0, 1.0], [0, 0]]), carrying_capacities=10,
+                                        slots_per_subpopulation=10)
+    metapop.populate()
+    
+    assert metapop.migrate() == 0
+    assert list(metapop.sizes) == [0, 10]
+    
+    with pytest.raises(ValueError):
+        DemographicMetapopulation(2, "neutral_interaction", regulation="constant")
+    
+    
+def test_trait_counts_are_kept_up_to_date():
+    np.random.seed(4)
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = DemographicMetapopulation(4, "conformist_interaction", migrations, carrying_capacities=20, mutation_rate=0.05,
+                                        interactions_per_generation=3, birth_rate=0.3, extinction_rate=0.05)
+    metapop.populate()
+    assert np.array_equal(metapop.trait_counts, metapop.count_traits())
+    for _ in range(100):
+        metapop.migrate()
+        metapop.make_interact()
+        metapop.regulate()
+        assert np.array_equal(metapop.trait_counts, metapop.count_traits())
+        
+    assert metapop.number_of_extinctions > 0
+    assert metapop.count_changes() == metapop.number_of_changes > 0
+    assert DemographicMetapopulation(2, "neutral_interaction").trait_counts is None
@@ -0,0 +1,76 @@
+import numpy as np
+
+from metapypulation.ensemble import EnsembleMetapopulation, EnsembleSimulation
+
+def test_populate():
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    ensemble = EnsembleMetapopulation(3, 4, "axelrod_interaction", migrations, carrying_capacities=[10, 20, 30, 40], seed=1)
+    ensemble.populate()
+    
+    assert ensemble.features.shape == (3, 100, 5)
+    assert np.allclose(ensemble.subpopulation_sizes, [[10, 20, 30, 40]]*3)
+    assert np.allclose(ensemble.subpopulation_offsets, [[0, 10, 30, 60]]*3)
+    # each replicate has its own random numbers
+    assert not np.array_equal(ensemble.features[0], ensemble.features[1])
+
+
+def test_make_interact():
+    ensemble = EnsembleMetapopulation(2, 2, "neutral_interaction", np.zeros((2, 2)), carrying_capacities=20, seed=1)
+    ensemble.populate()
+    ensemble.features[:, :20] = 1
+    ensemble.features[:, 20:] = 2
+    # without mutation and migration, individuals can only copy traits found in their own subpopulation
+    assert ensemble.make_interact() == 4
+    for i in range(100):
+        ensemble.make_interact()
+    assert np.all(ensemble.features[:, :20] == 1)
+    assert np.all(ensemble.features[:, 20:] == 2)
+    
+    ensemble = EnsembleMetapopulation(2, 1, "axelrod_interaction", np.zeros((1, 1)), carrying_capacities=20, seed=1)
+    ensemble.populate()
+    ensemble.features[:, :10] = 1
+    ensemble.features[:, 10:] = 2
+    # with nothing in common, Axelrod individuals never interact
+    for i in range(100):
+        ensemble.make_interact()
+    assert ensemble.number_of_changes == 0
+
+
+def test_migrate():
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    ensemble = EnsembleMetapopulation(3, 4, "axelrod_interaction", migrations*100, carrying_capacities=50, seed=1)
+    ensemble.populate()
+    features = ensemble.features.copy()
+    
+    assert ensemble.migrate() > 0
+    assert np.all(np.diff(ensemble.deme_ids, axis=1) >= 0)
+    assert np.all(ensemble.subpopulation_sizes.sum(axis=1) == 200)
+    assert np.all(ensemble.subpopulation_offsets[:, 1:] == np.cumsum(ensemble.subpopulation_sizes, axis=1)[:, :-1])
+    # individuals move with their features
+    assert sorted(map(tuple, features[1])) == sorted(map(tuple, ensemble.features[1]))
+    assert np.any(ensemble.deme_ids != ensemble.origin_ids)
+
+
+def test_seed():
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    small = EnsembleMetapopulation(2, 4, "axelrod_interaction", migrations, carrying_capacities=20, seed=5)
+    large = EnsembleMetapopulation(3, 4, "axelrod_interaction", migrations, carrying_capacities=20, seed=5)
+    for ensemble in (small, large):
+        ensemble.populate()
+        for i in range(200):
+            ensemble.migrate()
+            ensemble.make_interact()
+    
+    # a replicate does not depend on the other replicates simulated with it
+    assert np.array_equal(small.features[1], large.features[1])
+
+
+def test_ensemble_simulation(tmp_path):
+    simulation = EnsembleSimulation(50, 3, 'island', 'axelrod_interaction', 20, 4, str(tmp_path / 'output'),
+                                    measure_timing = 10, verbose = False, seed = 1)
+    simulation.run_simulation()
+    
+    assert simulation.subpop_gini.shape == (6, 4)
+    assert list(simulation.metapop_set_counts.columns) == [1, 2, 3, 4]
+    assert np.all(simulation.metapop_set_counts.values <= 60)
+    assert (tmp_path / 'output_metapop_gini.csv').exists()
@@ -0,0 +1,52 @@
+import numpy as np
+import os
+import pytest
+
+from metapypulation.evaluation import MetricCache, evaluate_snapshots, metric_name
+from metapypulation.simulation import Simulation
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    simulation = Simulation(20, 3, 'island', 'axelrod_interaction', 20, 2, str(tmp_path / 'output'),
+                            measure_timing = 10, verbose = False, snapshots = True, migration_rate = 0.1)
+    simulation.run_simulation()
+    
+    return str(tmp_path / 'output_snapshots'), simulation
+
+
+def test_metric_name():
+    assert metric_name("whittaker_beta_diversity") == "whittaker_beta_diversity"
+    assert metric_name(("fixation_index", 0, 1)) == "fixation_index(0, 1)"
+
+
+def test_evaluate_snapshots(snapshot_path):
+    path, simulation = snapshot_path
+    results = evaluate_snapshots(path, ["metapopulation_gini_diversity", "gini_diversity_per_subpopulation", ("fixation_index", 0, 1)])
+    
+    assert results.shape == (6, 5)
+    assert list(results["Generation"]) == [0, 10, 20]*2
+    assert np.allclose(results["metapopulation_gini_diversity"].values[3:], simulation.metapop_gini[2].values)
+    assert len(results["gini_diversity_per_subpopulation"][0]) == 3
+    assert os.path.exists(f"{path}_metrics.json")
+    
+    # cached values are not computed again
+    cache = MetricCache(path)
+    cache.values[MetricCache.key(0, 0, "metapopulation_gini_diversity")] = -1.0
+    cache.save()
+    results = evaluate_snapshots(path, ["metapopulation_gini_diversity", "whittaker_beta_diversity"], replicates = [0], number_of_processes = 2, chunk_size = 1)
+    assert results["metapopulation_gini_diversity"][0] == -1.0
+    assert results.shape == (3, 4)
+    
+    assert evaluate_snapshots(path, ["metapopulation_gini_diversity"], use_cache = False)["metapopulation_gini_diversity"][0] >= 0.0
+
+
+def test_deferred_measurements(tmp_path):
+    simulation = Simulation(20, 3, 'island', 'axelrod_interaction', 20, 1, str(tmp_path / 'output'),
+                            measure_timing = 10, verbose = False, snapshots = True, deferred_measurements = True)
+    simulation.run_simulation()
+    assert simulation.metapop_gini.empty
+    assert not (tmp_path / 'output_metapop_gini.csv').exists()
+    assert evaluate_snapshots(str(tmp_path / 'output_snapshots'), ["metapopulation_count_sets"]).shape == (3, 3)
+    
+    with pytest.raises(ValueError):
+        Simulation(20, 3, 'island', 'axelrod_interaction', 20, 1, 'something.csv', deferred_measurements = True)
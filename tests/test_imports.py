@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "distancia", "matplotlib", "scipy", "cv2"]
+PACKAGE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def modules_loaded_by(code: str) -> set:
+    """Run code in a fresh interpreter and return the heavy modules it imported."""
+    check = f"{code}\nimport sys\nprint(' '.join(module for module in {HEAVY_MODULES!r} if module in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", check], cwd=PACKAGE_DIRECTORY, capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+def test_import_is_lightweight():
+    modules = ["cli", "simulation", "metapopulation", "ensemble", "wright_fisher", "demography", "recorder",
+               "aggregation", "evaluation", "tracers", "splitting", "snapshots"]
+    assert modules_loaded_by("\n".join(f"import metapypulation.{module}" for module in modules)) == set()
+
+
+def test_plain_simulation_is_lightweight():
+    code = ("from metapypulation.simulation import Simulation\n"
+            "simulation = Simulation(20, 3, 'island', 'axelrod_interaction', 20, 1, 'unused', measure_timing = 10, verbose = False)\n"
+            "simulation.run_single_replicate(1)")
+    assert modules_loaded_by(code) == set()
+
+
+def test_bray_curtis_still_works():
+    code = ("from metapypulation.metapopulation import Metapopulation\n"
+            "metapopulation = Metapopulation(2, 'axelrod_interaction', carrying_capacities = [10, 10])\n"
+            "metapopulation.populate()\n"
+            "assert 0 <= metapopulation.bray_curtis_by_subpopulation_pair(0, 1) <= 1")
+    assert "distancia" in modules_loaded_by(code)
@@ -25,4 +25,22 @@ def test_init():
     individual_2 = Individual(1, 1, 5, 10, features=[1, 5, 3, 0, 9])
 
     assert len(individual_1.features) == individual_1.number_of_features
-    assert individual_2.features == [1, 5, 3, 0, 9]
\ No newline at end of file
+    assert individual_2.features == [1, 5, 3, 0, 9]
+
+def test_interaction_with_random_numbers():
+    individual_1 = Individual(1, 1, 5, 10, features=np.array([0, 0, 0, 0, 1]))
+    individual_2 = Individual(2, 1, 5, 10, features=np.array([0, 0, 0, 0, 0]))
+    
+    # the interaction random number is above the similarity (0.8), nothing changes
+    individual_1.axelrod_interaction(individual_2, [0.9, 0.5, 0.5, 0.5])
+    assert individual_1.number_of_changes == 0
+    
+    individual_1.axelrod_interaction(individual_2, [0.1, 0.5, 0.5, 0.5])
+    assert np.allclose(individual_1.features, individual_2.features)
+    assert individual_1.number_of_changes == 1
+    
+    # with a mutation, the new trait comes from the last random number
+    individual_1.mutation_rate = 1.0
+    individual_1.neutral_interaction(individual_2, [0.0, 0.0, 0.5, 0.25])
+    assert np.allclose(individual_1.features, [0, 0, 3, 0, 0])
+    assert individual_1.number_of_mutations == 1
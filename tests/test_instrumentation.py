@@ -0,0 +1,25 @@
+import json
+
+from metapypulation.instrumentation import SimulationStatistics, save_statistics
+
+def test_simulation_statistics(tmp_path):
+    statistics = SimulationStatistics()
+    assert statistics.interactions_per_second() == 0.0
+    assert statistics.no_op_ratio() == 0.0
+    
+    statistics.number_of_interactions = 100
+    statistics.number_of_changes = 25
+    statistics.interaction_time = 0.5
+    statistics.add_measurement_time("subpop_gini", 0.25)
+    statistics.add_measurement_time("subpop_gini", 0.25)
+    statistics.add_measurement_time("metapop_gini", 1.0)
+    
+    assert statistics.interactions_per_second() == 200
+    assert statistics.no_op_ratio() == 0.75
+    assert statistics.measurement_times["subpop_gini"] == 0.5
+    assert statistics.measurement_time == 1.5
+    
+    save_statistics({1: statistics}, tmp_path / "statistics.json")
+    with open(tmp_path / "statistics.json") as file:
+        saved = json.load(file)
+    assert saved["1"]["no_op_ratio"] == 0.75
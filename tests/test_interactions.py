@@ -0,0 +1,169 @@
+import numpy as np
+import pytest
+
+from metapypulation.ensemble import EnsembleMetapopulation
+
+from metapypulation.individual import Individual
+from metapypulation.interactions import INTERACTION_MODELS, get_interaction, register_interaction
+from metapypulation.metapopulation import Metapopulation
+from metapypulation.subpopulation import Subpopulation
+from metapypulation.wright_fisher import WrightFisherMetapopulation
+
+def copy_first_feature(focal_individual, source_individual, random_numbers, mutate):
+    focal_individual.features[0] = source_individual.features[0]
+    focal_individual.number_of_changes += 1
+
+
+def copy_first_feature_batch(focal_features, source_features, random_numbers, mutate, min_trait, number_of_traits):
+    return np.ones(focal_features.shape[:-1], dtype=bool), np.zeros(focal_features.shape[:-1], dtype=int), source_features[..., 0]
+
+
+def test_registry():
+    assert get_interaction("axelrod_interaction").batch_kernel is not None
+    with pytest.raises(ValueError):
+        get_interaction("unknown_interaction")
+    with pytest.raises(ValueError):
+        register_interaction("axelrod_interaction", copy_first_feature)
+    with pytest.raises(ValueError):
+        Subpopulation(0, "unknown_interaction")
+        
+        
+def test_batch_kernels_match_scalar_kernels():
+    np.random.seed(1)
+    for name in ("axelrod_interaction", "neutral_interaction"):
+        model = get_interaction(name)
+        for _ in range(200):
+            focal = Individual(0, 0, 5, 3)
+            source = Individual(1, 0, 5, 3)
+            random_numbers = np.random.rand(4)
+            mutate = bool(random_numbers[1] <= 0.3)
+            changing, index, new_trait = model.batch_kernel(focal.features[np.newaxis], source.features[np.newaxis],
+                                                            random_numbers[np.newaxis], np.array([mutate]), 1, 3)
+            expected = focal.features.copy()
+            if changing[0]:
+                expected[index[0]] = new_trait[0]
+            model.scalar_kernel(focal, source, random_numbers.tolist(), mutate)
+            assert np.array_equal(focal.features, expected)
+            assert focal.number_of_changes == int(changing[0])
+            
+            
+def test_custom_interaction():
+    register_interaction("copy_first_feature", copy_first_feature, copy_first_feature_batch)
+    try:
+        metapop = Metapopulation(2, "copy_first_feature", np.zeros((2, 2)), carrying_capacities=10, interactions_per_generation=50)
+        metapop.populate()
+        for _ in range(20):
+            metapop.make_interact()
+        for subpopulation in metapop.subpopulations:
+            assert len(set(individual.features[0] for individual in subpopulation.population)) == 1
+            
+        metapop = WrightFisherMetapopulation(2, "copy_first_feature", np.zeros((2, 2)), carrying_capacities=10)
+        metapop.populate()
+        for _ in range(100):
+            metapop.make_interact()
+        for subpopulation in range(2):
+            assert len(np.unique(metapop.features[metapop.deme_ids == subpopulation, 0])) == 1
+        assert metapop.number_of_changes == 2000
+    finally:
+        del INTERACTION_MODELS["copy_first_feature"]
+
+
+def test_individual_interact_through_registry():
+    np.random.seed(3)
+    focal = Individual(1, 1, 5, 10, 0.0, np.array([1, 1, 1, 1, 1]))
+    source = Individual(2, 1, 5, 10, 0.0, np.array([2, 2, 2, 2, 2]))
+    focal.interact(source, "neutral_interaction")
+    assert focal.number_of_changes == 1 and np.count_nonzero(focal.features == 2) == 1
+    
+    register_interaction("copy_first_feature", copy_first_feature)
+    try:
+        focal.interact(source, "copy_first_feature")
+        assert focal.features[0] == 2
+    finally:
+        del INTERACTION_MODELS["copy_first_feature"]
+    # frequency-dependent models need the counts of a subpopulation
+    for name in ("conformist_interaction", "anticonformist_interaction"):
+        with pytest.raises(ValueError):
+            focal.interact(source, name)
+
+
+def recount_traits(subpopulation):
+    counts = [{} for _ in range(subpopulation.population.individuals[0].number_of_features)]
+    for individual in subpopulation.population:
+        for feature_counts, trait in zip(counts, individual.features):
+            feature_counts[int(trait)] = feature_counts.get(int(trait), 0) + 1
+    return counts
+
+
+def test_conformist_counters():
+    np.random.seed(4)
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = Metapopulation(4, "conformist_interaction", migrations, carrying_capacities=20, mutation_rate=0.05, interactions_per_generation=5)
+    metapop.populate()
+    for _ in range(100):
+        metapop.migrate()
+        metapop.make_interact()
+    for subpopulation in metapop.subpopulations:
+        assert subpopulation.trait_counts == recount_traits(subpopulation)
+        
+    assert Subpopulation(0, "axelrod_interaction").trait_counts is None
+    
+    
+def test_conformist_batch_kernel_matches_scalar_kernel():
+    np.random.seed(5)
+    for name in ("conformist_interaction", "anticonformist_interaction"):
+        model = get_interaction(name)
+        subpopulation = Subpopulation(0, name)
+        for i in range(10):
+            subpopulation.add_individual(Individual(i, 0, 3, 4))
+        for _ in range(200):
+            focal, source = subpopulation.population.individuals[:2]
+            random_numbers = np.random.rand(4)
+            mutate = bool(random_numbers[1] <= 0.1)
+            trait_counts = np.zeros((1, 3, 4), dtype=int)
+            for feature, counts in enumerate(subpopulation.trait_counts):
+                for trait, count in counts.items():
+                    trait_counts[0, feature, trait - 1] = count
+            _, index, new_trait = model.batch_kernel(focal.features[np.newaxis], source.features[np.newaxis], random_numbers[np.newaxis],
+                                                     np.array([mutate]), 1, 4, trait_counts = trait_counts, demes = np.zeros(1, dtype=int))
+            expected = focal.features.copy()
+            expected[index[0]] = new_trait[0]
+            model.scalar_kernel(focal, source, random_numbers.tolist(), mutate, trait_counts = subpopulation.trait_counts)
+            assert np.array_equal(focal.features, expected)
+            # the focal individual changes place so that all individuals take part
+            subpopulation.population.individuals.append(subpopulation.population.individuals.pop(0))
+    
+    
+def test_conformity_reduces_diversity():
+    diversities = {}
+    for name in ("anticonformist_interaction", "neutral_interaction", "conformist_interaction"):
+        np.random.seed(6)
+        metapop = Metapopulation(1, name, np.zeros((1, 1)), carrying_capacities=50, mutation_rate=0.02, interactions_per_generation=50)
+        metapop.populate()
+        for _ in range(200):
+            metapop.make_interact()
+        subpopulation = metapop.subpopulations[0]
+        diversities[name] = np.mean([len(np.unique(subpopulation.get_traits_sets()[:, feature])) for feature in range(5)])
+    
+    assert diversities["conformist_interaction"] < diversities["neutral_interaction"] < diversities["anticonformist_interaction"]
+    
+    
+def test_conformist_array_engines():
+    np.random.seed(7)
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = WrightFisherMetapopulation(4, "conformist_interaction", migrations, carrying_capacities=20)
+    metapop.populate()
+    for _ in range(20):
+        metapop.migrate()
+        metapop.make_interact()
+    assert metapop.count_traits().sum() == 4*20*5
+    
+    ensemble = EnsembleMetapopulation(3, 4, "anticonformist_interaction", migrations, carrying_capacities=20, mutation_rate=0.01,
+                                      interactions_per_generation=10, seed=8)
+    ensemble.populate()
+    for _ in range(50):
+        ensemble.migrate()
+        ensemble.make_interact()
+    counts = ensemble.trait_counts.copy()
+    ensemble._update_offsets()
+    assert np.array_equal(counts, ensemble.trait_counts)
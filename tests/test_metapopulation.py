@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 
 from metapypulation.metapopulation import Metapopulation
 
@@ -45,3 +46,38 @@ def test_migrate():
         total_size += subpopulation.get_population_size()
         
     assert total_size == 100*4
+
+
+def test_populate_from_arrays():
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = Metapopulation(4, "axelrod_interaction", migrations)
+    features = np.arange(1, 41).reshape(8, 5)
+    
+    metapop.populate_from_arrays(features, np.array([0, 0, 1, 1, 2, 2, 3, 3]), np.array([0, 1, 1, 1, 2, 2, 3, 0]))
+    
+    assert metapop.get_metapopulation_size() == 8
+    assert metapop.metapopulation_count_sets() == 8
+    assert np.allclose(metapop.subpopulations[1].population[1].features, [16, 17, 18, 19, 20])
+    assert metapop.subpopulations[3].population[1].original_deme_id == 0
+
+
+def count_kernel_calls(subpopulation):
+    kernel = subpopulation._interaction_kernel
+    calls = []
+    subpopulation._interaction_kernel = lambda *arguments: calls.append(kernel(*arguments))
+    return calls
+
+
+def test_interactions_per_generation():
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = Metapopulation(4, "neutral_interaction", migrations, carrying_capacities=[10, 20, 30, 40], 
+                             interactions_per_generation="subpopulation_size")
+    metapop.populate()
+    calls = [count_kernel_calls(subpopulation) for subpopulation in metapop.subpopulations]
+    assert metapop.make_interact() == 100
+    
+    for subpopulation, subpopulation_calls in zip(metapop.subpopulations, calls):
+        assert len(subpopulation_calls) == subpopulation.get_population_size()
+    
+    with pytest.raises(ValueError):
+        Metapopulation(4, "neutral_interaction", migrations, interactions_per_generation="something")
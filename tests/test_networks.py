@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from metapypulation.individual import Individual
+from metapypulation.metapopulation import Metapopulation
+from metapypulation.networks import SocialNetwork, grid_network, ring_network, scale_free_network, small_world_network
+from metapypulation.subpopulation import Subpopulation
+
+def test_from_edges():
+    network = SocialNetwork.from_edges(4, np.array([[0, 1], [1, 2], [2, 0]]))
+    
+    assert network.get_number_of_slots() == 4
+    assert [network.get_degree(slot) for slot in range(4)] == [2, 2, 2, 0]
+    assert sorted(network.neighbours[network.offsets[1]:network.offsets[2]]) == [0, 2]
+    
+    
+def test_generators():
+    np.random.seed(1)
+    grid = grid_network(4, 5)
+    assert all(grid.get_degree(slot) == 4 for slot in range(20))
+    assert grid_network(4, 5, periodic = False).get_degree(0) == 2
+    
+    ring = ring_network(10, 4)
+    assert sorted(ring.neighbours[ring.offsets[0]:ring.offsets[1]]) == [1, 2, 8, 9]
+    
+    small_world = small_world_network(100, 4, 0.2)
+    assert len(small_world.neighbours) == 400
+    for slot in range(100):
+        neighbours = small_world.neighbours[small_world.offsets[slot]:small_world.offsets[slot + 1]]
+        assert slot not in neighbours
+        assert len(set(neighbours)) == len(neighbours)
+        
+    scale_free = scale_free_network(200, 2)
+    degrees = [scale_free.get_degree(slot) for slot in range(200)]
+    assert min(degrees) >= 2
+    assert max(degrees) > 10
+    
+    with pytest.raises(ValueError):
+        ring_network(10, 3)
+        
+        
+def test_interactions_follow_network():
+    subpopulation = Subpopulation(0, "neutral_interaction")
+    for i in range(4):
+        subpopulation.add_individual(Individual(i, 0, 1, 100, features = np.array([i])))
+    # 0 and 1 copy from each other, so do 2 and 3
+    subpopulation.set_network(SocialNetwork.from_edges(4, np.array([[0, 1], [2, 3]])))
+    
+    subpopulation.create_interactions(200)
+    for _ in range(200):
+        subpopulation.create_interaction()
+    traits = [individual.features[0] for individual in subpopulation.population]
+    assert set(traits[:2]) <= {0, 1}
+    assert set(traits[2:]) <= {2, 3}
+    
+    
+def test_free_slots_use_random_numbers_as_batches():
+    # interactions with a free neighbouring slot take their random numbers and mutation whether they are made one by one or in batches
+    def subpopulation_with_free_slots():
+        subpopulation = Subpopulation(0, "neutral_interaction", mutation_rate = 0.2)
+        for i in range(4):
+            subpopulation.add_individual(Individual(i, 0, 3, 10, features = np.array([i, i, i])))
+        subpopulation.set_network(SocialNetwork.from_edges(6, np.array([[0, 1], [0, 4], [1, 5], [2, 3], [3, 4], [2, 5]])))
+        return subpopulation
+    
+    np.random.seed(7)
+    one_by_one = subpopulation_with_free_slots()
+    for _ in range(300):
+        one_by_one.create_interaction()
+    np.random.seed(7)
+    batched = subpopulation_with_free_slots()
+    for _ in range(300):
+        batched.create_interactions(1)
+    
+    assert [list(individual.features) for individual in one_by_one.population] == [list(individual.features) for individual in batched.population]
+    assert one_by_one._interactions_until_mutation == batched._interactions_until_mutation
+    
+    
+def test_slot_reuse_with_migration():
+    np.random.seed(2)
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = Metapopulation(4, "axelrod_interaction", migrations, carrying_capacities=30)
+    metapop.populate()
+    metapop.set_networks(lambda size: small_world_network(size, 4, 0.1))
+    for _ in range(200):
+        metapop.migrate()
+        metapop.make_interact()
+    
+    for subpopulation in metapop.subpopulations:
+        network = subpopulation.network
+        occupants = [individual for individual in network.occupants if individual is not None]
+        assert len(occupants) == subpopulation.get_population_size()
+        assert set(map(id, occupants)) == set(map(id, subpopulation.population))
+        assert all(network.occupants[individual.network_slot] is individual for individual in subpopulation.population)
+        assert len(network.free_slots) == network.get_number_of_slots() - subpopulation.get_population_size()
+        
+    with pytest.raises(ValueError):
+        metapop.subpopulations[0].set_network(ring_network(4, 2))
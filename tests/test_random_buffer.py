@@ -0,0 +1,56 @@
+import copy
+import numpy as np
+
+from metapypulation.metapopulation import Metapopulation
+from metapypulation.random_buffer import RandomBuffer
+
+def test_uniforms_across_blocks():
+    np.random.seed(1)
+    expected = np.random.rand(30).tolist()
+    np.random.seed(1)
+    buffer = RandomBuffer(block_size = 10)
+    
+    values = [buffer.uniform()] + buffer.uniforms(25) + [buffer.uniform() for _ in range(4)]
+    assert values == expected
+    
+    
+def test_distributions():
+    np.random.seed(2)
+    buffer = RandomBuffer()
+    
+    indices = [buffer.integer(3) for _ in range(3000)]
+    assert set(indices) == {0, 1, 2}
+    
+    binomials = [buffer.binomial(100, 0.05) for _ in range(20000)]
+    assert abs(np.mean(binomials) - 5) < 0.1
+    assert abs(np.var(binomials) - 4.75) < 0.3
+    assert buffer.binomial(10, 0.0) == 0
+    assert buffer.binomial(10, 1.0) == 10
+    
+    geometrics = [buffer.geometric(0.2) for _ in range(20000)]
+    assert min(geometrics) == 1
+    assert abs(np.mean(geometrics) - 5) < 0.15
+    
+    
+def test_copy_starts_empty():
+    buffer = RandomBuffer()
+    buffer.uniform()
+    copied_buffer = copy.deepcopy(buffer)
+    
+    assert copied_buffer.uniforms(5) != buffer.uniforms(5)
+
+
+def test_reproducible_simulation():
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    states = []
+    for _ in range(2):
+        np.random.seed(3)
+        metapop = Metapopulation(4, "axelrod_interaction", migrations, carrying_capacities=20, mutation_rate=0.01)
+        metapop.populate()
+        for _ in range(200):
+            metapop.migrate()
+            metapop.make_interact()
+        states.append(metapop.get_state())
+    
+    for array, same_array in zip(*states):
+        assert np.array_equal(array, same_array)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from metapypulation.metapopulation import Metapopulation
+from metapypulation.recorder import BackgroundRecorder, MeasurementRecorder, measure_state
+
+def test_record():
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = Metapopulation(4, "axelrod_interaction", migrations, carrying_capacities=50)
+    metapop.populate()
+    recorder = MeasurementRecorder(2, 4)
+    
+    recorder.record(metapop)
+    assert recorder.number_of_records == 1
+    assert recorder.per_subpopulation("gini").shape == (1, 4)
+    assert np.allclose(recorder.per_subpopulation("set_counts")[0], metapop.traits_sets_per_subpopulation())
+    assert np.isclose(recorder.subpopulation_mean("shannon")[0], np.mean(metapop.shannon_diversity_per_subpopulation()))
+    assert recorder.metapopulation("set_counts")[0] == metapop.metapopulation_count_sets()
+    
+    # outputs are views on the preallocated arrays
+    assert np.shares_memory(recorder.metapopulation("gini"), recorder.values)
+    assert np.shares_memory(recorder.subpopulation_mean("gini"), recorder.subpopulation_means)
+    
+    recorder.record(metapop)
+    with pytest.raises(IndexError):
+        recorder.record(metapop)
+    
+    table = recorder.per_subpopulation_table("gini", 3)
+    assert table.shape == (2, 5)
+    assert all(table["Replicate"] == 3)
+
+
+def test_background_recorder():
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = Metapopulation(4, "axelrod_interaction", migrations, carrying_capacities=30)
+    metapop.populate()
+    recorder = MeasurementRecorder(3, 4)
+    background_recorder = BackgroundRecorder(MeasurementRecorder(3, 4))
+    
+    for _ in range(3):
+        recorder.record(metapop)
+        background_recorder.submit(metapop)
+        for _ in range(50):
+            metapop.make_interact()
+    
+    assert np.allclose(background_recorder.join().values, recorder.values)
+    assert np.allclose(background_recorder.recorder.subpopulation_means, recorder.subpopulation_means)
+    assert np.allclose(measure_state(metapop.get_state(), 4, 5, 1, 10)[4, 3], metapop.metapopulation_gini_diversity())
+
+
+def test_measure_state_matches_metapopulation():
+    np.random.seed(4)
+    metapop = Metapopulation(3, "neutral_interaction", carrying_capacities=[1, 20, 40], number_of_features = 3, number_of_traits = 3,
+                             max_trait = 3)
+    metapop.populate()
+    recorder = MeasurementRecorder(2, 3)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        recorder.record(metapop)
+    recorder.record_state(metapop.get_state(), 3, 1, 3)
+    
+    # a subpopulation of one individual has an undefined Simpson index in both
+    assert np.allclose(recorder.values[1], recorder.values[0], equal_nan = True)
+    
+    # empty subpopulations have no set and undefined diversities
+    features, deme_ids, origin_ids = metapop.get_state()
+    sample = measure_state((features, np.where(deme_ids == 0, 1, deme_ids), origin_ids), 3, 3, 1, 3)
+    assert sample[0, 0] == 0
+    assert np.all(np.isnan(sample[0, 1:]))
+    
+    
+def test_measure_state_with_traits_out_of_range():
+    # a mutant trait above max_trait must not be confused with another set of traits
+    features = np.array([[2, 11], [3, 1]])
+    sample = measure_state((features, np.zeros(2, dtype=int), np.zeros(2, dtype=int)), 1, 2, 1, 10)
+    assert sample[0, 0] == 2
+    assert np.isclose(sample[0, 1], np.log(2))
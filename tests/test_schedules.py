@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from metapypulation.schedules import (ChangeTriggeredSchedule, ExplicitSchedule, LogSchedule, RegularSchedule, WindowSchedule,
+                                      count_trait_sets, make_schedule, pulse_windows)
+from metapypulation.simulation import Simulation
+
+def test_planned_generations():
+    assert RegularSchedule(10).planned_generations(35).tolist() == [0, 10, 20, 30]
+    log = LogSchedule(10).planned_generations(9999)
+    assert log[0] == 0 and log[-1] == 9999 and len(log) == 10
+    assert np.allclose(np.diff(np.log(log[1:] + 1)), np.log(10000)/9, rtol = 0.05)
+    assert ExplicitSchedule([5, 3, 200]).planned_generations(100).tolist() == [0, 3, 5, 100]
+    windows = WindowSchedule(50, pulse_windows(100, 100, 2, 2, 3)).planned_generations(300)
+    assert windows.tolist() == [0, 50, 98, 99, 100, 101, 102, 103, 150, 198, 199, 200, 201, 202, 203, 250, 300]
+    assert make_schedule({"type": "change", "threshold": 1, "candidates": {"type": "regular", "stride": 5}}).threshold == 1
+    with pytest.raises(ValueError):
+        make_schedule({"type": "something"})
+
+
+def test_count_trait_sets():
+    features = np.random.randint(1, 4, size=(200, 5))
+    assert count_trait_sets(features) == np.unique(features, axis=0).shape[0]
+    wide_features = np.random.randint(1, 11, size=(200, 30))
+    assert count_trait_sets(wide_features) == np.unique(wide_features, axis=0).shape[0]
+    assert count_trait_sets(np.array([[2, 11], [3, 1]])) == 2
+
+
+def test_simulation_with_schedule():
+    simulation = Simulation(100, 3, 'island', 'axelrod_interaction', 20, 2, 'unused', verbose = False,
+                            measurement_schedule = ExplicitSchedule([1, 2, 50]))
+    simulation.run_single_replicate(1)
+    simulation.run_single_replicate(2)
+    assert simulation.metapop_gini.index.tolist() == [0, 1, 2, 50, 100]
+    assert simulation.metapop_gini.shape == (5, 2)
+    # the default schedule keeps the tables numbered by measurement
+    simulation = Simulation(100, 3, 'island', 'axelrod_interaction', 20, 1, 'unused', verbose = False, measure_timing = 50)
+    simulation.run_single_replicate(1)
+    assert simulation.metapop_gini.index.tolist() == [0, 1, 2]
+
+
+def test_change_triggered_schedule():
+    np.random.seed(3)
+    schedule = ChangeTriggeredSchedule(RegularSchedule(10), threshold = 0)
+    simulation = Simulation(3000, 2, 'island', 'axelrod_interaction', 10, 2, 'unused', verbose = False, migration_rate = 0.0,
+                            interactions_per_generation = 'subpopulation_size', measurement_schedule = schedule)
+    recorder = simulation.run_single_replicate(1)
+    simulation.run_single_replicate(2)
+    generations = recorder.recorded_generations()
+    # the dynamics settle long before the end, after which only the last generation is measured
+    assert generations[0] == 0 and generations[-1] == 3000
+    assert recorder.number_of_records < 301
+    assert set(simulation.metapop_set_counts.index) >= set(generations)
+    assert simulation.metapop_set_counts.index.is_monotonic_increasing
+    assert simulation.metapop_set_counts.index.is_unique
+    assert simulation.metapop_set_counts.notna().sum().tolist()[0] == recorder.number_of_records
+
+    with pytest.raises(ValueError):
+        Simulation(100, 2, 'island', 'axelrod_interaction', 10, 1, 'unused', aggregate_replicates = True, measurement_schedule = schedule)
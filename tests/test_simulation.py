@@ -1,5 +1,12 @@
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+import random
+import pytest
+import metapypulation.recorder as recorder_module
+import metapypulation.simulation as simulation_module
+from metapypulation.metapopulation import Metapopulation
 from metapypulation.simulation import Simulation
+from metapypulation.snapshots import SnapshotReader
 
 def test_create_migration_table():
     simulation = Simulation(100, 3, 'island', 'axelrod_interaction', 100, 1, 'something.csv')
@@ -14,4 +21,202 @@ def test_create_migration_table():
                             'something.csv', migration_rate = 0.1)
     assert simulation.migration_matrix.shape == (3,3)
     assert np.allclose(simulation.migration_matrix[0], np.array([0.0, 0.1, 0.0]))
-    
\ No newline at end of file
+    
+
+def test_update_mode():
+    simulation = Simulation(20, 3, 'island', 'neutral_interaction', 30, 1, 'something.csv', 
+                            measure_timing = 10, verbose = False, update_mode = 'wright_fisher')
+    simulation.run_single_replicate(1)
+    assert simulation.subpop_gini.shape == (3, 1)
+    
+    with pytest.raises(ValueError):
+        Simulation(20, 3, 'island', 'neutral_interaction', 30, 1, 'something.csv', update_mode = 'something')
+
+
+def test_instrumentation(tmp_path):
+    simulation = Simulation(50, 3, 'island', 'axelrod_interaction', 20, 1, str(tmp_path / 'output'), burn_in = 10,
+                            measure_timing = 10, verbose = False, instrumentation = True, migration_rate = 0.1)
+    simulation.run_single_replicate(1)
+    statistics = simulation.statistics[1]
+    
+    assert statistics.generations == 51
+    assert statistics.number_of_interactions == 51*3
+    assert statistics.number_of_measurements == 6
+    assert statistics.number_of_migrants > 0
+    assert 0.0 <= statistics.no_op_ratio() <= 1.0
+    assert set(statistics.measurement_times) == set(["subpop_set_counts", "subpop_shannon", "subpop_simpson", "subpop_gini", 
+                                                     "metapop_set_counts", "metapop_shannon", "metapop_simpson", "metapop_gini"])
+    
+    simulation.save_output()
+    assert (tmp_path / 'output_statistics.json').exists()
+    
+    simulation = Simulation(50, 3, 'island', 'axelrod_interaction', 20, 1, 'something.csv', verbose = False)
+    simulation.run_single_replicate(1)
+    assert simulation.statistics == {}
+
+
+@pytest.mark.parametrize("update_mode", ["moran", "wright_fisher", "demographic"])
+def test_neutral_no_op_ratio(update_mode):
+    # copying a trait the focal individual already has is not a change, so some neutral interactions are no-ops
+    np.random.seed(10)
+    simulation = Simulation(200, 2, 'island', 'neutral_interaction', 20, 1, 'something.csv', verbose = False,
+                            instrumentation = True, update_mode = update_mode)
+    simulation.run_single_replicate(1)
+    
+    assert 0.0 < simulation.statistics[1].no_op_ratio() < 1.0
+
+
+def test_demographic_update_mode(tmp_path):
+    np.random.seed(11)
+    simulation = Simulation(60, 3, 'island', 'conformist_interaction', 20, 2, str(tmp_path / 'output'), migration_rate = 0.05,
+                            measure_timing = 10, verbose = False, update_mode = "demographic", regulation = "fixed",
+                            extinction_rate = 0.02, instrumentation = True)
+    simulation.run_simulation()
+    
+    assert simulation.metapop_gini.shape == (7, 2)
+    assert simulation.statistics[1].number_of_interactions > 0
+    with pytest.raises(ValueError):
+        Simulation(60, 3, 'island', 'neutral_interaction', 20, 1, 'something.csv', update_mode = "demographic", snapshots = True)
+    with pytest.raises(ValueError):
+        Simulation(60, 3, 'island', 'neutral_interaction', 20, 1, 'something.csv', update_mode = "demographic",
+                   interactions_per_generation = "subpopulation_size")
+
+
+def test_demographic_extinctions_keep_subpopulation_averages(tmp_path):
+    # extinct subpopulations have no diversity and are left out of the averages over subpopulations
+    np.random.seed(12)
+    simulation = Simulation(100, 4, 'island', 'neutral_interaction', 20, 1, str(tmp_path / 'output'), migration_rate = 0.02,
+                            measure_timing = 5, verbose = False, update_mode = "demographic", extinction_rate = 0.05,
+                            record_per_subpopulation = True)
+    simulation.run_simulation()
+    
+    assert simulation.per_subpopulation["shannon"][[0, 1, 2, 3]].isna().any(axis=None)
+    for measurement in ("set_counts", "shannon", "gini"):
+        subpopulation_means = getattr(simulation, f"subpop_{measurement}")[1].values
+        assert not np.isnan(subpopulation_means).any()
+        assert not np.signbit(subpopulation_means).any()
+
+
+def test_record_per_subpopulation(tmp_path):
+    simulation = Simulation(50, 3, 'island', 'axelrod_interaction', 20, 2, str(tmp_path / 'output'), 
+                            measure_timing = 10, verbose = False, record_per_subpopulation = True)
+    simulation.run_simulation()
+    
+    assert simulation.subpop_gini.shape == (6, 2)
+    assert simulation.per_subpopulation["gini"].shape == (12, 4)
+    assert np.allclose(simulation.per_subpopulation["gini"][[0, 1, 2]].mean(axis=1).values[:6], simulation.subpop_gini[1].values)
+    assert (tmp_path / 'output_per_subpop_gini.csv').exists()
+
+
+def test_output_tables_are_kept(tmp_path):
+    simulation = Simulation(20, 3, 'island', 'axelrod_interaction', 20, 2, str(tmp_path / 'output'),
+                            measure_timing = 10, verbose = False, record_per_subpopulation = True)
+    simulation.run_simulation()
+    
+    assert simulation.metapop_gini is simulation.metapop_gini
+    assert simulation.per_subpopulation is simulation.per_subpopulation
+    simulation.metapop_gini["mean"] = simulation.metapop_gini.mean(axis=1)
+    assert "mean" in simulation.metapop_gini
+    
+    # storing a replicate rebuilds the tables
+    simulation.run_single_replicate(3)
+    assert list(simulation.metapop_gini.columns) == [1, 2, 3]
+    simulation.empty_lists()
+    assert simulation.metapop_gini.empty
+    with pytest.raises(AttributeError):
+        simulation.unknown_table
+
+
+def test_aggregate_replicates(tmp_path):
+    simulation = Simulation(20, 3, 'island', 'axelrod_interaction', 20, 3, str(tmp_path / 'output'),
+                            measure_timing = 10, verbose = False, aggregate_replicates = True, quantiles = [0.5])
+    simulation.run_simulation()
+    assert simulation.aggregator.number_of_replicates == 3
+    assert np.allclose(simulation.aggregator.mean("metapop_gini"), simulation.metapop_gini.mean(axis=1))
+    assert np.allclose(simulation.aggregator.std("subpop_shannon"), simulation.subpop_shannon.std(axis=1))
+    
+    simulation = Simulation(20, 3, 'island', 'axelrod_interaction', 20, 2, str(tmp_path / 'summary'),
+                            measure_timing = 10, verbose = False, aggregate_replicates = True, keep_replicates = False)
+    simulation.run_simulation()
+    assert simulation.metapop_gini.empty
+    assert (tmp_path / 'summary_metapop_gini_summary.csv').exists()
+    assert not (tmp_path / 'summary_metapop_gini.csv').exists()
+    
+    with pytest.raises(ValueError):
+        Simulation(20, 3, 'island', 'axelrod_interaction', 20, 1, 'something.csv', keep_replicates = False)
+
+
+def test_snapshots(tmp_path):
+    simulation = Simulation(20, 3, 'island', 'axelrod_interaction', 20, 2, str(tmp_path / 'output'),
+                            measure_timing = 10, verbose = False, snapshots = True, migration_rate = 0.1)
+    simulation.run_simulation()
+    
+    reader = SnapshotReader(str(tmp_path / 'output_snapshots'))
+    assert reader.features.shape == (2, 3, 60, 5)
+    assert reader.get_state(1, 2)[0].min() >= 1
+    assert reader.to_metapopulation(1, 2).metapopulation_count_sets() == simulation.metapop_set_counts[2].iloc[2]
+
+
+def test_background_measurements(tmp_path):
+    # migration shuffles subpopulations with the random module
+    random.seed(3)
+    np.random.seed(3)
+    simulation = Simulation(30, 3, 'island', 'axelrod_interaction', 20, 1, str(tmp_path / 'inline'),
+                            measure_timing = 10, verbose = False, migration_rate = 0.1)
+    simulation.run_single_replicate(1)
+    random.seed(3)
+    np.random.seed(3)
+    background = Simulation(30, 3, 'island', 'axelrod_interaction', 20, 1, str(tmp_path / 'background'),
+                            measure_timing = 10, verbose = False, migration_rate = 0.1, background_measurements = True)
+    background.run_single_replicate(1)
+    
+    assert background.metapop_gini.shape == (4, 1)
+    assert np.allclose(background.metapop_gini.values, simulation.metapop_gini.values)
+    assert np.allclose(background.subpop_shannon.values, simulation.subpop_shannon.values)
+
+
+class CountingExecutor(ProcessPoolExecutor):
+    started = []
+    stopped = []
+
+    def __init__(self, *arguments, **keywords):
+        super().__init__(*arguments, **keywords)
+        CountingExecutor.started.append(self)
+
+    def shutdown(self, *arguments, **keywords):
+        CountingExecutor.stopped.append(self)
+        super().shutdown(*arguments, **keywords)
+
+
+def test_background_worker_is_shared_and_stopped(tmp_path, monkeypatch):
+    monkeypatch.setattr(simulation_module, "ProcessPoolExecutor", CountingExecutor)
+    monkeypatch.setattr(recorder_module, "ProcessPoolExecutor", CountingExecutor)
+    CountingExecutor.started.clear()
+    CountingExecutor.stopped.clear()
+    simulation = Simulation(20, 2, 'island', 'axelrod_interaction', 10, 3, str(tmp_path / 'output'),
+                            measure_timing = 10, verbose = False, background_measurements = True)
+    simulation.run_simulation()
+    
+    # one worker for all the replicates, stopped at the end
+    assert len(CountingExecutor.started) == 1
+    assert CountingExecutor.stopped == CountingExecutor.started
+    assert simulation.metapop_gini.shape == (3, 3)
+    
+    def fail():
+        raise RuntimeError("interaction failed")
+    
+    CountingExecutor.started.clear()
+    CountingExecutor.stopped.clear()
+    simulation = Simulation(20, 2, 'island', 'axelrod_interaction', 10, 3, str(tmp_path / 'failed'),
+                            measure_timing = 10, verbose = False, background_measurements = True)
+    monkeypatch.setattr(Metapopulation, "make_interact", lambda self: fail())
+    with pytest.raises(RuntimeError):
+        simulation.run_simulation()
+    assert len(CountingExecutor.started) == 1
+    assert CountingExecutor.stopped == CountingExecutor.started
+    
+    # a replicate run on its own starts and stops its own worker, also when it fails
+    with pytest.raises(RuntimeError):
+        simulation.run_single_replicate(1)
+    assert len(CountingExecutor.started) == 2
+    assert CountingExecutor.stopped[-1] is CountingExecutor.started[-1]
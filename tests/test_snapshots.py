@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from metapypulation.metapopulation import Metapopulation
+from metapypulation.snapshots import SnapshotReader, SnapshotStore
+
+def test_store_and_read(tmp_path):
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = Metapopulation(4, "axelrod_interaction", migrations, carrying_capacities=20)
+    metapop.populate()
+    store = SnapshotStore(str(tmp_path / 'snapshots'), 2, [0, 10], 80, 4)
+    assert store.features.dtype == np.uint8
+    
+    store.write(1, 1, metapop)
+    store.flush()
+    with pytest.raises(ValueError):
+        store.write(0, 0, Metapopulation(4, "axelrod_interaction", migrations, carrying_capacities=10))
+    
+    reader = SnapshotReader(str(tmp_path / 'snapshots'))
+    assert reader.number_of_replicates == 2
+    assert reader.time_index(10) == 1
+    with pytest.raises(KeyError):
+        reader.time_index(5)
+    
+    features, deme_ids, origin_ids = reader.get_state(1, 1)
+    expected_features, expected_deme_ids, expected_origin_ids = metapop.get_state()
+    assert np.array_equal(features, expected_features)
+    assert np.array_equal(deme_ids, expected_deme_ids)
+    assert np.array_equal(origin_ids, expected_origin_ids)
+    
+    features, deme_ids, _ = reader.get_state(1, 1, deme = 2)
+    assert np.array_equal(features, metapop.subpopulations[2].get_traits_sets())
+    assert np.all(deme_ids == 2)
+    
+    rebuilt = reader.to_metapopulation(1, 1)
+    assert rebuilt.metapopulation_gini_diversity() == pytest.approx(metapop.metapopulation_gini_diversity())
+    assert np.array_equal(rebuilt.count_origin_id_spread(), metapop.count_origin_id_spread())
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from metapypulation.metapopulation import Metapopulation
+from metapypulation.splitting import SplittingEstimator
+
+def create_metapopulation():
+    metapop = Metapopulation(1, "neutral_interaction", np.zeros((1, 1)), carrying_capacities=6, number_of_features=1)
+    metapop.populate()
+    metapop.subpopulations[0].population[0].features[0] = 35
+    return metapop
+
+
+def test_estimate():
+    np.random.seed(1)
+    estimator = SplittingEstimator(create_metapopulation, 35, [2, 4, 6], 2, 10000, feature = 0, migrate = False)
+    estimate = estimator.run(200)
+    
+    # a neutral mutant fixes with probability 1/N
+    assert abs(estimate - 1/6) < 4*estimator.standard_error()
+    lower, upper = estimator.confidence_interval()
+    assert 0.0 <= lower < estimate < upper <= 1.0
+    assert estimator.level_hits[0] >= estimator.level_hits[-1]/4
+    assert estimator.generations_simulated > 0
+
+
+def test_without_splits():
+    np.random.seed(2)
+    estimator = SplittingEstimator(create_metapopulation, 35, [3, 6], 1, 10000, feature = 0, migrate = False)
+    estimator.run(50)
+    # without splitting, each root is a replicate that either reaches the last level or not
+    assert set(estimator.root_estimates) <= {0.0, 1.0}
+    assert estimator.estimate() == estimator.level_hits[-1]/50
+
+
+def test_arguments():
+    metapop = create_metapopulation()
+    estimator = SplittingEstimator(create_metapopulation, 35, [2, 4], 2, 100, score = "demes")
+    assert estimator.evaluate_score(metapop) == 1
+    assert metapop.subpopulations[0].count_trait(35, 0) == 1
+    
+    with pytest.raises(ValueError):
+        SplittingEstimator(create_metapopulation, 35, [4, 2], 2, 100)
+    with pytest.raises(ValueError):
+        SplittingEstimator(create_metapopulation, 35, [2, 4], 2, 100, score = "something")
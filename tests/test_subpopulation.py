@@ -1,3 +1,4 @@
+import numpy as np
 from metapypulation.individual import Individual
 from metapypulation.subpopulation import Subpopulation
 
@@ -43,4 +44,40 @@ def test_incorporate_migrants_in_population():
     receiving_subpopulation.incorporate_migrants_in_population()
     
     assert receiving_subpopulation.get_population_size() == number_of_migrants
-    assert receiving_subpopulation.get_current_number_of_migrants() == 0
\ No newline at end of file
+    assert receiving_subpopulation.get_current_number_of_migrants() == 0
+
+def test_create_interactions():
+    subpopulation = Subpopulation(1, "neutral_interaction")
+    for i in range(10):
+        subpopulation.add_individual(Individual(i, 1, 3, 5))
+    
+    kernel = subpopulation._interaction_kernel
+    calls = []
+    subpopulation._interaction_kernel = lambda *arguments: calls.append(kernel(*arguments))
+    subpopulation.create_interactions(100)
+    
+    assert len(calls) == 100
+    # copying a trait the focal individual already has is not a change
+    assert sum(individual.number_of_changes for individual in subpopulation.population) <= 100
+
+
+def test_draw_mutations():
+    np.random.seed(1)
+    subpopulation = Subpopulation(1, "neutral_interaction", mutation_rate = 0.1)
+    mutations = []
+    for number_of_interactions in [1, 7, 1000, 3, 20000]:
+        mutations += subpopulation.draw_mutations(number_of_interactions)
+    
+    assert len(mutations) == 21011
+    # one mutation every 10 interactions on average, as with one random number per interaction
+    assert abs(np.mean(mutations) - 0.1) < 0.01
+    assert subpopulation.draw_mutations(3) != [None]*3
+    assert Subpopulation(1, "neutral_interaction").draw_mutations(3) == [None]*3
+    assert not any(Subpopulation(1, "neutral_interaction", mutation_rate = 0.0).draw_mutations(1000))
+    
+    for i in range(10):
+        subpopulation.add_individual(Individual(i, 1, 3, 5, mutation_rate = 0.1))
+    for i in range(2000):
+        subpopulation.create_interaction()
+    subpopulation.create_interactions(2000)
+    assert abs(sum(individual.number_of_mutations for individual in subpopulation.population) - 400) < 80
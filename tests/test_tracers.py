@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from metapypulation.metapopulation import Metapopulation
+from metapypulation.tracers import NeutralTracers
+
+def test_introduce():
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = Metapopulation(4, "neutral_interaction", migrations, carrying_capacities=10)
+    metapop.populate()
+    tracers = NeutralTracers(metapop)
+    
+    assert tracers.introduce(2, 0, feature = 1) == 0
+    assert tracers.introduce(2, 0) == 1
+    counts = tracers.update(0)
+    assert counts.shape == (2, 4)
+    assert np.allclose(counts[:, 2], 1)
+    assert counts.sum() == 2
+    
+    with pytest.raises(ValueError):
+        NeutralTracers(Metapopulation(4, "axelrod_interaction", migrations, carrying_capacities=10))
+
+
+def test_fixation_and_loss():
+    metapop = Metapopulation(1, "neutral_interaction", np.zeros((1, 1)), carrying_capacities=5, number_of_features=2)
+    metapop.populate()
+    tracers = NeutralTracers(metapop)
+    # one tracer on each trait: all traits eventually descend from a single one per feature
+    for individual in range(5):
+        for feature in range(2):
+            tracers.introduce(0, 0, feature = feature, individual = individual)
+    
+    generation = 0
+    while np.count_nonzero(~np.isnan(tracers.fixation_times)) < 2:
+        metapop.make_interact()
+        generation += 1
+        tracers.update(generation)
+    
+    summary = tracers.summary()
+    assert summary.shape[0] == 10
+    assert np.count_nonzero(summary["fixed"].notna()) == 2
+    assert np.count_nonzero(summary["lost"].notna()) == 8
+    assert set(summary.loc[summary["fixed"].notna(), "feature"]) == {0, 1}
+    assert summary["carriers"].sum() == 10
+    
+    table = tracers.carrier_table()
+    assert table.shape == (10*generation, 3)
+
+
+def test_mutation_removes_tracers():
+    metapop = Metapopulation(1, "neutral_interaction", np.zeros((1, 1)), carrying_capacities=5, mutation_rate=1.0)
+    metapop.populate()
+    tracers = NeutralTracers(metapop)
+    for i in range(5):
+        tracers.introduce(0, 0)
+    for i in range(500):
+        metapop.make_interact()
+    
+    assert tracers.update(500).sum() == 0
+    assert np.all(np.array(tracers.loss_times) == 500)
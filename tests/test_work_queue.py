@@ -0,0 +1,87 @@
+import json
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from metapypulation.cli import main, run_experiment
+from metapypulation.work_queue import WorkQueue, run_worker
+
+def claim_all(directory: str, barrier, claimed) -> None:
+    queue = WorkQueue(directory)
+    barrier.wait()
+    tasks = []
+    while (task := queue.claim()) is not None:
+        tasks.append(task)
+    claimed.put(tasks)
+
+
+def test_claim_and_reclaim(tmp_path, small_experiment):
+    queue = WorkQueue(str(tmp_path / "queue"))
+    tasks = queue.submit(small_experiment(str(tmp_path / "run")), "small")
+    assert tasks == ["small__000001", "small__000002", "small__000003"]
+    with pytest.raises(ValueError):
+        queue.submit(small_experiment(str(tmp_path / "run")), "small")
+
+    # two claims never get the same task
+    first, second = queue.claim(), queue.claim()
+    assert first != second
+    assert queue.status() == {"pending": 1, "claimed": 2, "done": 0}
+
+    # a task claimed long after it was submitted is not reclaimed before its first heartbeat
+    os.utime(tmp_path / "queue" / "pending" / "small__000003.json", (0, 0))
+    third = queue.claim()
+    assert queue.reclaim(timeout = 60) == []
+    os.rename(tmp_path / "queue" / "claimed" / f"{third}.json", tmp_path / "queue" / "pending" / f"{third}.json")
+
+    # a task without heartbeat is put back in the queue after the timeout
+    os.utime(tmp_path / "queue" / "claimed" / f"{first}.json", (0, 0))
+    assert queue.reclaim(timeout = 60) == [first]
+    assert queue.status() == {"pending": 2, "claimed": 1, "done": 0}
+
+
+def test_concurrent_claims(tmp_path, small_experiment):
+    # workers in separate processes, started together, claim every task exactly once
+    directory = str(tmp_path / "queue")
+    experiment = small_experiment(str(tmp_path / "run"))
+    experiment["run"]["replicates"] = 200
+    tasks = WorkQueue(directory).submit(experiment, "small")
+    number_of_workers = 4
+    context = multiprocessing.get_context("spawn")
+    barrier, claimed = context.Barrier(number_of_workers), context.Queue()
+    workers = [context.Process(target = claim_all, args = (directory, barrier, claimed)) for _ in range(number_of_workers)]
+    for worker in workers:
+        worker.start()
+    claims = [claimed.get(timeout = 60) for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    all_claims = [task for worker_claims in claims for task in worker_claims]
+    assert sorted(all_claims) == tasks
+    assert sum(len(worker_claims) > 0 for worker_claims in claims) > 1
+
+
+def test_workers_and_collect(tmp_path, small_experiment):
+    queue = WorkQueue(str(tmp_path / "queue"))
+    queue.submit(small_experiment(str(tmp_path / "queued" / "run")), "small")
+    assert run_worker(str(tmp_path / "queue"), max_tasks = 1, verbose = False) == 1
+    with pytest.raises(ValueError):
+        queue.collect("small")
+    assert run_worker(str(tmp_path / "queue"), verbose = False) == 2
+    assert queue.status() == {"pending": 0, "claimed": 0, "done": 3}
+    queue.collect("small")
+
+    # the outputs are the same as when the experiment is run directly
+    run_experiment(small_experiment(str(tmp_path / "direct" / "run")), workers = 1, verbose = False)
+    queued = pd.read_csv(tmp_path / "queued" / "run_metapop_gini.csv")
+    direct = pd.read_csv(tmp_path / "direct" / "run_metapop_gini.csv")
+    assert np.allclose(queued.values, direct.values)
+
+
+def test_command_line(tmp_path, small_experiment):
+    (tmp_path / "small.json").write_text(json.dumps(small_experiment(str(tmp_path / "run"))))
+    queue_directory = str(tmp_path / "queue")
+    assert main(["--queue", queue_directory, str(tmp_path / "small.json"), "--quiet"]) == 0
+    assert main(["--work", queue_directory, "--quiet"]) == 0
+    assert main(["--collect", queue_directory, "--quiet"]) == 0
+    assert (tmp_path / "run_metapop_gini.csv").exists()
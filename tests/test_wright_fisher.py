@@ -0,0 +1,81 @@
+import numpy as np
+
+from metapypulation.wright_fisher import WrightFisherMetapopulation
+
+def test_populate():
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')
+    metapop = WrightFisherMetapopulation(4, "axelrod_interaction", migrations, carrying_capacities=[10, 20, 30, 40])
+    assert metapop.get_metapopulation_size() == 0
+    
+    metapop.populate()
+    assert metapop.get_metapopulation_size() == 100
+    assert np.allclose(metapop.subpopulation_sizes, [10, 20, 30, 40])
+    assert np.allclose(metapop.subpopulation_offsets, [0, 10, 30, 60])
+    assert metapop.features.shape == (100, 5)
+
+
+def test_make_interact():
+    metapop = WrightFisherMetapopulation(2, "neutral_interaction", np.zeros((2, 2)), carrying_capacities=50)
+    metapop.populate()
+    metapop.features[:50] = 1
+    metapop.features[50:] = 2
+    # without mutation and migration, individuals can only copy traits found in their own subpopulation
+    for i in range(10):
+        metapop.make_interact()
+    assert np.all(metapop.features[:50] == 1)
+    assert np.all(metapop.features[50:] == 2)
+    
+    metapop = WrightFisherMetapopulation(1, "axelrod_interaction", np.zeros((1, 1)), carrying_capacities=50)
+    metapop.populate()
+    metapop.features[:25] = 1
+    metapop.features[25:] = 2
+    # completely different individuals never interact under the Axelrod model
+    metapop.make_interact()
+    assert np.all(metapop.features[:25] == 1)
+    assert np.all(metapop.features[25:] == 2)
+
+
+def test_mutations_stay_in_trait_range():
+    np.random.seed(5)
+    for interaction in ("axelrod_interaction", "neutral_interaction"):
+        metapop = WrightFisherMetapopulation(2, interaction, np.zeros((2, 2)), carrying_capacities=50, number_of_traits=4,
+                                             mutation_rate=0.5, min_trait=5, max_trait=8)
+        metapop.populate()
+        for _ in range(20):
+            metapop.make_interact()
+        assert metapop.features.min() >= 5 and metapop.features.max() <= 8
+        assert metapop.count_traits().sum() == metapop.features.size
+
+
+def test_migrate():
+    migrations = np.genfromtxt('./tests/test_configs/island_model.csv', delimiter=',')*100
+    metapop = WrightFisherMetapopulation(4, "axelrod_interaction", migrations, carrying_capacities=100)
+    metapop.populate()
+    metapop.migrate()
+    
+    assert metapop.get_metapopulation_size() == 400
+    assert np.all(np.diff(metapop.deme_ids) >= 0)
+    assert np.any(metapop.origin_ids != metapop.deme_ids)
+    
+    metapopulation = metapop.to_metapopulation()
+    assert np.allclose(metapopulation.count_origin_id_spread().sum(axis=1), metapop.subpopulation_sizes)
+
+
+def test_migrate_moves_only_individuals():
+    np.random.seed(3)
+    migrations = np.full((5, 5), 0.05)
+    np.fill_diagonal(migrations, 0.0)
+    for _ in range(50):
+        metapop = WrightFisherMetapopulation(5, "neutral_interaction", migrations, carrying_capacities=[0, 30, 5, 60, 12])
+        metapop.populate()
+        metapop.features[:, 0] = np.arange(metapop.get_metapopulation_size())
+        before = metapop.features.copy()
+        metapop.migrate()
+        
+        assert np.all(np.diff(metapop.deme_ids) >= 0)
+        assert np.array_equal(np.bincount(metapop.deme_ids, minlength=5), metapop.subpopulation_sizes)
+        assert np.array_equal(metapop._individual_offsets, metapop.subpopulation_offsets[metapop.deme_ids])
+        # every individual is still there once, with its features and its deme of origin
+        order = np.argsort(metapop.features[:, 0])
+        assert np.array_equal(metapop.features[order], before)
+        assert np.array_equal(metapop.origin_ids[order], np.repeat(np.arange(5), [0, 30, 5, 60, 12]))